@@ -1,11 +1,97 @@
 // lib/services/adafruit_service.dart
 import 'dart:convert';
+import 'dart:typed_data';
+import 'package:archive/archive.dart' show Inflate;
 import 'package:flutter/foundation.dart';
 import 'package:http/http.dart' as http;
 import '../models/wifi_point.dart';
 import '../config.dart';
 
 class AdafruitService {
+  // Formato compacto de la Pico W (pico_w/scanpack.py): una línea WD1:<base64> por escaneo
+  static const String _marcaEmpaquetado = 'WD1:';
+  // Estimaciones por AP (pico_w/apestimator.py): una posición por red
+  static const String _marcaEstimaciones = 'WE1:';
+  static const Map<int, String> _seguridad = {
+    0: 'Abierta',
+    1: 'WEP',
+    3: 'WPA-PSK',
+    5: 'WPA2-PSK',
+    7: 'WPA/WPA2-PSK',
+  };
+
+  /// Decodifica un bloque de estimaciones: cabecera <IB (hora, filas) seguida de filas
+  /// <6siibBBHB (BSSID, lat E7, lon E7, mejor RSSI, auth, canal, muestras, largo SSID) + SSID.
+  static List<WifiPoint> _decodificarEstimaciones(String linea) {
+    final bytes = base64Decode(linea.substring(_marcaEstimaciones.length));
+    final data = ByteData.sublistView(Uint8List.fromList(bytes));
+    final filas = data.getUint8(4);
+    final puntos = <WifiPoint>[];
+    var pos = 5;
+    for (var i = 0; i < filas; i++) {
+      final mac = bytes
+          .sublist(pos, pos + 6)
+          .map((b) => b.toRadixString(16).padLeft(2, '0'))
+          .join(':');
+      final lat = data.getInt32(pos + 6, Endian.little) / 1e7;
+      final lng = data.getInt32(pos + 10, Endian.little) / 1e7;
+      final rssi = data.getInt8(pos + 14);
+      final auth = data.getUint8(pos + 15);
+      final largo = data.getUint8(pos + 19);
+      pos += 20;
+      final ssid = utf8
+          .decode(bytes.sublist(pos, pos + largo), allowMalformed: true)
+          .trim();
+      pos += largo;
+      puntos.add(WifiPoint(
+        ssid: ssid.isEmpty ? 'Hidden' : ssid,
+        security: _seguridad[auth] ?? 'Desconocida',
+        latitude: lat,
+        longitude: lng,
+        signal: rssi,
+        mac: mac,
+        timestamp: DateTime.now(),
+      ));
+    }
+    return puntos;
+  }
+
+  /// Decodifica un bloque empaquetado: cabecera <IiiBB (hora, lat E7, lon E7, HDOP x10, filas)
+  /// seguida de filas <6sbBBB (BSSID, RSSI, auth, canal, largo SSID) + SSID.
+  static List<WifiPoint> _decodificarEmpaquetado(String linea) {
+    final bytes = base64Decode(linea.substring(_marcaEmpaquetado.length));
+    final data = ByteData.sublistView(Uint8List.fromList(bytes));
+    final lat = data.getInt32(4, Endian.little) / 1e7;
+    final lng = data.getInt32(8, Endian.little) / 1e7;
+    final filas = data.getUint8(13);
+    final puntos = <WifiPoint>[];
+    var pos = 14;
+    for (var i = 0; i < filas; i++) {
+      final mac = bytes
+          .sublist(pos, pos + 6)
+          .map((b) => b.toRadixString(16).padLeft(2, '0'))
+          .join(':');
+      final rssi = data.getInt8(pos + 6);
+      final auth = data.getUint8(pos + 7);
+      final largo = data.getUint8(pos + 9);
+      pos += 10;
+      final ssid = utf8
+          .decode(bytes.sublist(pos, pos + largo), allowMalformed: true)
+          .trim();
+      pos += largo;
+      puntos.add(WifiPoint(
+        ssid: ssid.isEmpty ? 'Hidden' : ssid,
+        security: _seguridad[auth] ?? 'Desconocida',
+        latitude: lat,
+        longitude: lng,
+        signal: rssi,
+        mac: mac,
+        timestamp: DateTime.now(),
+      ));
+    }
+    return puntos;
+  }
+
   static Future<List<WifiPoint>> fetchAllPoints() async {
     final url = Uri.parse(
         'https://io.adafruit.io/api/v2/${Config.username}/feeds/${Config.feed}/data?limit=100');
@@ -29,6 +115,37 @@ class AdafruitService {
         String raw = (item['value'] ?? '').toString().trim();
         if (raw.isEmpty) continue;
 
+        // Valor comprimido por la Pico W (pico_w/zcodec.py): "Z1:" + base64 de deflate crudo.
+        // Inflate de package:archive es Dart puro: funciona también en web, donde no hay dart:io
+        if (raw.startsWith('Z1:')) {
+          try {
+            raw = utf8.decode(
+                Inflate(base64Decode(raw.substring(3).trim())).getBytes());
+          } catch (e) {
+            debugPrint('Valor comprimido inválido: $e');
+            continue; // valor roto
+          }
+        }
+
+        // Líneas empaquetadas: se decodifican antes de limpiar "View" (base64 puede contenerlo)
+        final lineasCsv = <String>[];
+        for (var line in raw.replaceAll('\\n', '\n').split('\n')) {
+          line = line.trim();
+          final empaquetada = line.startsWith(_marcaEmpaquetado);
+          if (!empaquetada && !line.startsWith(_marcaEstimaciones)) {
+            lineasCsv.add(line);
+            continue;
+          }
+          try {
+            allPoints.addAll(empaquetada
+                ? _decodificarEmpaquetado(line)
+                : _decodificarEstimaciones(line));
+          } catch (e) {
+            // Ignorar bloque roto
+          }
+        }
+        raw = lineasCsv.join('\n');
+
         // QUITAR "View" SI EXISTE (al inicio o en cualquier lado)
         raw = raw.replaceAll(RegExp(r'[Vv]iew', caseSensitive: false), '');
         raw = raw.replaceAll(
@@ -0,0 +1,135 @@
+"""
+apestimator - streaming per-AP location estimates (RSSI-weighted centroid) in fixed memory
+
+Every sighting updates the AP's running centroid, weighted by (RSSI + 100)^2 so close readings
+dominate. Slots live in one preallocated bytearray (same open addressing as bssidcache):
+
+    <6sBbBBHIiiHHB32s  BSSID, used flag, best RSSI, auth, channel, samples, weight sum,
+                       centroid latitude E7, centroid longitude E7, first scan, last scan, SSID
+
+An AP produces one estimate when it has not been seen for lost_scans scans, when it has been tracked
+for max_scans scans (so a parked receiver still reports), or when the table evicts it. Estimates are
+tuples (bssid, ssid, auth, channel, best_rssi, lat_e7, lon_e7, samples).
+"""
+
+try:
+    import ustruct as struct
+except ImportError:
+    import struct
+
+from bssidcache import bssid_hash, PROBES
+
+SLOT = '<6sBbBBHIiiHHB32s'
+SLOT_SIZE = struct.calcsize(SLOT)
+MAX_SSID = 32
+
+
+def rssi_weight(rssi):
+    """Centroid weight of a sighting: grows with received power, never zero"""
+    level = rssi + 100
+    if level < 1:
+        level = 1
+    return level * level
+
+
+class APEstimator(object):
+    """Fixed-size table of running RSSI-weighted AP centroids"""
+
+    def __init__(self, capacity=256, lost_scans=3, max_scans=60):
+        size = 1
+        while size < capacity:
+            size <<= 1
+        self.capacity = size
+        self.lost_scans = lost_scans
+        self.max_scans = max_scans
+        self._mask = size - 1
+        self._table = bytearray(size * SLOT_SIZE)
+        self._scan = 0
+        self.tracked = 0
+
+        # Statistics
+        self.sightings = 0
+        self.new = 0
+        self.emitted = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _estimate(values):
+        bssid, _, best, auth, channel, samples, _, lat_e7, lon_e7, _, _, ssid_len, ssid = values
+        return bssid, ssid[:ssid_len], auth, channel, best, lat_e7, lon_e7, samples
+
+    def _release(self, offset):
+        estimate = self._estimate(struct.unpack_from(SLOT, self._table, offset))
+        self._table[offset + 6] = 0
+        self.tracked -= 1
+        self.emitted += 1
+        return estimate
+
+    def add(self, net, lat_e7, lon_e7):
+        """Feed one WLAN.scan() tuple seen at (lat_e7, lon_e7). Returns the estimate of an AP evicted
+        to make room, or None."""
+        self.sightings += 1
+        bssid = bytes(net[1])
+        rssi = max(-128, min(127, net[3]))
+        weight = rssi_weight(rssi)
+        table = self._table
+        index = bssid_hash(bssid) & self._mask
+        free = -1
+        victim = -1
+        victim_age = -1
+        for _ in range(PROBES):
+            offset = index * SLOT_SIZE
+            if not table[offset + 6]:
+                if free < 0:
+                    free = offset
+            elif table[offset:offset + 6] == bssid:
+                values = struct.unpack_from(SLOT, table, offset)
+                best, samples, total, lat, lon, first = values[2], values[5], values[6], values[7], values[8], values[9]
+                if samples < 0xFFFF:
+                    total += weight
+                    lat += int((lat_e7 - lat) * weight / total)
+                    lon += int((lon_e7 - lon) * weight / total)
+                    samples += 1
+                struct.pack_into(SLOT, table, offset, bssid, 1, max(best, rssi), net[4] & 0xFF, net[2] & 0xFF,
+                                 samples, total, lat, lon, first, self._scan, values[11], values[12])
+                return None
+            else:
+                age = (self._scan - struct.unpack_from('<H', table, offset + 26)[0]) & 0xFFFF
+                if age > victim_age:
+                    victim = offset
+                    victim_age = age
+            index = (index + 1) & self._mask
+
+        evicted = None
+        if free < 0:
+            # Probe window full: the least recently seen AP is reported now
+            evicted = self._release(victim)
+            self.evictions += 1
+            free = victim
+        ssid = bytes(net[0][:MAX_SSID])
+        struct.pack_into(SLOT, table, free, bssid, 1, rssi, net[4] & 0xFF, net[2] & 0xFF,
+                         1, weight, lat_e7, lon_e7, self._scan, self._scan, len(ssid), ssid)
+        self.tracked += 1
+        self.new += 1
+        return evicted
+
+    def end_scan(self):
+        """Close the current scan. Returns estimates for APs out of range or tracked long enough."""
+        done = []
+        table = self._table
+        for offset in range(0, len(table), SLOT_SIZE):
+            if not table[offset + 6]:
+                continue
+            first, last = struct.unpack_from('<HH', table, offset + 24)
+            if ((self._scan - last) & 0xFFFF) >= self.lost_scans or ((self._scan - first) & 0xFFFF) >= self.max_scans:
+                done.append(self._release(offset))
+        self._scan = (self._scan + 1) & 0xFFFF
+        return done
+
+    def flush(self):
+        """Return estimates for every tracked AP and empty the table"""
+        done = []
+        for offset in range(0, len(self._table), SLOT_SIZE):
+            if self._table[offset + 6]:
+                done.append(self._release(offset))
+        return done
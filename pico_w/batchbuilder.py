@@ -0,0 +1,69 @@
+"""
+batchbuilder - fills upload values up to a byte budget (MicroPython / CPython)
+
+Records (text lines) are added one at a time. The builder keeps their JSON-escaped size as a running
+total, so it knows without re-serialising the batch when the next record would push the value over
+the limit; at that point the current batch is sealed and handed to the seal callback, and the record
+starts the next batch. A record larger than the limit on its own is sealed alone: nothing is dropped.
+"""
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+
+def escaped_size(text):
+    """Bytes text takes inside a JSON string (escapes counted, quotes not)"""
+    return len(json.dumps(text).encode()) - 2
+
+
+class BatchBuilder(object):
+    """Accumulates records into batches of at most limit JSON-escaped bytes.
+
+    seal(batch, started, items) is called with the batch text, the started stamp of its first record
+    and the number of items (e.g. networks) it carries.
+    """
+
+    def __init__(self, limit, seal):
+        self.limit = limit
+        self._seal = seal
+        self._records = []
+        self.size = 0
+        self.items = 0
+        self.started = None
+
+        # Statistics
+        self.sealed = 0
+        self.oversize = 0
+
+    def add(self, record, items=1, started=None):
+        """Add one record; seals the current batch first if the record would not fit"""
+        size = escaped_size(record)
+        if self._records and self.size + size > self.limit:
+            self.flush()
+        if not self._records:
+            self.started = started
+        self._records.append(record)
+        self.size += size
+        self.items += items
+        if size > self.limit:
+            self.oversize += 1
+            self.flush()
+
+    def flush(self):
+        """Seal the current batch (if any)"""
+        if not self._records:
+            return
+        batch = ''.join(self._records)
+        started = self.started
+        items = self.items
+        self._records = []
+        self.size = 0
+        self.items = 0
+        self.started = None
+        self.sealed += 1
+        self._seal(batch, started, items)
+
+    def __len__(self):
+        return len(self._records)
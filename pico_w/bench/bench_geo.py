@@ -0,0 +1,234 @@
+"""
+Accuracy and speed benchmark for the micropyGPS geodesy helpers, from the pico_w directory:
+
+    python3 bench/bench_geo.py [--pairs 200] [--repeat 3] [--out results.jsonl]
+    micropython bench/bench_geo.py
+
+Point pairs are drawn (fixed seed) around random origins between 60S and 60N plus Aguascalientes, at
+separations from 10 m to 1000 km. The reference is Vincenty's inverse formula on the WGS84 ellipsoid,
+computed in the same run: run it on CPython or the unix port (double floats) for a trustworthy
+reference; on a board the reference is single precision as well. Each case prints one JSON object:
+
+    accuracy  per function and scale, mean/max error in metres and max relative error against the
+              reference (bearing in degrees; destination as the distance between destination(p,
+              bearing, distance) and the intended point); for equirectangular also the max relative
+              error against haversine, i.e. the approximation alone (for equirectangular_e7 plus the
+              rounding of the points to 1e-7 degree)
+    speed     calls per second over the same pairs, best of --repeat, including the reference
+"""
+
+import json
+import sys
+from math import atan, atan2, cos, radians, sin, sqrt, tan, degrees
+
+try:
+    from time import ticks_us, ticks_diff
+except ImportError:
+    from time import perf_counter
+
+    def ticks_us():
+        return int(perf_counter() * 1000000)
+
+    def ticks_diff(end, start):
+        return end - start
+
+try:
+    BENCH_DIR = __file__.rsplit('/', 1)[0] if '/' in __file__ else '.'
+except NameError:
+    BENCH_DIR = 'bench'
+sys.path.insert(0, BENCH_DIR + '/..')
+
+from micropyGPS import haversine, equirectangular, equirectangular_e7, bearing, destination, LocalProjection
+
+SCALES = (10, 100, 1000, 10000, 100000, 1000000)
+HOME = (21.8818, -102.2916)
+
+# WGS84
+_A = 6378137.0
+_F = 1 / 298.257223563
+_B = _A * (1 - _F)
+
+
+def vincenty(lat1, lon1, lat2, lon2):
+    """Ellipsoidal distance (m) and initial bearing (degrees) between two points"""
+    u1 = atan((1 - _F) * tan(radians(lat1)))
+    u2 = atan((1 - _F) * tan(radians(lat2)))
+    dlon = radians(lon2 - lon1)
+    lam = dlon
+    sin_u1, cos_u1, sin_u2, cos_u2 = sin(u1), cos(u1), sin(u2), cos(u2)
+    for _ in range(200):
+        sin_lam, cos_lam = sin(lam), cos(lam)
+        sin_sigma = sqrt((cos_u2 * sin_lam) ** 2 + (cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam) ** 2)
+        if sin_sigma == 0:
+            return 0.0, 0.0
+        cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+        sigma = atan2(sin_sigma, cos_sigma)
+        sin_alpha = cos_u1 * cos_u2 * sin_lam / sin_sigma
+        cos2_alpha = 1 - sin_alpha * sin_alpha
+        cos_2sm = cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha if cos2_alpha else 0.0
+        c = _F / 16 * cos2_alpha * (4 + _F * (4 - 3 * cos2_alpha))
+        previous = lam
+        lam = dlon + (1 - c) * _F * sin_alpha * (
+            sigma + c * sin_sigma * (cos_2sm + c * cos_sigma * (-1 + 2 * cos_2sm * cos_2sm)))
+        if abs(lam - previous) < 1e-12:
+            break
+    u_sq = cos2_alpha * (_A * _A - _B * _B) / (_B * _B)
+    a = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+    b = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+    delta_sigma = b * sin_sigma * (cos_2sm + b / 4 * (cos_sigma * (-1 + 2 * cos_2sm * cos_2sm) - b / 6 * cos_2sm * (
+        -3 + 4 * sin_sigma * sin_sigma) * (-3 + 4 * cos_2sm * cos_2sm)))
+    distance = _B * a * (sigma - delta_sigma)
+    azimuth = atan2(cos_u2 * sin(lam), cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos(lam))
+    return distance, degrees(azimuth) % 360
+
+
+class _Random(object):
+    """Small LCG so CPython and MicroPython draw the same pairs"""
+
+    def __init__(self, seed):
+        self.state = seed
+
+    def uniform(self, low, high):
+        self.state = (self.state * 1103515245 + 12345) & 0x7FFFFFFF
+        return low + (high - low) * self.state / 0x7FFFFFFF
+
+
+def make_pairs(count, scale):
+    rnd = _Random(scale)
+    pairs = []
+    for i in range(count):
+        if i % 4 == 0:
+            lat, lon = HOME
+        else:
+            lat, lon = rnd.uniform(-60, 60), rnd.uniform(-180, 180)
+        # Offsets up to scale metres in each axis, at least a tenth of it
+        dy = rnd.uniform(0.1, 1) * scale * (1 if rnd.uniform(0, 1) < 0.5 else -1)
+        dx = rnd.uniform(0.1, 1) * scale * (1 if rnd.uniform(0, 1) < 0.5 else -1)
+        lat2 = lat + dy / 111195
+        lon2 = (lon + dx / (111195 * cos(radians(lat))) + 540) % 360 - 180
+        pairs.append((lat, lon, lat2, lon2))
+    return pairs
+
+
+def _angle(a, b):
+    return abs((a - b + 180) % 360 - 180)
+
+
+def accuracy(pairs, scale):
+    errors = {'haversine': [], 'equirectangular': [], 'equirectangular_e7': [], 'projection': [], 'bearing': [],
+              'destination': []}
+    relative = {'haversine': 0.0, 'equirectangular': 0.0, 'equirectangular_e7': 0.0, 'projection': 0.0}
+    # Approximation error alone: the flat-Earth shortcut against the exact spherical distance
+    sphere = {'equirectangular': 0.0, 'equirectangular_e7': 0.0}
+    for lat1, lon1, lat2, lon2 in pairs:
+        reference, azimuth = vincenty(lat1, lon1, lat2, lon2)
+        values = {'haversine': haversine(lat1, lon1, lat2, lon2),
+                  'equirectangular': equirectangular(lat1, lon1, lat2, lon2),
+                  'equirectangular_e7': equirectangular_e7(int(round(lat1 * 10000000)), int(round(lon1 * 10000000)),
+                                                           int(round(lat2 * 10000000)), int(round(lon2 * 10000000))),
+                  'projection': LocalProjection(lat1, lon1).distance(lat2, lon2)}
+        for name, value in values.items():
+            errors[name].append(abs(value - reference))
+            if reference:
+                relative[name] = max(relative[name], abs(value - reference) / reference)
+            if name in sphere and values['haversine']:
+                sphere[name] = max(sphere[name], abs(value - values['haversine']) / values['haversine'])
+        course = bearing(lat1, lon1, lat2, lon2)
+        errors['bearing'].append(_angle(course, azimuth))
+        lat3, lon3 = destination(lat1, lon1, course, values['haversine'])
+        errors['destination'].append(vincenty(lat2, lon2, lat3, lon3)[0])
+    for name, values in errors.items():
+        yield {'function': name, 'scale_m': scale, 'unit': 'deg' if name == 'bearing' else 'm',
+               'mean_err': sum(values) / len(values), 'max_err': max(values),
+               'max_rel_err': relative.get(name), 'max_rel_vs_sphere': sphere.get(name)}
+
+
+def speed(pairs, repeat):
+    projection = LocalProjection(pairs[0][0], pairs[0][1])
+    e7 = [(int(lat * 10000000), int(lon * 10000000)) for _, _, lat, lon in pairs]
+    e7_pairs = [(int(p[0] * 10000000), int(p[1] * 10000000), int(p[2] * 10000000), int(p[3] * 10000000))
+                for p in pairs]
+    to_xy = projection.to_xy
+    to_xy_e7 = projection.to_xy_e7
+
+    def run_haversine():
+        for p in pairs:
+            haversine(p[0], p[1], p[2], p[3])
+
+    def run_equirectangular():
+        for p in pairs:
+            equirectangular(p[0], p[1], p[2], p[3])
+
+    def run_equirectangular_e7():
+        for p in e7_pairs:
+            equirectangular_e7(p[0], p[1], p[2], p[3])
+
+    def run_bearing():
+        for p in pairs:
+            bearing(p[0], p[1], p[2], p[3])
+
+    def run_destination():
+        for p in pairs:
+            destination(p[0], p[1], 45.0, 1000.0)
+
+    def run_to_xy():
+        for p in pairs:
+            to_xy(p[2], p[3])
+
+    def run_to_xy_e7():
+        for p in e7:
+            to_xy_e7(p[0], p[1])
+
+    def run_vincenty():
+        for p in pairs:
+            vincenty(p[0], p[1], p[2], p[3])
+
+    for name, run in (('haversine', run_haversine), ('equirectangular', run_equirectangular),
+                      ('equirectangular_e7', run_equirectangular_e7),
+                      ('bearing', run_bearing), ('destination', run_destination),
+                      ('projection.to_xy', run_to_xy), ('projection.to_xy_e7', run_to_xy_e7),
+                      ('vincenty (reference)', run_vincenty)):
+        best = None
+        for _ in range(repeat):
+            start = ticks_us()
+            run()
+            elapsed = ticks_diff(ticks_us(), start)
+            if best is None or elapsed < best:
+                best = elapsed
+        yield {'function': name, 'calls_per_s': len(pairs) / (max(best, 1) / 1000000)}
+
+
+def main(argv):
+    options = {'pairs': 200, 'repeat': 3, 'out': None}
+    for i in range(1, len(argv) - 1, 2):
+        name = argv[i].lstrip('-')
+        if name not in options:
+            print(__doc__)
+            return 2
+        options[name] = argv[i + 1] if name == 'out' else int(argv[i + 1])
+    out = open(options['out'], 'w') if options['out'] else None
+    common = {'bench': 'geo', 'impl': sys.implementation.name}
+    try:
+        results = []
+        for scale in SCALES:
+            for result in accuracy(make_pairs(options['pairs'], scale), scale):
+                result['case'] = 'accuracy'
+                results.append(result)
+        # Speed is measured on city-scale pairs, the typical on-device use
+        for result in speed(make_pairs(options['pairs'], 1000), options['repeat']):
+            result['case'] = 'speed'
+            results.append(result)
+        for result in results:
+            result.update(common)
+            line = json.dumps(result)
+            print(line)
+            if out:
+                out.write(line + '\n')
+    finally:
+        if out:
+            out.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,235 @@
+"""
+Throughput benchmark for MicropyGPS over the NMEA replay corpus in corpus/.
+Runs unchanged on CPython and on the MicroPython unix port, from the pico_w directory:
+
+    python3 bench/bench_gps.py [--out results.jsonl] [--label name] [--repeat 5]
+    micropython bench/bench_gps.py --corpus clean,noisy --method update_bytes
+
+Each case prints one JSON object per line: chars/sec, sentences/sec and epochs (fixes)/sec for the best
+of --repeat samples after an untimed warm-up (a sample replays the corpus for at least MIN_SAMPLE_US and
+keeps its fastest pass), their spread ((median - best) / best, which compare.py allows for as noise), the parser statistics it
+ended with, and the heap: on MicroPython the bytes allocated per sentence received (measured with the
+collector disabled), on CPython the tracemalloc peak above the starting heap while parsing the same
+sample (alloc_peak_bytes; reference counting frees garbage at once, so only what is live together shows).
+The firmware config is what main.py runs (GGA and RMC, lazy, 32 fix history) and firmware_eager the same
+without lazy decoding. The pvt corpus is the clean drive in UBX binary and only runs with the ubx config (frames count as
+sentences), so epochs_per_s compares the two protocols over the same fixes.
+Feed two result files to bench/compare.py to spot regressions between versions.
+"""
+
+import gc
+import json
+import sys
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+try:
+    from time import ticks_us, ticks_diff
+except ImportError:
+    from time import perf_counter
+
+    def ticks_us():
+        return int(perf_counter() * 1000000)
+
+    def ticks_diff(end, start):
+        return end - start
+
+try:
+    BENCH_DIR = __file__.rsplit('/', 1)[0] if '/' in __file__ else '.'
+except NameError:
+    BENCH_DIR = 'bench'
+sys.path.insert(0, BENCH_DIR + '/..')
+
+from micropyGPS import MicropyGPS
+
+CORPORA = ('clean', 'noisy', 'multi_gnss', 'cold_start', 'pvt')
+# Corpora in UBX binary rather than NMEA text
+UBX_CORPORA = ('pvt',)
+# name -> (method, chunk size); 64 bytes is about one 50 ms UART poll at 9600 baud
+METHODS = {'update': ('update', 1),
+           'update_bytes': ('update_bytes', 64),
+           'update_bytes_512': ('update_bytes', 512)}
+# name -> MicropyGPS keyword arguments
+CONFIGS = {'default': {},
+           'gga_only': {'sentences': ('GGA',)},
+           'lazy': {'lazy': True},
+           'gga_lazy': {'sentences': ('GGA',), 'lazy': True},
+           # What main.py runs, and the same without lazy decoding
+           'firmware': {'sentences': ('GGA', 'RMC'), 'lazy': True, 'history': 32},
+           'firmware_eager': {'sentences': ('GGA', 'RMC'), 'history': 32},
+           'ubx': {'protocol': 'ubx'}}
+# Shortest timed sample: shorter corpus passes are repeated within one sample
+MIN_SAMPLE_US = 200000
+# Bytes of each corpus fed while measuring allocations, small enough for a heap with gc disabled
+ALLOC_SAMPLE = 8192
+
+
+def load(corpus):
+    with open(BENCH_DIR + '/corpus/' + corpus + ('.ubx' if corpus in UBX_CORPORA else '.nmea'), 'rb') as f:
+        return f.read()
+
+
+def ubx_frames(data):
+    """(class, id) of every frame in a well formed UBX stream"""
+    frames = []
+    pos = data.find(b'\xb5\x62')
+    while 0 <= pos and pos + 6 <= len(data):
+        frames.append((data[pos + 2], data[pos + 3]))
+        pos += 8 + (data[pos + 4] | data[pos + 5] << 8)
+    return frames
+
+
+def count_messages(data, ubx):
+    """Sentences (or UBX frames) started in data, and epochs: GGA sentences or NAV-PVT frames"""
+    if ubx:
+        frames = ubx_frames(data)
+        return len(frames), frames.count((0x01, 0x07))
+    return data.count(b'$'), data.count(b'GGA,')
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def feed(gps, method, chunks):
+    if method == 'update':
+        update = gps.update
+        for chunk in chunks:
+            for b in chunk:
+                update(chr(b))
+    else:
+        update_bytes = gps.update_bytes
+        for chunk in chunks:
+            update_bytes(chunk)
+
+
+def alloc_peak(config, method, chunks):
+    """CPython: tracemalloc peak above the heap at the start while parsing chunks (None elsewhere)"""
+    if tracemalloc is None:
+        return None
+    gps = MicropyGPS(**config)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        feed(gps, method, chunks)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return peak - base
+
+
+def alloc_per_sentence(config, method, chunks):
+    """Heap bytes allocated while parsing chunks, divided by the number of sentences they hold. Only MicroPython
+    exposes the heap counter that makes this exact, so CPython reports None"""
+    if not hasattr(gc, 'mem_alloc'):
+        return None
+    sentences = count_messages(b''.join(chunks), config.get('protocol') == 'ubx')[0] or 1
+    gps = MicropyGPS(**config)
+    gc.collect()
+    gc.disable()
+    try:
+        before = gc.mem_alloc()
+        feed(gps, method, chunks)
+        allocated = gc.mem_alloc() - before
+    finally:
+        gc.enable()
+    return allocated / sentences
+
+
+def run_case(corpus, data, method_name, config_name, repeat):
+    method, chunk_size = METHODS[method_name]
+    config = CONFIGS[config_name]
+    chunks = chunked(data, chunk_size)
+    feed(MicropyGPS(**config), method, chunks)  # warm-up: caches, allocator, frequency scaling
+    times = []
+    gps = None
+    for _ in range(repeat):
+        # Each sample replays the corpus until it has run MIN_SAMPLE_US and keeps its fastest pass, so a
+        # hiccup of the host only costs the pass it lands in
+        fastest = None
+        elapsed = 0
+        gc.collect()
+        while fastest is None or elapsed < MIN_SAMPLE_US:
+            gps = MicropyGPS(**config)
+            start = ticks_us()
+            feed(gps, method, chunks)
+            spent = ticks_diff(ticks_us(), start)
+            elapsed += spent
+            if fastest is None or spent < fastest:
+                fastest = spent
+        times.append(max(fastest, 1))
+    times.sort()
+    best = times[0]
+    seconds = best / 1000000
+    received, epochs = count_messages(data, config.get('protocol') == 'ubx')
+    return {'bench': 'gps',
+            'impl': sys.implementation.name,
+            'version': '.'.join(str(v) for v in sys.implementation.version[:3]),
+            'corpus': corpus,
+            'method': method_name,
+            'chunk': chunk_size,
+            'config': config_name,
+            'bytes': len(data),
+            'seconds': seconds,
+            'repeat': repeat,
+            'spread': (times[len(times) // 2] - best) / best,
+            'chars_per_s': len(data) / seconds,
+            'sentences_per_s': received / seconds,
+            'epochs_per_s': epochs / seconds,
+            'received': received,
+            'clean_sentences': gps.clean_sentences,
+            'parsed_sentences': gps.parsed_sentences,
+            'crc_fails': gps.crc_fails,
+            'skipped_sentences': gps.skipped_sentences,
+            'alloc_bytes_per_sentence': alloc_per_sentence(config, method, chunked(data[:ALLOC_SAMPLE], chunk_size)),
+            'alloc_peak_bytes': alloc_peak(config, method, chunked(data[:ALLOC_SAMPLE], chunk_size))}
+
+
+def parse_args(argv):
+    args = {'out': None, 'label': None, 'repeat': 5,
+            'corpus': CORPORA, 'method': tuple(METHODS), 'config': tuple(CONFIGS)}
+    i = 1
+    while i < len(argv):
+        key = argv[i].lstrip('-')
+        if key not in args or i + 1 >= len(argv):
+            print(__doc__)
+            raise SystemExit(2)
+        value = argv[i + 1]
+        if key == 'repeat':
+            value = int(value)
+        elif key in ('corpus', 'method', 'config'):
+            value = tuple(value.split(','))
+        args[key] = value
+        i += 2
+    return args
+
+
+def main(argv):
+    args = parse_args(argv)
+    out = open(args['out'], 'w') if args['out'] else None
+    try:
+        for corpus in args['corpus']:
+            data = load(corpus)
+            for method_name in args['method']:
+                for config_name in args['config']:
+                    # NMEA configs on NMEA corpora, the ubx config on UBX corpora
+                    if (corpus in UBX_CORPORA) != (CONFIGS[config_name].get('protocol') == 'ubx'):
+                        continue
+                    result = run_case(corpus, data, method_name, config_name, args['repeat'])
+                    if args['label']:
+                        result['label'] = args['label']
+                    line = json.dumps(result)
+                    print(line)
+                    if out:
+                        out.write(line + '\n')
+    finally:
+        if out:
+            out.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,121 @@
+"""
+Cost of logging receiver data with MicropyGPS, over the NMEA replay corpus in corpus/. From the pico_w
+directory (on a board, run it from a directory on the flash filesystem):
+
+    python3 bench/bench_log.py [--corpus clean] [--repeat 3] [--out results.jsonl]
+    micropython bench/bench_log.py
+
+The corpus is fed in 64 byte blocks (one 50 ms UART poll at 9600 baud). Each case prints one JSON object
+with the best of --repeat runs: seconds, chars/sec, bytes written, file writes and the time added over
+parsing without a log:
+
+    none        update_bytes() without logging, the baseline
+    per_char    one file write per printable char, what start_logging() used to do (parsing excluded)
+    raw         update_bytes() with start_logging(): the blocks as received, through the GPSLog buffer
+    valid_only  update_bytes() with start_logging(valid_only=True): CRC-valid sentences, one per line
+"""
+
+import json
+import sys
+
+try:
+    import uos as os
+except ImportError:
+    import os
+
+try:
+    from time import ticks_us, ticks_diff
+except ImportError:
+    from time import perf_counter
+
+    def ticks_us():
+        return int(perf_counter() * 1000000)
+
+    def ticks_diff(end, start):
+        return end - start
+
+try:
+    BENCH_DIR = __file__.rsplit('/', 1)[0] if '/' in __file__ else '.'
+except NameError:
+    BENCH_DIR = 'bench'
+sys.path.insert(0, BENCH_DIR + '/..')
+
+from micropyGPS import MicropyGPS
+
+CHUNK = 64
+LOG_FILE = 'bench_log.tmp'
+
+
+def per_char(data, chunks):
+    with open(LOG_FILE, 'w') as f:
+        writes = 0
+        for c in data:
+            if 10 <= c <= 126:
+                f.write(chr(c))
+                writes += 1
+    return writes, writes
+
+
+def parse(chunks, **logging):
+    gps = MicropyGPS()
+    if logging:
+        gps.start_logging(LOG_FILE, 'new', **logging)
+    for chunk in chunks:
+        gps.update_bytes(chunk)
+    log = gps.log_handle
+    if not logging:
+        return 0, 0
+    gps.stop_logging()
+    return log.bytes_written, log.flushes
+
+
+CASES = (('none', lambda data, chunks: parse(chunks)),
+         ('per_char', per_char),
+         ('raw', lambda data, chunks: parse(chunks, valid_only=False)),
+         ('valid_only', lambda data, chunks: parse(chunks, valid_only=True)))
+
+
+def main(argv):
+    options = {'corpus': 'clean', 'repeat': 3, 'out': None}
+    for i in range(1, len(argv) - 1, 2):
+        name = argv[i].lstrip('-')
+        if name not in options:
+            print(__doc__)
+            return 2
+        options[name] = int(argv[i + 1]) if name == 'repeat' else argv[i + 1]
+    with open(BENCH_DIR + '/corpus/' + options['corpus'] + '.nmea', 'rb') as f:
+        data = f.read()
+    chunks = [data[i:i + CHUNK] for i in range(0, len(data), CHUNK)]
+    out = open(options['out'], 'w') if options['out'] else None
+    baseline = None
+    try:
+        for name, run in CASES:
+            best = None
+            for _ in range(options['repeat']):
+                start = ticks_us()
+                written, writes = run(data, chunks)
+                elapsed = ticks_diff(ticks_us(), start)
+                if best is None or elapsed < best:
+                    best = elapsed
+            if baseline is None:
+                baseline = best
+            seconds = max(best, 1) / 1000000
+            line = json.dumps({'bench': 'log', 'impl': sys.implementation.name, 'corpus': options['corpus'],
+                               'case': name, 'seconds': seconds, 'chars_per_s': len(data) / seconds,
+                               'bytes_written': written, 'file_writes': writes,
+                               'overhead_s': None if name == 'per_char' else (best - baseline) / 1000000})
+            print(line)
+            if out:
+                out.write(line + '\n')
+    finally:
+        if out:
+            out.close()
+        try:
+            os.remove(LOG_FILE)
+        except OSError:
+            pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,164 @@
+"""
+Heap benchmark for batch uploads through urequests.Session, from the pico_w directory:
+
+    python3 bench/bench_upload.py [--values 10] [--size 1000] [--url http://host:port]
+
+Without --url a local Adafruit IO stand-in (sim/aio_server.py) is started in a child process and
+sim/usocket.py / sim/ujson.py stand in for the MicroPython modules, so it runs on CPython as is; on a
+board or the MicroPython unix port pass the URL of a running stand-in. Each case prints one JSON object per line with the heap used while sending
+the same batch body (the response is drained through a small buffer and not counted):
+
+    materialized  JSON payload built with ujson.dumps and passed as a str (previous enviar_batch)
+    streamed      generator of per-value pieces with a precomputed Content-Length (current enviar_batch)
+    file          the payload read from a file object through the session buffer
+
+On CPython the figure is the tracemalloc peak; on MicroPython it is the heap allocated during the
+request with the collector disabled (an upper bound of the peak). socket_writes counts the writes of the
+request (CPython only, through the sim/usocket.py counter): on the board each one is a TLS record.
+"""
+
+import gc
+import json
+import os
+import sys
+
+try:
+    BENCH_DIR = __file__.rsplit('/', 1)[0] if '/' in __file__ else '.'
+except NameError:
+    BENCH_DIR = 'bench'
+sys.path.insert(0, BENCH_DIR + '/..')
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+else:
+    sys.path.insert(0, BENCH_DIR + '/../sim')
+
+import urequests
+import usocket
+from batchbuilder import escaped_size
+
+try:
+    import ujson
+except ImportError:
+    ujson = json
+
+KEY = 'aio_bench'
+
+
+def batch_values(count, size):
+    line = 'Red_%03d,WPA2-PSK,21.881800,-102.291600,-70,AA:BB:CC:DD:EE:FF\n'
+    values = []
+    for i in range(count):
+        text = ''
+        n = 0
+        while len(text) + len(line) <= size:
+            text += line % n
+            n += 1
+        values.append(text)
+    return values
+
+
+def streamed_body(values):
+    yield '['
+    for i, v in enumerate(values):
+        yield ',{"value":' if i else '{"value":'
+        yield ujson.dumps(v)
+        yield '}'
+    yield ']'
+
+
+def drain(resp):
+    # The stand-in echoes every record back: skip it in constant memory so only the upload is measured
+    buf = bytearray(256)
+    while resp.readinto(buf):
+        pass
+    return resp.status_code
+
+
+def measure(send):
+    gc.collect()
+    if tracemalloc:
+        tracemalloc.start()
+        status = send()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return status, peak
+    gc.disable()
+    before = gc.mem_alloc()
+    status = send()
+    used = gc.mem_alloc() - before
+    gc.enable()
+    return status, used
+
+
+def socket_writes():
+    stats = getattr(usocket, 'stats', None)
+    return stats['writes'] if stats else None
+
+
+def run(url, count, size):
+    values = batch_values(count, size)
+    headers = {'X-AIO-Key': KEY, 'Content-Type': 'application/json'}
+    session = urequests.Session()
+    payload_size = len(ujson.dumps([{'value': v} for v in values]))
+    with open('bench_upload.tmp', 'w') as f:
+        f.write(ujson.dumps([{'value': v} for v in values]))
+
+    def materialized():
+        payload = ujson.dumps([{'value': v} for v in values])
+        return drain(session.request('POST', url, data=payload, headers=headers, stream=True))
+
+    def streamed():
+        length = 2 + sum(len('{"value":}') + escaped_size(v) + 2 for v in values) + len(values) - 1
+        h = dict(headers)
+        h['Content-Length'] = length
+        return drain(session.request('POST', url, data=streamed_body(values), headers=h, stream=True))
+
+    def from_file():
+        with open('bench_upload.tmp', 'rb') as f:
+            return drain(session.request('POST', url, data=f, headers=headers, stream=True))
+
+    # Warm up the connection so every case measures the request alone
+    session.request('POST', url, data=ujson.dumps([{'value': 'warmup'}]), headers=headers)
+    for name, send in (('materialized', materialized), ('streamed', streamed), ('file', from_file)):
+        writes = socket_writes()
+        status, heap = measure(send)
+        if writes is not None:
+            writes = socket_writes() - writes
+        print(json.dumps({'bench': 'upload', 'impl': sys.implementation.name, 'case': name,
+                          'values': count, 'payload_bytes': payload_size, 'status': status,
+                          'heap_bytes': heap, 'socket_writes': writes}))
+    session.close()
+    os.remove('bench_upload.tmp')
+
+
+def main(argv):
+    options = {'values': 10, 'size': 1000, 'url': None}
+    for i in range(1, len(argv) - 1, 2):
+        name = argv[i].lstrip('-')
+        if name not in options:
+            print(__doc__)
+            return 2
+        options[name] = argv[i + 1] if name == 'url' else int(argv[i + 1])
+    server = None
+    base = options['url']
+    if base is None:
+        # Separate process, so tracemalloc sees only the client side
+        import subprocess
+        server = subprocess.Popen([sys.executable, '-u', BENCH_DIR + '/../sim/aio_server.py', '--port', '0',
+                                   '--key', KEY, '--max-value', str(options['size'] + 64)],
+                                  stdout=subprocess.PIPE, universal_newlines=True)
+        base = 'http://127.0.0.1:%s' % server.stdout.readline().split()[-1]
+    try:
+        run(base + '/api/v2/bench/feeds/bench/data/batch', options['values'], options['size'])
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
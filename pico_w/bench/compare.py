@@ -0,0 +1,67 @@
+"""
+Compares two result files written by the bench scripts (host only, CPython):
+
+    python3 bench/compare.py base.jsonl new.jsonl [--threshold 0.9]
+
+Cases are matched on everything that identifies them (bench, impl, corpus, method, chunk, config...). Prints the
+throughput ratio new/base, the noise of the two runs (the sum of their spreads) and the change in allocations
+(bytes per sentence on MicroPython, tracemalloc peak bytes on CPython), and exits with status 1 when any case
+runs slower than threshold times the base, widened by the noise so that timing jitter alone is not taken for
+a regression, or its parser statistics changed.
+"""
+
+import json
+import sys
+
+KEY_FIELDS = ('bench', 'impl', 'corpus', 'method', 'chunk', 'config')
+STAT_FIELDS = ('received', 'clean_sentences', 'parsed_sentences', 'crc_fails', 'skipped_sentences')
+
+
+def load(path):
+    results = {}
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                result = json.loads(line)
+                results[tuple(result.get(k) for k in KEY_FIELDS)] = result
+    return results
+
+
+def alloc_change(old, cur):
+    for field in ('alloc_bytes_per_sentence', 'alloc_peak_bytes'):
+        if old.get(field) is not None and cur.get(field) is not None:
+            return '%+.1f' % (cur[field] - old[field])
+    return '-'
+
+
+def main(argv):
+    if len(argv) not in (3, 5):
+        print(__doc__)
+        return 2
+    threshold = float(argv[4]) if len(argv) == 5 else 0.9
+    base, new = load(argv[1]), load(argv[2])
+    failed = False
+
+    print('%-48s %10s %10s %7s %7s %11s' % ('case', 'base c/s', 'new c/s', 'ratio', 'noise', 'alloc +/-'))
+    for key in sorted(set(base) & set(new), key=lambda k: tuple(str(v) for v in k)):
+        old, cur = base[key], new[key]
+        ratio = cur['chars_per_s'] / old['chars_per_s']
+        noise = (old.get('spread') or 0) + (cur.get('spread') or 0)
+        flags = []
+        if ratio < threshold / (1 + noise):
+            flags.append('SLOWER')
+        if any(old.get(f) != cur.get(f) for f in STAT_FIELDS):
+            flags.append('STATS CHANGED')
+        failed = failed or bool(flags)
+        print('%-48s %10.0f %10.0f %7.2f %6.0f%% %11s %s' % ('/'.join(str(v) for v in key[1:]), old['chars_per_s'],
+                                                             cur['chars_per_s'], ratio, noise * 100,
+                                                             alloc_change(old, cur), ' '.join(flags)))
+
+    for key in sorted(set(base) ^ set(new), key=lambda k: tuple(str(v) for v in k)):
+        print('%-48s only in %s' % ('/'.join(str(v) for v in key[1:]), argv[1] if key in base else argv[2]))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,227 @@
+"""
+Generates the NMEA replay corpus used by bench_gps.py (host only, CPython).
+
+The streams follow a drive around Aguascalientes at 1 Hz and are fully deterministic, so the files
+committed under corpus/ can be regenerated byte for byte:
+
+    python3 bench/make_corpus.py
+
+    clean.nmea       u-blox style GPS only output: RMC, VTG, GGA, GSA, GSV, GLL per epoch
+    noisy.nmea       clean.nmea with flipped, dropped and injected bytes (CRC failures, broken sentences)
+    multi_gnss.nmea  GN talker RMC/GGA/GSA plus separate GP and GL satellites in view
+    cold_start.nmea  receiver searching without a fix, satellites slowly appearing, fix in the last epochs
+    pvt.ubx          the clean.nmea drive as u-blox binary output: NAV-PVT and NAV-DOP per epoch
+"""
+
+import math
+import os
+import random
+import struct
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+EPOCHS = 240
+START = (21.8818, -102.2916)  # Centro, Aguascalientes
+DATE = '181025'
+
+
+def checksum(body):
+    crc = 0
+    for c in body.encode():
+        crc ^= c
+    return '%02X' % crc
+
+
+def sentence(body):
+    return '$%s*%s\r\n' % (body, checksum(body))
+
+
+def nmea_lat(lat):
+    deg = int(abs(lat))
+    return '%02d%08.5f' % (deg, (abs(lat) - deg) * 60), 'N' if lat >= 0 else 'S'
+
+
+def nmea_lon(lon):
+    deg = int(abs(lon))
+    return '%03d%08.5f' % (deg, (abs(lon) - deg) * 60), 'E' if lon >= 0 else 'W'
+
+
+def utc(second):
+    second += 17 * 3600 + 5 * 60
+    return '%02d%02d%05.2f' % (second // 3600 % 24, second // 60 % 60, second % 60)
+
+
+def drive(rng):
+    """Yields (lat, lon, speed_knots, course) per second: city driving with stops and a highway stretch"""
+    lat, lon = START
+    course = 35.0
+    for second in range(EPOCHS):
+        if second % 70 < 12:
+            speed = 0.0                                   # red light
+        elif 140 <= second < 200:
+            speed = 52.0 + rng.uniform(-2, 2)             # highway, ~100 km/h
+        else:
+            speed = 18.0 + rng.uniform(-6, 6)             # city
+        if speed and rng.random() < 0.05:
+            course = (course + rng.choice((-90, 90))) % 360
+        course_out = (course + rng.uniform(-3, 3)) % 360 if speed else 0.0
+        metres = speed * 0.514444
+        lat += metres * math.cos(math.radians(course)) / 111320.0
+        lon += metres * math.sin(math.radians(course)) / (111320.0 * math.cos(math.radians(lat)))
+        yield second, lat, lon, speed, course_out
+
+
+def satellites(rng, prns, second):
+    sats = []
+    for i, prn in enumerate(prns):
+        elevation = (17 * prn + second // 30) % 85 + 5
+        azimuth = (41 * prn + 3 * i + second // 10) % 360
+        snr = 20 + (prn * 7 + second) % 25 if rng.random() > 0.1 else None
+        sats.append((prn, elevation, azimuth, snr))
+    return sats
+
+
+def gsv(talker, sats):
+    out = []
+    total = (len(sats) + 3) // 4
+    for n in range(total):
+        fields = ['%sGSV' % talker, str(total), str(n + 1), '%02d' % len(sats)]
+        for prn, elevation, azimuth, snr in sats[n * 4:n * 4 + 4]:
+            fields += ['%02d' % prn, '%02d' % elevation, '%03d' % azimuth, '' if snr is None else '%02d' % snr]
+        out.append(sentence(','.join(fields)))
+    return out
+
+
+def epoch(talker, second, lat, lon, speed, course, fix=True, used=(), hdop=0.94):
+    t = utc(second)
+    la, ns = nmea_lat(lat) if fix else ('', '')
+    lo, ew = nmea_lon(lon) if fix else ('', '')
+    spd = '%.3f' % speed if fix else ''
+    crs = '%.2f' % course if fix and speed else ''
+    status = 'A' if fix else 'V'
+    mode = 'A' if fix else 'N'
+    used = list(used)[:12]
+    out = [sentence('%sRMC,%s,%s,%s,%s,%s,%s,%s,%s,%s,,,%s' % (talker, t, status, la, ns, lo, ew, spd, crs, DATE, mode)),
+           sentence('%sVTG,%s,T,,M,%s,N,%s,K,%s' % (talker, crs, spd, '%.3f' % (speed * 1.852) if fix else '', mode)),
+           sentence('%sGGA,%s,%s,%s,%s,%s,%d,%02d,%s,%s,M,%s,M,,' % (
+               talker, t, la, ns, lo, ew, 1 if fix else 0, len(used), '%.2f' % hdop if fix else '99.99',
+               '1880.4' if fix else '', '-8.9' if fix else ''))]
+    gsa_fix = 3 if fix else 1
+    prns = ['%02d' % p for p in used] + [''] * (12 - len(used))
+    dops = ('1.71', '%.2f' % hdop, '1.42') if fix else ('99.99', '99.99', '99.99')
+    out.append(sentence('%sGSA,A,%d,%s,%s,%s,%s' % (talker, gsa_fix, ','.join(prns), dops[0], dops[1], dops[2])))
+    return out, sentence('%sGLL,%s,%s,%s,%s,%s,%s,%s' % (talker, la, ns, lo, ew, t, status, mode))
+
+
+def clean(rng):
+    out = []
+    gps_prns = (2, 5, 6, 12, 13, 15, 19, 24, 25, 29)
+    for second, lat, lon, speed, course in drive(rng):
+        used = gps_prns[:8 - (second // 50) % 3]
+        body, gll = epoch('GP', second, lat, lon, speed, course, used=used, hdop=0.8 + (second % 9) / 10)
+        out += body
+        out += gsv('GP', satellites(rng, gps_prns, second))
+        out.append(gll)
+    return ''.join(out)
+
+
+def multi_gnss(rng):
+    out = []
+    gps_prns = (2, 5, 6, 12, 13, 15, 19, 24, 25, 29)
+    glo_prns = (65, 66, 72, 73, 74, 81, 82, 88)
+    for second, lat, lon, speed, course in drive(rng):
+        body, gll = epoch('GN', second, lat, lon, speed, course, used=gps_prns[:8], hdop=0.62)
+        out += body[:3]
+        # One GSA per constellation, as u-blox M8 receivers report them
+        out.append(body[3])
+        out.append(sentence('GNGSA,A,3,%s,,,,,,,1.21,0.62,1.04' % ','.join('%02d' % p for p in glo_prns[:6])))
+        out += gsv('GP', satellites(rng, gps_prns, second))
+        out += gsv('GL', satellites(rng, glo_prns, second))
+        out.append(gll)
+    return ''.join(out)
+
+
+def cold_start(rng):
+    out = []
+    gps_prns = (2, 5, 6, 12, 13, 15, 19, 24, 25, 29)
+    for second, lat, lon, speed, course in drive(rng):
+        seen = gps_prns[:min(len(gps_prns), second // 20)]
+        fix = second >= EPOCHS - 20
+        body, gll = epoch('GP', second, lat, lon, speed, course, fix=fix, used=seen[:6] if fix else (), hdop=2.4)
+        out += body
+        if seen:
+            out += gsv('GP', satellites(rng, seen, second))
+        else:
+            out.append(sentence('GPGSV,1,1,00'))
+        out.append(gll)
+    return ''.join(out)
+
+
+def ubx(cls, msg_id, payload):
+    body = struct.pack('<BBH', cls, msg_id, len(payload)) + payload
+    a = b = 0
+    for c in body:
+        a = (a + c) & 0xFF
+        b = (b + a) & 0xFF
+    return b'\xb5\x62' + body + bytes((a, b))
+
+
+def pvt(rng):
+    out = []
+    gps_prns = (2, 5, 6, 12, 13, 15, 19, 24, 25, 29)
+    for second, lat, lon, speed, course in drive(rng):
+        # Same random draws as clean() so both files follow the same drive
+        satellites(rng, gps_prns, second)
+        used = 8 - (second // 50) % 3
+        hdop = 0.8 + (second % 9) / 10
+        t = second + 17 * 3600 + 5 * 60
+        itow = (6 * 86400 + t) * 1000
+        mm_s = speed * 514.444
+        payload = struct.pack('<IHBBBBBBIiBBBBiiiiIIiiiiiIIHB5sihH',
+                              itow, 2025, 10, 18, t // 3600 % 24, t // 60 % 60, t % 60, 0x07, 30, 0,
+                              3, 0x01, 0, used,
+                              int(round(lon * 1e7)), int(round(lat * 1e7)), 1871500, 1880400,
+                              int(hdop * 2500), 3500,
+                              int(mm_s * math.cos(math.radians(course))), int(mm_s * math.sin(math.radians(course))), 0,
+                              int(mm_s), int(course * 100000), 300, 150000 if speed else 18000000, 171,
+                              0, b'\0' * 5, 0, 0, 0)
+        out.append(ubx(0x01, 0x07, payload))
+        out.append(ubx(0x01, 0x04, struct.pack('<IHHHHHHH', itow, 200, 171, 100, 142, int(hdop * 100), 80, 60)))
+    return b''.join(out)
+
+
+def noisy(rng, data):
+    """Corrupts roughly one byte in 150: bit flips, drops, stray '$' and line noise"""
+    out = bytearray()
+    for b in data.encode():
+        r = rng.random()
+        if r < 0.002:
+            continue
+        elif r < 0.004:
+            out.append(b ^ (1 << rng.randrange(7)))
+        elif r < 0.005:
+            out.append(b)
+            out.append(0x24)
+        elif r < 0.0066:
+            out.append(b)
+            out.append(rng.choice((0x00, 0xFF, 0x0D)))
+        else:
+            out.append(b)
+    return bytes(out)
+
+
+def main():
+    if not os.path.isdir(CORPUS_DIR):
+        os.mkdir(CORPUS_DIR)
+    files = {'clean.nmea': clean(random.Random(1)).encode(),
+             'multi_gnss.nmea': multi_gnss(random.Random(2)).encode(),
+             'cold_start.nmea': cold_start(random.Random(3)).encode(),
+             'pvt.ubx': pvt(random.Random(1))}
+    files['noisy.nmea'] = noisy(random.Random(4), clean(random.Random(1)))
+    for name in sorted(files):
+        with open(os.path.join(CORPUS_DIR, name), 'wb') as f:
+            f.write(files[name])
+        print('%-16s %7d bytes' % (name, len(files[name])))
+
+
+if __name__ == '__main__':
+    main()
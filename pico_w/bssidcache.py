@@ -0,0 +1,124 @@
+"""
+bssidcache - fixed-memory seen-set of access points keyed by BSSID (MicroPython / CPython)
+
+An open-addressing hash table in a single preallocated bytearray. Each slot holds
+
+    <6sbBiiH  BSSID, best RSSI, used flag, latitude E7, longitude E7 (where the AP was reported),
+              last-seen stamp
+
+A lookup probes at most PROBES slots; when they are all taken the least recently seen one is
+replaced, so memory never grows and stale APs age out first.
+"""
+
+try:
+    import ustruct as struct
+except ImportError:
+    import struct
+
+from micropyGPS import offset_e7
+
+SLOT = '<6sbBiiH'
+SLOT_SIZE = struct.calcsize(SLOT)
+PROBES = 8
+FILE_MAGIC = b'BC1'
+
+
+def bssid_hash(bssid):
+    """Table hash for a 6-byte BSSID; the low bytes vary most between APs of the same vendor"""
+    return (bssid[4] << 8 | bssid[5]) ^ (bssid[3] << 5) ^ (bssid[2] * 131) ^ (bssid[1] << 3) ^ (bssid[0] * 7)
+
+
+class SeenCache(object):
+    """Decides whether a sighting is worth reporting: new AP, AP seen far from where it was
+    reported, or RSSI notably stronger than the best reported one"""
+
+    def __init__(self, capacity=512, rssi_margin=8, move_meters=100):
+        # Capacity rounded up to a power of two so the hash can be masked
+        size = 1
+        while size < capacity:
+            size <<= 1
+        self.capacity = size
+        self.rssi_margin = rssi_margin
+        self.move_meters = move_meters
+        self._mask = size - 1
+        self._table = bytearray(size * SLOT_SIZE)
+        self._stamp = 0
+
+        # Statistics
+        self.lookups = 0
+        self.suppressed = 0
+        self.new = 0
+        self.moved = 0
+        self.stronger = 0
+        self.evictions = 0
+
+    def _moved(self, lat_e7, lon_e7, old_lat, old_lon):
+        dx, dy = offset_e7(old_lat, old_lon, lat_e7, lon_e7)
+        return dx * dx + dy * dy > self.move_meters * self.move_meters
+
+    def check(self, bssid, rssi, lat_e7, lon_e7):
+        """Record a sighting. Returns True if it should be reported, False if it is a repeat."""
+        self.lookups += 1
+        self._stamp = (self._stamp + 1) & 0xFFFF
+        bssid = bytes(bssid)
+        table = self._table
+        index = bssid_hash(bssid) & self._mask
+        victim = -1
+        victim_age = -1
+        for _ in range(PROBES):
+            offset = index * SLOT_SIZE
+            if not table[offset + 7]:
+                # Free slot: new AP
+                struct.pack_into(SLOT, table, offset, bssid, rssi, 1, lat_e7, lon_e7, self._stamp)
+                self.new += 1
+                return True
+            if table[offset:offset + 6] == bssid:
+                _, best, _, old_lat, old_lon, _ = struct.unpack_from(SLOT, table, offset)
+                if self._moved(lat_e7, lon_e7, old_lat, old_lon):
+                    self.moved += 1
+                elif rssi >= best + self.rssi_margin:
+                    self.stronger += 1
+                else:
+                    struct.pack_into('<H', table, offset + SLOT_SIZE - 2, self._stamp)
+                    self.suppressed += 1
+                    return False
+                struct.pack_into(SLOT, table, offset, bssid, rssi, 1, lat_e7, lon_e7, self._stamp)
+                return True
+            age = (self._stamp - struct.unpack_from('<H', table, offset + SLOT_SIZE - 2)[0]) & 0xFFFF
+            if age > victim_age:
+                victim = offset
+                victim_age = age
+            index = (index + 1) & self._mask
+        # Probe window full: replace the least recently seen AP
+        struct.pack_into(SLOT, table, victim, bssid, rssi, 1, lat_e7, lon_e7, self._stamp)
+        self.evictions += 1
+        self.new += 1
+        return True
+
+    def hit_ratio(self):
+        """Fraction of sightings suppressed as repeats"""
+        return self.suppressed / self.lookups if self.lookups else 0
+
+    def save(self, path):
+        """Write the table to a file so the seen-set survives reboots"""
+        with open(path, 'wb') as f:
+            f.write(FILE_MAGIC + struct.pack('<IH', self.capacity, self._stamp))
+            f.write(self._table)
+
+    def load(self, path):
+        """Load a table written by save(). Returns False if the file is missing or does not match."""
+        try:
+            with open(path, 'rb') as f:
+                header = f.read(len(FILE_MAGIC) + 6)
+                if header[:len(FILE_MAGIC)] != FILE_MAGIC:
+                    return False
+                capacity, stamp = struct.unpack('<IH', header[len(FILE_MAGIC):])
+                if capacity != self.capacity:
+                    return False
+                if f.readinto(self._table) != len(self._table):
+                    self._table = bytearray(len(self._table))
+                    return False
+        except OSError:
+            return False
+        self._stamp = stamp
+        return True
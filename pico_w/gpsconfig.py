@@ -0,0 +1,308 @@
+"""
+gpsconfig - receiver setup at startup: baud rate, navigation rate and output messages (MicroPython / CPython)
+
+Speaks PMTK text commands to MediaTek receivers and UBX-CFG binary messages to u-blox receivers. The
+receiver's current baud rate and type are found from its own output, every command is checked against
+its acknowledgement (PMTK001, UBX ACK-ACK / ACK-NAK), and a baud rate change is confirmed by reading
+valid data at the new rate, reverting to the old one otherwise. A step that fails leaves the receiver's
+default in place; configure() reports what was applied so the caller parses what is really sent.
+
+Blocking (a few seconds at most): meant to run once at boot, before the parser tasks start.
+"""
+
+try:
+    from utime import ticks_ms, ticks_diff, sleep_ms
+except ImportError:
+    import time
+
+    def ticks_ms():
+        return int(time.time() * 1000) & 0x3FFFFFFF
+
+    def ticks_diff(end, start):
+        return ((end - start + 0x20000000) & 0x3FFFFFFF) - 0x20000000
+
+    def sleep_ms(ms):
+        time.sleep(ms / 1000)
+
+try:
+    import ustruct as struct
+except ImportError:
+    import struct
+
+# Tried in this order after the UART's current rate
+BAUDRATES = (9600, 115200, 38400, 57600)
+# Output messages every receiver here can be asked about, by 3 letter NMEA type
+NMEA_TYPES = ('GGA', 'GLL', 'GSA', 'GSV', 'RMC', 'VTG')
+# PMTK314 field of each type (MT3339 order: GLL, RMC, VTG, GGA, GSA, GSV, ..., 19 fields)
+_PMTK314_FIELDS = {'GLL': 0, 'RMC': 1, 'VTG': 2, 'GGA': 3, 'GSA': 4, 'GSV': 5}
+# u-blox NMEA message ids (class 0xF0)
+_UBX_NMEA_IDS = {'GGA': 0x00, 'GLL': 0x01, 'GSA': 0x02, 'GSV': 0x03, 'RMC': 0x04, 'VTG': 0x05}
+UBX_NAV_PVT = (0x01, 0x07)
+# Bytes per epoch used to check that an output rate fits the link (GSV is about three sentences)
+_EPOCH_BYTES = {'GGA': 75, 'GLL': 50, 'GSA': 65, 'GSV': 210, 'RMC': 70, 'VTG': 40, 'PVT': 100}
+# Share of the line rate the receiver output may take
+LINK_BUDGET = 0.8
+_BUFFER_LIMIT = 4096
+
+
+def nmea_command(body):
+    """$body*CS\\r\\n as bytes"""
+    crc = 0
+    for c in body.encode():
+        crc ^= c
+    return ('$%s*%02X\r\n' % (body, crc)).encode()
+
+
+def ubx_message(msg_class, msg_id, payload=b''):
+    """A complete UBX frame: sync chars, header, payload and Fletcher checksum"""
+    body = struct.pack('<BBH', msg_class, msg_id, len(payload)) + payload
+    a = b = 0
+    for c in body:
+        a = (a + c) & 0xFF
+        b = (b + a) & 0xFF
+    return b'\xb5\x62' + body + bytes((a, b))
+
+
+def find_nmea(buf):
+    """True if buf holds a complete NMEA sentence with a correct checksum"""
+    pos = buf.find(b'$')
+    while pos >= 0:
+        star = buf.find(b'*', pos)
+        if star < 0 or star + 3 > len(buf):
+            return False
+        if star - pos <= 90:
+            crc = 0
+            for c in buf[pos + 1:star]:
+                if c < 32 or c > 126:
+                    break
+                crc ^= c
+            else:
+                try:
+                    if crc == int(buf[star + 1:star + 3], 16):
+                        return True
+                except ValueError:
+                    pass
+        pos = buf.find(b'$', pos + 1)
+    return False
+
+
+def find_ubx(buf, msg=None):
+    """True if buf holds a complete UBX frame with a correct checksum (of class/id msg, when given)"""
+    pos = buf.find(b'\xb5\x62')
+    while 0 <= pos and pos + 8 <= len(buf):
+        length = buf[pos + 4] | buf[pos + 5] << 8
+        end = pos + 8 + length
+        if length <= 512 and end <= len(buf):
+            frame = ubx_message(buf[pos + 2], buf[pos + 3], bytes(buf[pos + 6:end - 2]))
+            if frame[-2:] == buf[end - 2:end] and (msg is None or (buf[pos + 2], buf[pos + 3]) == msg):
+                return True
+        pos = buf.find(b'\xb5\x62', pos + 1)
+    return False
+
+
+class ReceiverConfig(object):
+    """Detects and configures a GPS receiver on a UART.
+
+    uart needs any(), read() and write(); set_baud(rate) changes the UART's own baud rate and defaults to
+    uart.init(baudrate=rate). timeout is how long to wait for each acknowledgement, in ms.
+    """
+
+    def __init__(self, uart, baudrate=9600, set_baud=None, timeout=1000):
+        self.uart = uart
+        self.baudrate = baudrate
+        self._set_baud = set_baud or (lambda rate: uart.init(baudrate=rate))
+        self.timeout = timeout
+        self.receiver = None
+        self.protocol = 'nmea'
+
+        # Statistics
+        self.commands = 0
+        self.acks = 0
+        self.naks = 0
+
+    def _switch(self, baudrate):
+        self._set_baud(baudrate)
+        self.baudrate = baudrate
+
+    def _drain(self):
+        while self.uart.any():
+            self.uart.read()
+
+    def _collect(self, until, timeout):
+        """Read receiver output for up to timeout ms until until(buffer) returns a true value, which is
+        returned (None on timeout)"""
+        buf = bytearray()
+        start = ticks_ms()
+        while True:
+            if self.uart.any():
+                data = self.uart.read()
+                if data:
+                    buf.extend(data)
+                    if len(buf) > _BUFFER_LIMIT:
+                        buf = buf[-_BUFFER_LIMIT // 2:]
+                    found = until(buf)
+                    if found:
+                        return found
+            if ticks_diff(ticks_ms(), start) >= timeout:
+                return None
+            sleep_ms(10)
+
+    def _send(self, data):
+        self.commands += 1
+        self.uart.write(data)
+
+    def listen(self, timeout=1500):
+        """'nmea' or 'ubx' if valid output arrives at the current baud rate within timeout ms, else None"""
+        self._drain()
+        return self._collect(lambda buf: 'ubx' if find_ubx(buf) else 'nmea' if find_nmea(buf) else None,
+                             timeout)
+
+    def detect(self, baudrates=BAUDRATES):
+        """Find the receiver's baud rate (current one first) and type: 'mtk', 'ubx', 'nmea' for an
+        unknown receiver that ignores both command sets, or None when nothing valid is heard"""
+        self.receiver = None
+        original = self.baudrate
+        for rate in (original,) + tuple(r for r in baudrates if r != original):
+            if rate != self.baudrate:
+                self._switch(rate)
+            traffic = self.listen()
+            if traffic is None:
+                continue
+            if traffic == 'ubx':
+                self.receiver = 'ubx'
+            else:
+                # Ask for the firmware release (PMTK605 -> PMTK705), then for the UBX port setup
+                self._send(nmea_command('PMTK605'))
+                if self._collect(lambda buf: b'$PMTK705' in buf, self.timeout):
+                    self.receiver = 'mtk'
+                else:
+                    self._send(ubx_message(0x06, 0x00, b'\x01'))
+                    if self._collect(lambda buf: find_ubx(buf, (0x06, 0x00)), self.timeout):
+                        self.receiver = 'ubx'
+                    else:
+                        self.receiver = 'nmea'
+            return self.receiver
+        if self.baudrate != original:
+            self._switch(original)
+        return None
+
+    def _mtk(self, body):
+        """Send a PMTK command and wait for its PMTK001 acknowledgement; True when executed"""
+        command = body[4:].split(',')[0].encode()
+        key = b'$PMTK001,' + command + b','
+
+        def ack(buf):
+            i = buf.find(key)
+            if i >= 0 and i + len(key) < len(buf):
+                return chr(buf[i + len(key)])
+            return None
+
+        self._send(nmea_command(body))
+        flag = self._collect(ack, self.timeout)
+        if flag == '3':
+            self.acks += 1
+            return True
+        if flag is not None:
+            self.naks += 1
+        return False
+
+    def _ubx(self, msg_class, msg_id, payload):
+        """Send a UBX-CFG message and wait for its ACK-ACK; True when accepted"""
+        ids = bytes((msg_class, msg_id))
+        ack = b'\xb5\x62\x05\x01\x02\x00' + ids
+        nak = b'\xb5\x62\x05\x00\x02\x00' + ids
+        self._send(ubx_message(msg_class, msg_id, payload))
+        reply = self._collect(lambda buf: 'ack' if ack in buf else 'nak' if nak in buf else None, self.timeout)
+        if reply == 'ack':
+            self.acks += 1
+            return True
+        if reply == 'nak':
+            self.naks += 1
+        return False
+
+    def set_messages(self, sentences, protocol='nmea'):
+        """Enable only the given NMEA types (GGA, 'GNRMC'...), or with protocol 'ubx' (u-blox only) only
+        NAV-PVT. Returns True when every change was acknowledged"""
+        wanted = set(s[-3:] for s in sentences)
+        if self.receiver == 'mtk':
+            fields = ['0'] * 19
+            for name in wanted:
+                if name in _PMTK314_FIELDS:
+                    fields[_PMTK314_FIELDS[name]] = '1'
+            return self._mtk('PMTK314,' + ','.join(fields))
+        if self.receiver != 'ubx':
+            return False
+        ok = True
+        if protocol == 'ubx':
+            # NAV-PVT first: if it is refused the NMEA output is left alone
+            if not self._ubx(0x06, 0x01, bytes(UBX_NAV_PVT) + b'\x01'):
+                return False
+            self.protocol = 'ubx'
+            wanted = ()
+        for name in NMEA_TYPES:
+            ok = self._ubx(0x06, 0x01, bytes((0xF0, _UBX_NMEA_IDS[name], 1 if name in wanted else 0))) and ok
+        return ok
+
+    def set_rate(self, period_ms):
+        """Navigation (fix) period in ms; True when acknowledged"""
+        if self.receiver == 'mtk':
+            return self._mtk('PMTK220,%d' % period_ms)
+        if self.receiver == 'ubx':
+            return self._ubx(0x06, 0x08, struct.pack('<HHH', period_ms, 1, 1))
+        return False
+
+    def set_baud(self, baudrate):
+        """Move receiver and UART to baudrate. Confirmed by valid output at the new rate; otherwise the
+        UART goes back to the old rate. Returns True on success"""
+        old = self.baudrate
+        if self.receiver == 'mtk':
+            self._send(nmea_command('PMTK251,%d' % baudrate))
+        elif self.receiver == 'ubx':
+            # UART1, 8N1, UBX + NMEA in and out; the ACK may be lost in the switch, so it is not awaited
+            self._send(ubx_message(0x06, 0x00, struct.pack('<BBHIIHHHH', 1, 0, 0, 0x08D0, baudrate, 0x03, 0x03, 0, 0)))
+        else:
+            return False
+        flush = getattr(self.uart, 'flush', None)
+        if flush:
+            flush()
+        sleep_ms(100)
+        self._switch(baudrate)
+        if self.listen():
+            return True
+        self._switch(old)
+        return False
+
+    def epoch_bytes(self, sentences, protocol):
+        """Rough bytes the receiver sends per fix with the given output"""
+        if protocol == 'ubx':
+            return _EPOCH_BYTES['PVT']
+        return sum(_EPOCH_BYTES.get(s[-3:], 80) for s in set(sentences))
+
+    def configure(self, baudrate=115200, period_ms=1000, sentences=('GGA', 'RMC'), protocol='nmea'):
+        """Detect the receiver, then trim its output, raise the baud rate and set the fix period. The period
+        is lengthened (in 100 ms steps) when the output would not fit the final baud rate.
+
+        Returns a dict: receiver ('mtk', 'ubx', 'nmea' or None), baudrate (the UART's, final), messages
+        (True if the output was trimmed), protocol ('nmea' or 'ubx', what the receiver sends now), period_ms
+        (applied fix period, None if unchanged)."""
+        result = {'receiver': self.detect(), 'baudrate': self.baudrate, 'messages': False,
+                  'protocol': 'nmea', 'period_ms': None}
+        if self.receiver not in ('mtk', 'ubx'):
+            return result
+        if protocol == 'ubx' and self.receiver != 'ubx':
+            protocol = 'nmea'
+
+        result['messages'] = self.set_messages(sentences, protocol)
+        result['protocol'] = self.protocol
+        if baudrate != self.baudrate:
+            self.set_baud(baudrate)
+        result['baudrate'] = self.baudrate
+
+        # Untrimmed output is every type this module knows about
+        size = self.epoch_bytes(sentences if result['messages'] else NMEA_TYPES, self.protocol)
+        fastest = size * 1000 * 10 / (self.baudrate * LINK_BUDGET)
+        period = max(period_ms, int((fastest + 99) // 100 * 100))
+        if period != 1000 or period_ms != 1000:
+            if self.set_rate(period):
+                result['period_ms'] = period
+        return result
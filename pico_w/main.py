@@ -1,12 +1,24 @@
 # main.py → VERSIÓN FINAL OFICIAL AGUASCALIENTES 2025 (SIN ERRORES 1KB)
 from machine import UART, Pin
 import time
+import gc
 import network
 import uos
-import usocket
 import ujson
-import ssl
+import urequests
+import scanpack
+from ringlog import RingLog
+from bssidcache import SeenCache
+from apestimator import APEstimator
+from scansched import ScanScheduler
+from batchbuilder import BatchBuilder, escaped_size
+import zcodec
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
 from micropyGPS import MicropyGPS
+from gpsconfig import ReceiverConfig
 
 # ===================== CONFIG =====================
 try:
@@ -21,26 +33,144 @@ aio_user = Config.AIO_USERNAME
 aio_key = Config.AIO_KEY
 feed = Config.AIO_FEED
 
-gps_uart = UART(Config.GPS_UART, baudrate=9600, tx=Pin(Config.GPS_TX_PIN), rx=Pin(Config.GPS_RX_PIN))
-gps = MicropyGPS(location_formatting='dd')
+# Posición y satélites de GGA, velocidad y rumbo de RMC (para el planificador);
+# hora, HDOP, velocidad y rumbo se decodifican solo si alguien los lee (lazy)
+SENTENCIAS_GPS = ("GGA", "RMC")
+
+# Buffer RX grande: mientras wlan.scan() o un envío HTTPS bloquean (hasta 12 s),
+# el UART sigue guardando lo que manda el GPS y no se pierde nada. Con solo GGA+RMC
+# a 5 Hz son ~750 B/s (9 KB en 12 s), sea cual sea la velocidad del UART
+GPS_RXBUF = 12288
+gps_uart = UART(Config.GPS_UART, baudrate=9600, tx=Pin(Config.GPS_TX_PIN), rx=Pin(Config.GPS_RX_PIN),
+                rxbuf=GPS_RXBUF)
+
+def baudios_gps(baudios):
+    # init() completo para no perder los pines ni el buffer RX al cambiar de velocidad
+    gps_uart.init(baudrate=baudios, tx=Pin(Config.GPS_TX_PIN), rx=Pin(Config.GPS_RX_PIN), rxbuf=GPS_RXBUF)
+
+# Configuración del receptor al arrancar (MTK por PMTK, u-blox por UBX-CFG): solo las
+# sentencias que usamos, más baudios y más fixes por segundo. Si no responde
+# (NMEA genérico o sin GPS), se queda como venía a 9600 baud y 1 Hz
+GPS_BAUDIOS = getattr(Config, "GPS_BAUDIOS", 115200)
+GPS_PERIODO_MS = getattr(Config, "GPS_PERIODO_MS", 200)  # 5 Hz
+GPS_PROTOCOLO = getattr(Config, "GPS_PROTOCOLO", "nmea")  # "ubx": NAV-PVT binario (solo u-blox)
+receptor = ReceiverConfig(gps_uart, 9600, set_baud=baudios_gps).configure(GPS_BAUDIOS, GPS_PERIODO_MS,
+                                                                         SENTENCIAS_GPS, GPS_PROTOCOLO)
+print("GPS: receptor %s, %d baud, %s, periodo %s ms" % (receptor["receiver"], receptor["baudrate"],
+      receptor["protocol"], receptor["period_ms"] or 1000))
+# Historial de fixes: cada escaneo se etiqueta con la posición interpolada o estimada
+# (velocidad y rumbo) en el instante del escaneo, sin esperar a un fix nuevo
+HISTORIAL_GPS = 32
+MAX_EDAD_FIX = getattr(Config, "MAX_EDAD_FIX", 30) * 1000  # ms desde el fix más cercano
+MAX_INCERTIDUMBRE = getattr(Config, "MAX_INCERTIDUMBRE", 150)  # metros
+gps = MicropyGPS(location_formatting='dd', sentences=SENTENCIAS_GPS, lazy=True, history=HISTORIAL_GPS,
+                 protocol=receptor["protocol"])
+# Log del GPS en flash (opcional, p. ej. GPS_LOG = "gps.nmea"): con buffer y rotación, así se
+# puede dejar activo todo el recorrido. GPS_LOG_VALIDAS guarda solo sentencias con CRC correcto
+GPS_LOG = getattr(Config, "GPS_LOG", None)
+if GPS_LOG:
+    gps.start_logging(GPS_LOG, valid_only=getattr(Config, "GPS_LOG_VALIDAS", True),
+                      max_size=getattr(Config, "GPS_LOG_MAX", 65536), keep=getattr(Config, "GPS_LOG_ARCHIVOS", 3))
 wlan = network.WLAN(network.STA_IF)
 led = Pin("LED", Pin.OUT)
 
 SECURITY = {0: "Abierta", 1: "WEP", 3: "WPA-PSK", 5: "WPA2-PSK", 7: "WPA/WPA2-PSK"}
 PENDING_DIR = "pending"
-lote_acumulado = ""
+# "bin": una línea WD1:<base64> por escaneo (scanpack.py, ~3x más redes por valor de 1 KB)
+# "csv": formato anterior ssid,auth,lat,lon,rssi,mac por red
+FORMATO_REGISTRO = getattr(Config, "FORMATO_REGISTRO", "bin")
 ultimo_envio = 0
 INTERVALO_ENVIO = 90  # 90 segundos máximo → nunca pasa de 1KB
 
-# Crear carpeta pending
+# Cliente HTTP/1.1 keep-alive hacia Adafruit IO (una sola sesión TLS reutilizada).
+# Config.AIO_URL permite apuntar a un servidor local (pico_w/sim/aio_server.py)
+AIO_BASE = getattr(Config, "AIO_URL", "https://io.adafruit.com")
+AIO_URL = f"{AIO_BASE}/api/v2/{aio_user}/feeds/{feed}/data"
+AIO_BATCH_URL = AIO_URL + "/batch"
+MAX_VALOR = 1024  # bytes máximos por valor en Adafruit IO
+MAX_VALORES_BATCH = 10  # valores por petición batch al vaciar pending
+# POSTs de pending por despertar del uploader: cada uno bloquea el loop hasta que responde
+# Adafruit IO, así que se cede el control entre uno y otro y el resto sale en el siguiente lote
+MAX_POSTS_VACIADO = getattr(Config, "MAX_POSTS_VACIADO", 3)
+# Primer registro de pending que no se pudo subir (posición tras él): se reintenta solo, y cada vez
+# que falla mientras el lote nuevo sí sube cuenta como falla suya; tras MAX_INTENTOS_PENDIENTE se
+# salta para no frenar todo el log (una caída de la red no cuenta: ahí tampoco sube el lote nuevo)
+MAX_INTENTOS_PENDIENTE = getattr(Config, "MAX_INTENTOS_PENDIENTE", 5)
+cabeza_fallida = None
+fallos_cabeza = 0
+# Registros de pending con algún valor sin confirmar: posición -> (máscara de las partes que Adafruit IO
+# ya guardó, si ya se reintentó). Lo confirmado no se reenvía y lo rechazado se reintenta una vez
+intentados = {}
+AIO_HEADERS = {"X-AIO-Key": aio_key, "Content-Type": "application/json"}
+# Diagnóstico opcional: estadisticas() se publica en otro feed cada INTERVALO_DIAG segundos,
+# un valor JSON por sección (cada uno < 1 KB) en un solo POST batch
+AIO_FEED_DIAG = getattr(Config, "AIO_FEED_DIAG", None)
+AIO_DIAG_URL = f"{AIO_BASE}/api/v2/{aio_user}/feeds/{AIO_FEED_DIAG}/data"
+INTERVALO_DIAG = getattr(Config, "INTERVALO_DIAG", 600)
+# Compresión opcional (zcodec.py, valor "Z1:<base64 deflate>"): el lote crece hasta
+# COMPRESION_LOTE × MAX_VALOR de texto y se sube comprimido si así cabe en un valor.
+# Solo con CSV: WD1/WE1 ya son binario en base64 y apenas bajan (~0.8), así que el lote
+# doble no cabría en un valor y saldría partido en dos (el doble de valores por lote)
+COMPRIMIR = getattr(Config, "COMPRIMIR", False) and FORMATO_REGISTRO == "csv"
+COMPRESION_LOTE = getattr(Config, "COMPRESION_LOTE", 2)
+sesion = urequests.Session(timeout=12)
+# Dirección de io.adafruit.com en caché: sin DNS en cada envío, y si el DNS del
+# hotspot falla se usa la última buena
+urequests.dns_cache.ttl = getattr(Config, "DNS_TTL", 300)
+# Escaneo según movimiento (scansched.py): cada DISTANCIA_ESCANEO metros recorridos o al girar,
+# entre INTERVALO_MINIMO e INTERVALO_ESCANEO segundos; detenido, el intervalo se duplica en cada
+# escaneo hasta INTERVALO_QUIETO_MAX. Sin fix se escanea cada INTERVALO_ESCANEO como antes
+INTERVALO_ESCANEO = 35
+planificador = ScanScheduler(distance=getattr(Config, "DISTANCIA_ESCANEO", 150),
+                             min_interval=getattr(Config, "INTERVALO_MINIMO", 5) * 1000,
+                             max_interval=INTERVALO_ESCANEO * 1000,
+                             min_idle=INTERVALO_ESCANEO * 1000,
+                             max_idle=getattr(Config, "INTERVALO_QUIETO_MAX", 300) * 1000)
+MAX_COLA_ENVIO = 4  # lotes esperando al uploader; si se llena van a pending
+
+# Métricas: escaneos por minuto y latencia escaneo → envío; tiempos acumulados de cada
+# etapa del ciclo (solo contadores y ticks, se dejan siempre activos)
+stats = {"inicio": time.ticks_ms(), "escaneos": 0, "lotes_enviados": 0, "posts": 0,
+         "latencia_ult_ms": 0, "latencia_max_ms": 0, "latencia_total_ms": 0, "bytes_ahorrados": 0,
+         "comprimidos": 0, "bytes_texto": 0, "bytes_comprimidos": 0, "compresion_us": 0,
+         "sin_posicion": 0, "incertidumbre_total": 0, "primer_fix_ms": None,
+         "escaneos_wifi": 0, "escaneo_ms": 0, "escaneo_max_ms": 0, "registro_us": 0,
+         "vaciados": 0, "pendientes_ms": 0, "gc": 0, "gc_us": 0, "heap_libre": None, "heap_min": None,
+         "diagnosticos": 0, "valores_rechazados": 0, "pendientes_saltados": 0}
+
+# Formato "bin": en vez de cada avistamiento se sube una estimación por AP (centroide
+# ponderado por RSSI) cuando sale de alcance, lleva ESTIMAR_MAX_ESCANEOS o se desaloja
+ESTIMAR_APS = FORMATO_REGISTRO != "csv" and getattr(Config, "ESTIMAR_APS", True)
+estimador = APEstimator(getattr(Config, "ESTIMAR_CAPACIDAD", 256), 3,
+                        getattr(Config, "ESTIMAR_MAX_ESCANEOS", 60)) if ESTIMAR_APS else None
+
+# Redes ya reportadas (memoria fija, ~9 KB): solo se sube un AP nuevo, que se movió
+# más de DEDUP_METROS o que se oye DEDUP_RSSI dB más fuerte que su mejor registro.
+# Con estimaciones no se consulta, así que ni se reserva ni se carga
+vistas = SeenCache(getattr(Config, "DEDUP_CAPACIDAD", 512), getattr(Config, "DEDUP_RSSI", 8),
+                   getattr(Config, "DEDUP_METROS", 100)) if not ESTIMAR_APS else None
+DEDUP_ARCHIVO = getattr(Config, "DEDUP_ARCHIVO", None)  # p.ej. "vistas.bin" para recordar tras reiniciar
+DEDUP_GUARDAR_CADA = 20  # escaneos entre guardados (desgaste de flash)
+if not ESTIMAR_APS and DEDUP_ARCHIVO and vistas.load(DEDUP_ARCHIVO):
+    print("Redes vistas cargadas de", DEDUP_ARCHIVO)
+
+# Pendientes offline: log circular append-only (4 segmentos de 16 KB por defecto);
+# si se llena se descartan primero los lotes más viejos
+pendientes = RingLog(PENDING_DIR, getattr(Config, "PENDING_SEGMENTO", 16384),
+                     getattr(Config, "PENDING_SEGMENTOS", 4))
+
+# Pasar al log los p_*.txt que dejó la versión anterior (un archivo por lote)
 try:
-    if PENDING_DIR not in uos.listdir():
-        uos.mkdir(PENDING_DIR)
-except:
-    pass
+    for nombre in sorted(uos.listdir(PENDING_DIR)):
+        if nombre.endswith(".txt"):
+            with open(f"{PENDING_DIR}/{nombre}", "r") as f:
+                pendientes.append(f.read().encode())
+            uos.remove(f"{PENDING_DIR}/{nombre}")
+except Exception as e:
+    print("Error migrando pending:", e)
 
 # ===================== FUNCIONES =====================
-def conectar_wifi():
+async def conectar_wifi():
     if wlan.isconnected(): return True
     wlan.active(True)
     wlan.connect(wifi_ssid, wifi_pass)
@@ -51,137 +181,520 @@ def conectar_wifi():
             led.on()
             return True
         print(".", end="")
-        time.sleep(0.5)
+        await asyncio.sleep(0.5)
     print("\nSin WiFi")
     return False
 
-def esperar_gps_fix():
-    print("GPS...", end="")
-    timeout = time.ticks_ms() + 18000  # 18 segundos máximo
-    while time.ticks_ms() < timeout:
-        if gps_uart.any():
-            data = gps_uart.read()
-            if data:
-                for b in data:
-                    gps.update(chr(b))
-                if gps.satellites_in_use >= 4 and gps.latitude[0] != 0.0:
-                    print(f" FIX → {gps.latitude[0]:.6f},{gps.longitude[0]:.6f}")
-                    return True
-        time.sleep(0.05)
-    print(" sin fix")
-    return False
+def posicion_escaneo(inicio, fin):
+    # Posición a mitad del escaneo según el historial; None si no hay fix cercano o es muy incierta
+    pos = gps.position_at(time.ticks_add(inicio, time.ticks_diff(fin, inicio) // 2), MAX_EDAD_FIX)
+    if pos is None:
+        print("Sin fix reciente: escaneo descartado")
+        return None
+    if pos[2] > MAX_INCERTIDUMBRE:
+        print(f"Posición demasiado incierta (±{pos[2]:.0f} m): escaneo descartado")
+        return None
+    return pos
 
 def guardar_local(datos):
     if not datos.strip(): return
-    filename = f"{PENDING_DIR}/p_{time.ticks_ms()}.txt"
     try:
-        with open(filename, "w") as f:
-            f.write(datos)
-        print(f"Guardado offline: {filename}")
+        pendientes.append(datos.encode())
+        print(f"Guardado offline: {len(datos)} bytes")
     except Exception as e:
         print("ERROR guardando:", e)
 
+def rechazo_definitivo(status):
+    # 4xx por el contenido (valor inválido, muy largo...): reintentar no lo arregla. Red caída, 429,
+    # 5xx y errores de configuración (clave, feed) sí se reintentan: el dato no tiene la culpa
+    return 400 <= status < 500 and status not in (401, 403, 404, 408, 429)
+
+def sin_confirmar(valores, confirmados):
+    # Adafruit IO responde, en orden, solo los valores que guardó: índices de los que no están
+    faltan = []
+    j = 0
+    for i, v in enumerate(valores):
+        if j < len(confirmados) and confirmados[j] == v:
+            j += 1
+        else:
+            faltan.append(i)
+    return faltan
+
 def enviar_a_adafruit(datos):
+    # True: subido; False: se guarda para reintentar; None: Adafruit IO lo rechazó para siempre
     if not wlan.isconnected() or not datos.strip():
         return False
-    
-    lineas = datos.strip().split('\n')
-    if len(lineas) > 60:  # MÁXIMO 60 REDES POR ENVÍO → siempre < 1KB
-        datos = '\n'.join(lineas[:60]) + '\n'
-        print("Lote recortado a 60 redes")
-    
+
+    valores = preparar_valores(datos)
+    if len(valores) > 1:
+        # No cupo comprimido en un valor: varias partes en un solo POST batch
+        confirmados = enviar_batch(valores)
+        if confirmados is None:
+            return False
+        faltan = sin_confirmar(valores, confirmados)
+        if len(faltan) == len(valores):
+            return False
+        if faltan:
+            # Las partes son líneas completas: las que no confirmó van a pending, donde se reintentan
+            # y se saltan (contadas) si Adafruit IO las vuelve a rechazar
+            guardar_local("".join(valores[i] for i in faltan))
+        return True
+
     try:
-        addr = usocket.getaddrinfo('io.adafruit.com', 443)[0][-1]
-        s = usocket.socket()
-        s.settimeout(12)
-        s.connect(addr)
-        s = ssl.wrap_socket(s)
-
-        payload = ujson.dumps({"value": datos})
-        request = (
-            f"POST /api/v2/{aio_user}/feeds/{feed}/data HTTP/1.1\r\n"
-            f"Host: io.adafruit.com\r\n"
-            f"X-AIO-Key: {aio_key}\r\n"
-            f"Content-Type: application/json\r\n"
-            f"Content-Length: {len(payload)}\r\n\r\n"
-            f"{payload}"
-        )
-        s.write(request.encode())
-        response = s.read(100)
-        s.close()
-        
-        if b"200" in response or b"201" in response:
-            print(f"ENVIADO {len(lineas)} redes ({len(payload)} bytes)")
+        # Misma conexión TLS para todos los POST: el handshake se paga una vez
+        payload = ujson.dumps({"value": valores[0]})
+        resp = sesion.request("POST", AIO_URL, data=payload, headers=AIO_HEADERS)
+
+        if resp.status_code in (200, 201):
+            stats["posts"] += 1
+            print(f"ENVIADO {datos.count(chr(10))} líneas ({len(payload)} bytes)")
             return True
+        elif rechazo_definitivo(resp.status_code):
+            stats["valores_rechazados"] += 1
+            print("Valor rechazado por Adafruit IO:", resp.status_code)
+            return None
         else:
-            print("Error HTTP en envío")
+            print("Error HTTP en envío:", resp.status_code)
             return False
     except Exception as e:
+        sesion.close()
         print("Error conexión:", e)
         return False
 
-def enviar_pendientes():
-    if not wlan.isconnected(): return
+def preparar_valores(datos):
+    # Un valor comprimido si cabe y ahorra; si no, partes de texto de hasta MAX_VALOR
+    if COMPRIMIR:
+        inicio = time.ticks_us()
+        valor = zcodec.encode(datos)
+        stats["compresion_us"] += time.ticks_diff(time.ticks_us(), inicio)
+        stats["comprimidos"] += 1
+        stats["bytes_texto"] += len(datos)
+        stats["bytes_comprimidos"] += len(valor)
+        if len(valor) <= MAX_VALOR and len(valor) < len(datos):
+            return [valor]
+    return partir_valor(datos)
+
+def partir_valor(datos):
+    # Corta en líneas completas para que ningún valor pase de MAX_VALOR bytes (ya escapado en JSON)
+    valores = []
+    partes = BatchBuilder(MAX_VALOR, lambda valor, desde, redes: valores.append(valor))
+    for linea in datos.strip().split('\n'):
+        partes.add(linea + '\n')
+    partes.flush()
+    return valores
+
+def cuerpo_batch(valores):
+    # El JSON del batch sale por partes, un valor a la vez: nunca se arma el payload completo
+    yield "["
+    for i, v in enumerate(valores):
+        yield ',{"value":' if i else '{"value":'
+        yield ujson.dumps(v)
+        yield "}"
+    yield "]"
+
+def enviar_batch(valores):
+    # Un solo POST con varios valores; regresa los valores que el servidor confirmó ([] si rechazó
+    # la petición entera) o None si hay que reintentar
     try:
-        for f in uos.listdir(PENDING_DIR):
-            if not f.endswith(".txt"): continue
-            path = f"{PENDING_DIR}/{f}"
-            with open(path, "r") as file:
-                data = file.read()
-            if enviar_a_adafruit(data):
-                uos.remove(path)
-                print(f"Borrado: {f}")
+        largo = 2 + sum(len('{"value":}') + escaped_size(v) + 2 for v in valores) + len(valores) - 1
+        headers = dict(AIO_HEADERS)
+        headers["Content-Length"] = largo
+        resp = sesion.request("POST", AIO_BATCH_URL, data=cuerpo_batch(valores), headers=headers)
+        if resp.status_code == 429:
+            print("Adafruit IO: límite por minuto, se reintenta después")
+            return None
+        if rechazo_definitivo(resp.status_code):
+            print("Batch rechazado por Adafruit IO:", resp.status_code)
+            return []
+        if resp.status_code not in (200, 201):
+            print("Error HTTP en batch:", resp.status_code)
+            return None
+        stats["posts"] += 1
+        return [d.get("value") for d in resp.json()]
     except Exception as e:
-        print("Error pendientes:", e)
+        sesion.close()
+        print("Error conexión batch:", e)
+        return None
 
-def ciclo():
-    global lote_acumulado, ultimo_envio
+def leer_pendientes():
+    return pendientes.read(1 if cabeza_fallida else MAX_VALORES_BATCH)
 
-    if not esperar_gps_fix():
-        return  # ← NO guarda basura sin GPS
+def fallo_cabeza():
+    # El lote nuevo subió y el primero de pending no: el problema es ese registro
+    global cabeza_fallida, fallos_cabeza
+    fallos_cabeza += 1
+    if fallos_cabeza >= MAX_INTENTOS_PENDIENTE:
+        pendientes.commit(cabeza_fallida)
+        intentados.pop(cabeza_fallida, None)
+        stats["pendientes_saltados"] += 1
+        print(f"Registro de pending saltado tras {fallos_cabeza} intentos")
+        cabeza_fallida = None
+        fallos_cabeza = 0
 
-    lat = f"{gps.latitude[0]:.6f}"
-    lon = f"{gps.longitude[0]:.6f}"
+async def enviar_pendientes():
+    global cabeza_fallida, fallos_cabeza
+    if not wlan.isconnected(): return
 
+    registros = leer_pendientes()
+    posts = 0
+    # Registro que no cupo en el grupo anterior, ya comprimido: (posición, partes)
+    sobrante = None
+    while registros and posts < MAX_POSTS_VACIADO:
+        # Agrupa lotes completos, en orden, hasta MAX_VALORES_BATCH valores por petición; de cada
+        # registro solo las partes que Adafruit IO no ha confirmado
+        grupo = []
+        valores = []
+        for datos, posicion in registros:
+            if sobrante is not None and sobrante[0] == posicion:
+                partes = sobrante[1]
+            else:
+                partes = preparar_valores(datos.decode())
+            hechas = intentados.get(posicion, (0, False))[0]
+            indices = [i for i in range(len(partes)) if not hechas >> i & 1]
+            if valores and len(valores) + len(indices) > MAX_VALORES_BATCH:
+                sobrante = (posicion, partes)
+                break
+            grupo.append((posicion, len(partes), indices))
+            valores.extend(partes[i] for i in indices)
+        if not valores:
+            # Lotes vacíos o ya confirmados
+            pendientes.commit(grupo[-1][0])
+            for posicion, _, _ in grupo:
+                intentados.pop(posicion, None)
+            registros = leer_pendientes()
+            continue
+
+        confirmados = enviar_batch(valores)
+        posts += 1
+        if confirmados is None:
+            # Red, 429 o 5xx: se queda todo en pending y el primero se reintenta solo
+            if cabeza_fallida != grupo[0][0]:
+                cabeza_fallida = grupo[0][0]
+                fallos_cabeza = 0
+            return
+        cabeza_fallida = None
+        fallos_cabeza = 0
+        print(f"Batch: {len(confirmados)}/{len(valores)} valores confirmados")
+        if not confirmados and len(grupo) > 1:
+            # Rechazó la petición entera y no dice por qué registro: el primero va solo
+            cabeza_fallida = grupo[0][0]
+            registros = leer_pendientes()
+            continue
+
+        # Sale de pending solo hasta el primer registro al que le falta algo; un valor rechazado se
+        # reintenta una vez (o ninguna si el registro ya iba solo) y luego se da por perdido
+        faltan = sin_confirmar(valores, confirmados)
+        hecho = None
+        en_orden = True
+        k = 0
+        for posicion, total, indices in grupo:
+            hechas, reintentado = intentados.get(posicion, (0, False))
+            rechazadas = 0
+            for i in indices:
+                if k in faltan:
+                    rechazadas += 1
+                else:
+                    hechas |= 1 << i
+                k += 1
+            if rechazadas and (reintentado or len(grupo) == 1):
+                stats["valores_rechazados"] += rechazadas
+                stats["pendientes_saltados"] += 1
+                print("Registro de pending saltado: Adafruit IO rechazó", rechazadas, "valores")
+                hechas = (1 << total) - 1
+            if hechas == (1 << total) - 1 and en_orden:
+                intentados.pop(posicion, None)
+                hecho = posicion
+            else:
+                intentados[posicion] = (hechas, True)
+                en_orden = False
+        if hecho is not None:
+            pendientes.commit(hecho)
+        await asyncio.sleep(0)  # tarea_gps vacía el UART entre un POST y otro
+        registros = leer_pendientes()
+
+def encolar_lote(datos, desde, redes):
+    global ultimo_envio
+    # El envío lo hace tarea_envio(); el escaneo sigue sin esperar a la red
+    print(f"Lote cerrado: {redes} redes, {len(datos)} bytes")
+    if not cola_envio.put((datos, desde)):
+        print("Cola de envío llena")
+        guardar_local(datos)
+    ultimo_envio = time.time()
+
+# Lote en construcción: se cierra justo antes de que el siguiente registro pase de MAX_VALOR
+lote = BatchBuilder(MAX_VALOR * COMPRESION_LOTE if COMPRIMIR else MAX_VALOR, encolar_lote)
+
+def linea_csv(net, lat, lon):
+    ssid = net[0].decode('utf-8','ignore').strip() or "Hidden"
+    mac = ':'.join(f"{b:02X}" for b in net[1])
+    rssi = net[3]
+    auth = SECURITY.get(net[4], "Desconocida")
+    return f"{ssid},{auth},{lat:.6f},{lon:.6f},{rssi},{mac}\n"
+
+async def ciclo():
+    # Nada de esperar fix: tarea_gps() llena el historial y aquí solo se consulta
+    await asyncio.sleep(0)  # deja a tarea_gps() procesar lo que haya en el UART
+    inicio = time.ticks_ms()
     redes = wlan.scan()
-    nuevo_lote = ""
+    escaneo = time.ticks_ms()
+    duracion = time.ticks_diff(escaneo, inicio)
+    stats["escaneos_wifi"] += 1
+    stats["escaneo_ms"] += duracion
+    stats["escaneo_max_ms"] = max(stats["escaneo_max_ms"], duracion)
+    pos = posicion_escaneo(inicio, escaneo)
+    if pos is None:
+        stats["sin_posicion"] += 1
+        return 0  # ← NO guarda basura sin GPS
+
+    stats["escaneos"] += 1
+    lat_e7, lon_e7, incertidumbre = pos
+    stats["incertidumbre_total"] += incertidumbre
+    print(f"Posición: {lat_e7 / 10000000:.6f},{lon_e7 / 10000000:.6f} ±{incertidumbre:.0f} m "
+          f"({gps.skipped_sentences} sentencias omitidas)")
+    inicio = time.ticks_us()
+    nuevas = registrar(redes, lat_e7, lon_e7, escaneo)
+    stats["registro_us"] += time.ticks_diff(time.ticks_us(), inicio)
+    return nuevas
+
+def registrar(redes, lat_e7, lon_e7, escaneo):
+    # Estimaciones o avistamientos nuevos → registros del lote; regresa cuántos APs nuevos hubo
+    # CSV conserva el formato anterior: grados sin signo
+    lat = abs(lat_e7) / 10000000
+    lon = abs(lon_e7) / 10000000
+    if ESTIMAR_APS:
+        antes = estimador.new
+        listas = []
+        for net in redes:
+            desalojada = estimador.add(net, lat_e7, lon_e7)
+            if desalojada:
+                listas.append(desalojada)
+        listas.extend(estimador.end_scan())
+        print(f"Escaneo: {len(redes)} redes, {estimador.tracked} APs en seguimiento, {len(listas)} estimaciones")
+        agregar_al_lote(scanpack.encode_estimates(time.time(), listas, MAX_VALOR), len(listas), escaneo)
+        return estimador.new - antes
+
+    # Descarta repeticiones; cuenta lo que habrían ocupado en el lote
+    antes = vistas.new
+    nuevas = []
     for net in redes:
-        ssid = net[0].decode('utf-8','ignore').strip() or "Hidden"
-        mac = ':'.join(f"{b:02X}" for b in net[1])
-        rssi = net[3]
-        auth = SECURITY.get(net[4], "Desconocida")
-        nuevo_lote += f"{ssid},{auth},{lat},{lon},{rssi},{mac}\n"
+        if vistas.check(net[1], net[3], lat_e7, lon_e7):
+            nuevas.append(net)
+        elif FORMATO_REGISTRO == "csv":
+            stats["bytes_ahorrados"] += len(linea_csv(net, lat, lon))
+        else:
+            stats["bytes_ahorrados"] += (scanpack.ROW_SIZE + len(net[0])) * 4 // 3
+    print(f"Escaneo: {len(redes)} redes, {len(nuevas)} nuevas")
+    redes = nuevas
+    if DEDUP_ARCHIVO and stats["escaneos"] % DEDUP_GUARDAR_CADA == 0:
+        try:
+            vistas.save(DEDUP_ARCHIVO)
+        except Exception as e:
+            print("Error guardando redes vistas:", e)
+
+    if FORMATO_REGISTRO == "csv":
+        agregar_al_lote("".join(linea_csv(net, lat, lon) for net in redes), len(redes), escaneo)
+    else:
+        agregar_al_lote(scanpack.encode_scan(time.time(), lat_e7, lon_e7, gps.hdop, redes, MAX_VALOR), len(redes), escaneo)
+    return vistas.new - antes
+
+def agregar_al_lote(texto, redes, escaneo):
+    # Cada línea es un registro indivisible (una red en CSV, un bloque en "bin");
+    # las redes se cuentan en el lote donde cae la primera línea
+    for linea in texto.split('\n')[:-1]:
+        lote.add(linea + '\n', redes, escaneo)
+        redes = 0
+    print(f"Total acumuladas: {lote.items} redes ({lote.size} bytes)")
+
+    if len(lote) and time.time() - ultimo_envio >= INTERVALO_ENVIO:
+        lote.flush()
+
+def reportar():
+    minutos = time.ticks_diff(time.ticks_ms(), stats["inicio"]) / 60000
+    enviados = stats["lotes_enviados"]
+    promedio = stats["latencia_total_ms"] / enviados / 1000 if enviados else 0
+    posts = stats["posts"]
+    if ESTIMAR_APS:
+        # Con estimaciones vistas no está en el camino: su porcentaje sería siempre 0
+        filtro = f"estimador: {estimador.tracked} APs en seguimiento, {estimador.emitted} estimaciones"
+    else:
+        filtro = (f"dedup: {vistas.hit_ratio() * 100:.0f}% repetidas, "
+                  f"{stats['bytes_ahorrados'] / (minutos / 60) if minutos else 0:.0f} B/h ahorrados")
+    print(f"Escaneos/min: {stats['escaneos'] / minutos if minutos else 0:.2f} | "
+          f"latencia escaneo→envío: última {stats['latencia_ult_ms'] / 1000:.1f} s, "
+          f"prom {promedio:.1f} s, máx {stats['latencia_max_ms'] / 1000:.1f} s | "
+          f"TLS: {sesion.handshakes} handshakes / {posts} lotes "
+          f"({sesion.handshakes / posts if posts else 0:.2f} por lote) | "
+          f"pending: {pendientes.bytes_per_record():.0f} B escritos por lote guardado, "
+          f"{stats['valores_rechazados']} valores rechazados, {stats['pendientes_saltados']} saltados | "
+          f"{filtro}")
+    escaneos = stats["escaneos"]
+    print(f"GPS: {stats['sin_posicion']} escaneos sin posición, incertidumbre promedio "
+          f"±{stats['incertidumbre_total'] / escaneos if escaneos else 0:.0f} m | "
+          f"recorrido {planificador.meters / 1000:.2f} km, {planificador.idle_scans} escaneos detenido "
+          f"(próximo en {planificador.idle_interval // 1000} s si sigue quieto) | "
+          f"APs nuevos: {planificador.aps_per_km():.1f}/km, {planificador.aps_per_scan():.1f}/escaneo")
+    if gps.log_en:
+        log = gps.log_handle.stats()
+        print(f"Log GPS: {log['bytes_written']} B en {log['flushes']} escrituras, {log['rotations']} rotaciones, "
+              f"{log['bytes_lost']} B perdidos")
+    dns = urequests.dns_cache
+    print(f"DNS: {dns.hits} aciertos, {dns.misses} consultas, {dns.failures} fallos "
+          f"({dns.stale} resueltos con caché vencida)")
+    wifi = stats["escaneos_wifi"]
+    print(f"Tiempos: escaneo prom {stats['escaneo_ms'] / wifi if wifi else 0:.0f} ms "
+          f"(máx {stats['escaneo_max_ms']}), registro prom {stats['registro_us'] / escaneos / 1000 if escaneos else 0:.1f} ms, "
+          f"pending {stats['pendientes_ms']} ms en {stats['vaciados']} vaciados | DNS {dns.lookup_ms} ms, "
+          f"conexión+TLS {sesion.connect_ms} ms, peticiones {sesion.request_ms} ms en {sesion.requests} | "
+          f"gc prom {stats['gc_us'] / stats['gc'] / 1000 if stats['gc'] else 0:.1f} ms, "
+          f"heap libre {stats['heap_libre']} B (mín {stats['heap_min']})")
+    parser = gps.stats()
+    print("Parser: " + ", ".join(f"{tipo} {n} ({us / n:.0f} µs)" for tipo, (n, fallidas, us)
+                                 in parser["sentences"].items()) +
+          f" | {parser['bytes_received']} B en {parser['update_us'] / 1000:.0f} ms"
+          f" | primer fix: {'-' if stats['primer_fix_ms'] is None else stats['primer_fix_ms'] // 1000} s")
+    if stats["comprimidos"]:
+        print(f"Compresión ({'nativa' if zcodec.NATIVE else 'Python'}): "
+              f"{stats['bytes_comprimidos'] / stats['bytes_texto']:.2f} del tamaño, "
+              f"{stats['compresion_us'] / stats['comprimidos'] / 1000:.1f} ms por lote")
+
+def recolectar():
+    # gc explícito entre ciclos (no a mitad de un envío) midiendo cuánto tarda y el heap que queda
+    inicio = time.ticks_us()
+    gc.collect()
+    stats["gc_us"] += time.ticks_diff(time.ticks_us(), inicio)
+    stats["gc"] += 1
+    if hasattr(gc, "mem_free"):
+        libre = gc.mem_free()
+        stats["heap_libre"] = libre
+        stats["heap_min"] = libre if stats["heap_min"] is None else min(stats["heap_min"], libre)
+
+def estadisticas():
+    # Todas las métricas en un dict: ciclo, parser GPS, receptor, red, pending y planificador
+    dns = urequests.dns_cache
+    return {"uptime_s": time.ticks_diff(time.ticks_ms(), stats["inicio"]) // 1000,
+            "ciclo": stats,
+            "gps": gps.stats(),
+            "receptor": receptor,
+            "http": {"peticiones": sesion.requests, "handshakes": sesion.handshakes,
+                     "conexion_ms": sesion.connect_ms, "peticion_ms": sesion.request_ms},
+            "dns": {"aciertos": dns.hits, "consultas": dns.misses, "fallos": dns.failures,
+                    "vencidas": dns.stale, "consulta_ms": dns.lookup_ms},
+            "pending": {"registros": pendientes.records_written, "bytes": pendientes.bytes_written,
+                        "descartados": pendientes.evicted_segments, "corruptos": pendientes.corrupt_records},
+            "planificador": {"escaneos": planificador.scans, "detenido": planificador.idle_scans,
+                             "metros": int(planificador.meters), "aps": planificador.aps}}
 
-    lote_acumulado += nuevo_lote
-    print(f"Total acumuladas: {lote_acumulado.count(chr(10))} redes")
+# ===================== TAREAS =====================
+class Cola:
+    # uasyncio no trae Queue: lista FIFO acotada + Event para despertar al consumidor
+    def __init__(self, maximo):
+        self.items = []
+        self.maximo = maximo
+        self.evento = asyncio.Event()
 
-    ahora = time.time()
-    if (ahora - ultimo_envio >= INTERVALO_ENVIO) or len(lote_acumulado.split('\n')) > 55:
+    def put(self, item):
+        if len(self.items) >= self.maximo:
+            return False
+        self.items.append(item)
+        self.evento.set()
+        return True
+
+    async def get(self):
+        while not self.items:
+            self.evento.clear()
+            await self.evento.wait()
+        return self.items.pop(0)
+
+cola_envio = Cola(MAX_COLA_ENVIO)
+
+async def tarea_gps():
+    # Lee el GPS siempre (también mientras se escanea o se envía) y alimenta el historial de fixes
+    while True:
+        while gps_uart.any():
+            data = gps_uart.read()
+            if data: gps.update_bytes(data)
+        await asyncio.sleep(0.05)
+
+async def tarea_escaneo():
+    # Consulta el planificador cada segundo con la posición, velocidad y rumbo actuales
+    while True:
+        inicio = time.ticks_ms()
+        pos = gps.position_at(inicio, MAX_EDAD_FIX)
+        if pos and stats["primer_fix_ms"] is None:
+            stats["primer_fix_ms"] = time.ticks_diff(inicio, stats["inicio"])
+        if pos:
+            velocidad = gps.speed[2] / 3.6  # m/s
+            rumbo = gps.course
+            planificador.update(pos[0], pos[1], velocidad)
+        else:
+            velocidad = rumbo = None
+        if not planificador.due(inicio, velocidad, rumbo):
+            await asyncio.sleep(1)
+            continue
+
+        nuevas = await ciclo()
+        planificador.scanned(inicio, velocidad, rumbo, nuevas)
+
+        led.on()
+        await asyncio.sleep(0.2)
+        led.off()
+        recolectar()
+        reportar()
+
+async def tarea_envio():
+    while True:
+        datos, desde = await cola_envio.get()
+        if not wlan.isconnected():
+            await conectar_wifi()
         if wlan.isconnected():
-            enviar_pendientes()
-            if enviar_a_adafruit(lote_acumulado):
-                lote_acumulado = ""
-                ultimo_envio = ahora
-            else:
-                guardar_local(lote_acumulado)
-                lote_acumulado = ""
+            inicio = time.ticks_ms()
+            await enviar_pendientes()
+            stats["pendientes_ms"] += time.ticks_diff(time.ticks_ms(), inicio)
+            stats["vaciados"] += 1
+            await asyncio.sleep(0)
+            enviado = enviar_a_adafruit(datos)
+            if enviado:
+                latencia = time.ticks_diff(time.ticks_ms(), desde)
+                stats["lotes_enviados"] += 1
+                stats["latencia_ult_ms"] = latencia
+                stats["latencia_total_ms"] += latencia
+                stats["latencia_max_ms"] = max(stats["latencia_max_ms"], latencia)
+                if cabeza_fallida is not None:
+                    fallo_cabeza()
+            elif enviado is False:
+                guardar_local(datos)
         else:
-            guardar_local(lote_acumulado)
-            lote_acumulado = ""
+            guardar_local(datos)
+        # Cede el control entre lotes para no acaparar el loop
+        await asyncio.sleep(0)
+
+async def tarea_diagnostico():
+    # Publica estadisticas() en AIO_FEED_DIAG; entre envíos del uploader (la sesión es síncrona)
+    while True:
+        await asyncio.sleep(INTERVALO_DIAG)
+        if not wlan.isconnected():
+            continue
+        datos = estadisticas()
+        uptime = datos.pop("uptime_s")
+        valores = [{"value": ujson.dumps({"uptime_s": uptime, seccion: valor})} for seccion, valor in datos.items()]
+        try:
+            resp = sesion.request("POST", AIO_DIAG_URL + "/batch", data=ujson.dumps(valores), headers=AIO_HEADERS)
+            if resp.status_code in (200, 201):
+                stats["diagnosticos"] += 1
+            else:
+                print("Error HTTP en diagnóstico:", resp.status_code)
+        except Exception as e:
+            sesion.close()
+            print("Error conexión diagnóstico:", e)
+
+async def principal():
+    asyncio.create_task(tarea_gps())
+    await conectar_wifi()
+    asyncio.create_task(tarea_envio())
+    if AIO_FEED_DIAG:
+        asyncio.create_task(tarea_diagnostico())
+    await tarea_escaneo()
 
 # ===================== INICIO =====================
 print("=== WARDRIVING AGUASCALIENTES 2025 - LISTO PARA DEMO ===")
-conectar_wifi()
-
-while True:
-    # Leer GPS siempre
-    while gps_uart.any():
-        b = gps_uart.read(1)
-        if b: gps.update(chr(b[0]))
-    
-    ciclo()
-    
-    led.on()
-    time.sleep(0.2)
-    led.off()
-    time.sleep(33)  # Ciclo cada ~35 segundos
\ No newline at end of file
+asyncio.run(principal())
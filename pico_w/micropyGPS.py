@@ -6,28 +6,433 @@
 
 # TODO:
 # Time Since First Fix
-# Distance/Time to Target
 # More Helper Functions
-# Dynamically limit sentences types to parse
 
-from math import floor, modf
+from math import floor, modf, sin, cos, asin, atan2, sqrt, radians, degrees, pi
+
+try:
+    import ustruct as struct
+except ImportError:
+    import struct
+
+try:
+    import uos as os
+except ImportError:
+    import os
 
 # Import utime or time for fix time handling
 try:
     # Assume running on MicroPython
     import utime
+
+    _ticks_ms = utime.ticks_ms
+    _ticks_us = utime.ticks_us
+    _ticks_diff = utime.ticks_diff
 except ImportError:
     # Otherwise default to time module for non-embedded implementations
     # Should still support millisecond resolution.
     import time
 
+    def _ticks_ms():
+        """Millisecond counter wrapping like utime.ticks_ms()"""
+        return int(time.time() * 1000) & 0x3FFFFFFF
+
+    def _ticks_us():
+        """Microsecond counter wrapping like utime.ticks_us()"""
+        return time.perf_counter_ns() // 1000 & 0x3FFFFFFF
+
+    def _ticks_diff(end, start):
+        """Signed difference of two _ticks_ms() or _ticks_us() values, as utime.ticks_diff()"""
+        return ((end - start + 0x20000000) & 0x3FFFFFFF) - 0x20000000
+
+# Mean Earth radius (IUGG), in metres, and the WGS84 ellipsoid
+EARTH_RADIUS = 6371008.8
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+# Metres per degree of latitude (and of longitude at the equator) on that sphere
+M_PER_DEGREE = EARTH_RADIUS * pi / 180
+
+
+########################################
+# Geodesy Helpers
+########################################
+# Formulas on signed decimal degrees (south and west negative), distances in metres. The functions use a
+# spherical Earth, within 0.5% of the WGS84 ellipsoid; LocalProjection uses the ellipsoid's local radii.
+# On MicroPython single-precision floats the inputs themselves only resolve to about 1 m, see
+# bench/bench_geo.py for measured errors and speed.
+def haversine(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points, accurate at any range"""
+    phi1 = radians(lat1)
+    phi2 = radians(lat2)
+    a = sin(radians(lat2 - lat1) / 2)
+    b = sin(radians(lon2 - lon1) / 2)
+    h = a * a + cos(phi1) * cos(phi2) * b * b
+    return 2 * EARTH_RADIUS * asin(sqrt(min(h, 1.0)))
+
+
+def equirectangular(lat1, lon1, lat2, lon2):
+    """Flat-Earth distance around the mean latitude: one cosine, good to ~0.1% under 10 km"""
+    dlon = lon2 - lon1
+    if dlon > 180:
+        dlon -= 360
+    elif dlon < -180:
+        dlon += 360
+    x = dlon * cos(radians((lat1 + lat2) / 2))
+    y = lat2 - lat1
+    return M_PER_DEGREE * sqrt(x * x + y * y)
+
+
+def offset_e7(lat1_e7, lon1_e7, lat2_e7, lon2_e7):
+    """(east, north) metres from point 1 to point 2 in integer 1e-7 degrees, flat Earth around the mean
+    latitude like equirectangular(). The differences are taken in integers, so single precision floats
+    keep centimetres between nearby fixes"""
+    dlon = lon2_e7 - lon1_e7
+    if dlon > 1800000000:
+        dlon -= 3600000000
+    elif dlon < -1800000000:
+        dlon += 3600000000
+    scale = M_PER_DEGREE / 10000000
+    return dlon * scale * cos(radians((lat1_e7 + lat2_e7) / 20000000)), (lat2_e7 - lat1_e7) * scale
+
+
+def equirectangular_e7(lat1_e7, lon1_e7, lat2_e7, lon2_e7):
+    """equirectangular() for integer 1e-7 degree coordinates"""
+    x, y = offset_e7(lat1_e7, lon1_e7, lat2_e7, lon2_e7)
+    return sqrt(x * x + y * y)
+
+
+def translate_e7(lat_e7, lon_e7, east, north):
+    """Inverse of offset_e7(): the 1e-7 degree point east and north metres away"""
+    scale = M_PER_DEGREE / 10000000
+    lat2_e7 = lat_e7 + int(north / scale)
+    parallel = max(cos(radians((lat_e7 + lat2_e7) / 20000000)), 0.01)
+    return lat2_e7, lon_e7 + int(east / (scale * parallel))
+
+
+def bearing(lat1, lon1, lat2, lon2):
+    """Initial great-circle bearing from point 1 to point 2, degrees clockwise from north [0, 360)"""
+    phi1 = radians(lat1)
+    phi2 = radians(lat2)
+    dlon = radians(lon2 - lon1)
+    x = cos(phi2) * sin(dlon)
+    y = cos(phi1) * sin(phi2) - sin(phi1) * cos(phi2) * cos(dlon)
+    return degrees(atan2(x, y)) % 360
+
+
+def destination(lat, lon, course, distance):
+    """Point reached after distance metres on an initial course (degrees). Returns (lat, lon)"""
+    phi = radians(lat)
+    theta = radians(course)
+    delta = distance / EARTH_RADIUS
+    sin_phi2 = sin(phi) * cos(delta) + cos(phi) * sin(delta) * cos(theta)
+    phi2 = asin(max(-1.0, min(1.0, sin_phi2)))
+    dlon = atan2(sin(theta) * sin(delta) * cos(phi), cos(delta) - sin(phi) * sin_phi2)
+    return degrees(phi2), (lon + degrees(dlon) + 540) % 360 - 180
+
+
+class LocalProjection(object):
+    """Local tangent plane around a reference point, for many cheap conversions near it.
+
+    The WGS84 meridian and parallel radii at the origin, and the first-order change of the parallel
+    scale with latitude, are computed once, so to_xy() is a few multiplications and beats haversine's
+    spherical error within about 20 km of the origin.
+    """
+
+    def __init__(self, lat0, lon0):
+        self.lat0 = lat0
+        self.lon0 = lon0
+        self._lat0_e7 = int(round(lat0 * 10000000))
+        self._lon0_e7 = int(round(lon0 * 10000000))
+        phi = radians(lat0)
+        e2 = WGS84_F * (2 - WGS84_F)
+        w = 1 - e2 * sin(phi) * sin(phi)
+        meridian = WGS84_A * (1 - e2) / (w * sqrt(w))
+        normal = WGS84_A / sqrt(w)
+        self._ky = meridian * pi / 180
+        self._kx = normal * cos(phi) * pi / 180
+        # d(N cos(lat))/d(lat) = -M sin(lat): the parallel scale d degrees north of the origin
+        self._tan = meridian * sin(phi) / (normal * cos(phi)) * pi / 180
+
+    def to_xy(self, lat, lon):
+        """(east, north) metres of a point from the origin"""
+        dlat = lat - self.lat0
+        dlon = lon - self.lon0
+        if dlon > 180:
+            dlon -= 360
+        elif dlon < -180:
+            dlon += 360
+        return dlon * self._kx * (1 - self._tan * dlat), dlat * self._ky
+
+    def to_xy_e7(self, lat_e7, lon_e7):
+        """to_xy() for integer 1e-7 degree coordinates; the offsets are taken in integers, so single
+        precision floats lose nothing on the absolute coordinate"""
+        dlat = (lat_e7 - self._lat0_e7) / 10000000
+        dlon = (lon_e7 - self._lon0_e7) / 10000000
+        return dlon * self._kx * (1 - self._tan * dlat), dlat * self._ky
+
+    def to_latlon(self, x, y):
+        """Inverse of to_xy(): (lat, lon) of a point x metres east and y metres north of the origin"""
+        dlat = y / self._ky
+        lon = self.lon0 + x / (self._kx * (1 - self._tan * dlat))
+        return self.lat0 + dlat, (lon + 540) % 360 - 180
+
+    def distance(self, lat, lon):
+        """Metres from the origin"""
+        x, y = self.to_xy(lat, lon)
+        return sqrt(x * x + y * y)
+
+
+
+########################################
+# Bulk Parsing Helpers
+########################################
+def _hex_value(c):
+    """Value of a single ASCII hex digit byte, -1 if c is not a hex digit"""
+    if 48 <= c <= 57:
+        return c - 48
+    c |= 0x20
+    if 97 <= c <= 102:
+        return c - 87
+    return -1
+
+
+try:
+    import micropython
+
+    @micropython.viper
+    def _nmea_xor(buf, start: int, end: int) -> int:
+        """XOR checksum of buf[start:end]. Returns -1 if the span holds bytes update() would drop"""
+        p = ptr8(buf)
+        x = 0
+        i = start
+        while i < end:
+            c = p[i]
+            if c < 10 or c > 126:
+                return -1
+            x ^= c
+            i += 1
+        return x
+
+    @micropython.viper
+    def _ubx_checksum(buf, start: int, end: int) -> int:
+        """UBX 8-bit Fletcher checksum of buf[start:end], CK_A in the low byte and CK_B in the high byte"""
+        p = ptr8(buf)
+        a = 0
+        b = 0
+        i = start
+        while i < end:
+            a = (a + p[i]) & 0xFF
+            b = (b + a) & 0xFF
+            i += 1
+        return a | (b << 8)
+
+except ImportError:
+    def _nmea_xor(buf, start, end):
+        """XOR checksum of buf[start:end]. Returns -1 if the span holds bytes update() would drop"""
+        body = buf[start:end]
+        if not body:
+            return 0
+        if min(body) < 10 or max(body) > 126:
+            return -1
+        # Fold the span onto itself as one big integer instead of looping per byte
+        n = int.from_bytes(body, 'little')
+        width = len(body)
+        while width > 1:
+            half = (width + 1) >> 1
+            n = (n & ((1 << (half << 3)) - 1)) ^ (n >> (half << 3))
+            width = half
+        return n
+
+    def _ubx_checksum(buf, start, end):
+        """UBX 8-bit Fletcher checksum of buf[start:end], CK_A in the low byte and CK_B in the high byte"""
+        a = b = 0
+        for c in buf[start:end]:
+            a += c
+            b += a
+        return (a & 0xFF) | (b & 0xFF) << 8
+
+
+class _SentenceFields(object):
+    """Read-only list-like view of the fields of the sentence held in a MicropyGPS buffer.
+    A field is only turned into a string when a parser indexes it"""
+
+    def __init__(self, gps):
+        self._gps = gps
+
+    def __len__(self):
+        return self._gps.active_segment + 1
+
+    def __getitem__(self, index):
+        gps = self._gps
+        last = gps.active_segment
+        if index < 0:
+            index += last + 1
+        if not 0 <= index <= last:
+            raise IndexError(index)
+
+        # Fields are stored back to back with their separators, so a field ends one byte before the next starts
+        starts = gps._field_starts
+        if index < last:
+            return gps._sentence[starts[index]:starts[index + 1] - 1].decode()
+        return gps._sentence[starts[index]:gps._sentence_len].decode()
+
+
+class _SentenceSnapshot(object):
+    """Last sentence of one kind, kept in lazy mode so its fields can be decoded later. Looks enough like
+    the parser buffer for a _SentenceFields view to read it.
+
+    Nothing is copied: the snapshot takes over the parser buffers holding the sentence, and hands back the
+    ones it held before for the parser to fill with the next sentence"""
+
+    def __init__(self, gps, positions):
+        self._sentence = bytearray(len(gps._sentence))
+        self._field_starts = bytearray(len(gps._field_starts))
+        self._sentence_len = 0
+        self.active_segment = 0
+        self.fields = _SentenceFields(self)
+        self.positions = positions
+
+    def take(self, gps):
+        """Hold the sentence in the buffers of gps. Returns the buffers this snapshot is done with"""
+        spare = self._sentence, self._field_starts
+        self._sentence = gps._sentence
+        self._field_starts = gps._field_starts
+        self._sentence_len = gps._sentence_len
+        self.active_segment = gps.active_segment
+        return spare
+
+
+########################################
+# Buffered Logging
+########################################
+class GPSLog(object):
+    """Log file fed through a fixed buffer, written whole lines at a time and rotated by size.
+
+    Data collects in a preallocated bytearray of buffer_size bytes and reaches the file when the buffer
+    fills up, when a line is completed more than flush_ms after the oldest unwritten byte, or on flush() and
+    close(). Only complete lines are written while the buffer has room for the rest, so a file never ends
+    halfway through a sentence (binary UBX data is simply written in buffer-sized pieces). With max_size set,
+    a write that would grow the file past it first renames path to path.1, path.1 to path.2 and so on,
+    deleting the oldest past `keep` old files (keep=0 starts the file over).
+    """
+
+    def __init__(self, path, mode='append', buffer_size=1024, flush_ms=5000, max_size=0, keep=2):
+        self.path = path
+        self.flush_ms = flush_ms
+        self.max_size = max_size
+        self.keep = keep
+        self._buf = bytearray(buffer_size)
+        self._len = 0
+        # Buffered bytes up to and including the last newline, and the tick of the oldest unwritten byte
+        self._line_end = 0
+        self._since = 0
+        self._file = open(path, 'wb' if mode == 'new' else 'ab')
+        try:
+            self.size = os.stat(path)[6]
+        except OSError:
+            self.size = 0
+
+        # Statistics
+        self.bytes_written = 0
+        self.flushes = 0
+        self.rotations = 0
+        self.write_errors = 0
+        self.bytes_lost = 0
+
+    def stats(self):
+        """Log statistics as a dict"""
+        return {'bytes_written': self.bytes_written, 'flushes': self.flushes, 'rotations': self.rotations,
+                'write_errors': self.write_errors, 'bytes_lost': self.bytes_lost}
+
+    def write(self, data):
+        """Queue data (str, bytes, bytearray or memoryview). Returns the number of bytes queued"""
+        if type(data) is str:
+            data = data.encode()
+        n = len(data)
+        if not n:
+            return 0
+        size = len(self._buf)
+        if self._len + n > size:
+            # Make room with complete lines first, the unfinished one as well only if that is not enough
+            self.flush(False)
+            if self._len + n > size:
+                self.flush()
+                if n >= size:
+                    self._write(data)
+                    return n
+        start = self._len
+        if not start:
+            self._since = _ticks_ms()
+        self._buf[start:start + n] = data
+        self._len = start + n
+
+        # Newline search only on bytes; other buffers are checked for a trailing newline
+        last = data.rfind(b'\n') if type(data) is bytes else n - 1 if data[n - 1] == 10 else -1
+        if last >= 0:
+            self._line_end = start + last + 1
+            if _ticks_diff(_ticks_ms(), self._since) >= self.flush_ms:
+                self.flush(False)
+        return n
+
+    def flush(self, partial=True):
+        """Write the buffered data to the file. partial=False keeps an unfinished last line buffered"""
+        end = self._len if partial else self._line_end
+        if not end:
+            return
+        self._write(memoryview(self._buf)[:end])
+        rest = self._len - end
+        if rest:
+            self._buf[:rest] = self._buf[end:self._len]
+            self._since = _ticks_ms()
+        self._len = rest
+        self._line_end = 0
+
+    def _write(self, data):
+        n = len(data)
+        if self.max_size and self.size and self.size + n > self.max_size:
+            self._rotate()
+        try:
+            self._file.write(data)
+            self._file.flush()
+        except OSError:
+            # Flash full or failing: drop the data rather than the parser
+            self.write_errors += 1
+            self.bytes_lost += n
+            return
+        self.size += n
+        self.bytes_written += n
+        self.flushes += 1
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.keep, 0, -1):
+            try:
+                if i == self.keep:
+                    os.remove('%s.%d' % (self.path, i))
+                else:
+                    os.rename('%s.%d' % (self.path, i), '%s.%d' % (self.path, i + 1))
+            except OSError:
+                pass
+        if self.keep:
+            os.rename(self.path, self.path + '.1')
+        self._file = open(self.path, 'wb')
+        self.size = 0
+        self.rotations += 1
+
+    def close(self):
+        """Write what is buffered and close the file"""
+        self.flush()
+        self._file.close()
+
 
 class MicropyGPS(object):
     """GPS NMEA Sentence Parser. Creates object that stores all relevant GPS data and statistics.
-    Parses sentences one character at a time using update(). """
+    Parses sentences one character at a time using update(), or whole blocks of bytes using update_bytes(). """
 
     # Max Number of Characters a valid sentence can be (based on GGA sentence)
     SENTENCE_LIMIT = 90
+    # Max Number of Fields (including the CRC) a sentence can be split into (GSV uses 21)
+    FIELD_LIMIT = 32
     __HEMISPHERES = ('N', 'S', 'E', 'W')
     __NO_FIX = 1
     __FIX_2D = 2
@@ -37,8 +442,42 @@ class MicropyGPS(object):
     __MONTHS = ('January', 'February', 'March', 'April', 'May',
                 'June', 'July', 'August', 'September', 'October',
                 'November', 'December')
-
-    def __init__(self, local_offset=0, location_formatting='ddm'):
+    # Field position of every deferred attribute within each sentence kind, used in lazy mode
+    __DEFERRED_FIELDS = {'RMC': {'timestamp': 1, 'speed': 7, 'course': 8, 'date': 9},
+                         'GLL': {'timestamp': 5},
+                         'VTG': {'course': 1, 'speed': 5},
+                         'GGA': {'timestamp': 1, 'hdop': 8, 'altitude': 9, 'geoid_height': 11},
+                         'GSA': {'pdop': 15, 'hdop': 16, 'vdop': 17}}
+
+    # UBX frames: sync chars, then class, id, little-endian payload length, payload and a 2 byte checksum
+    UBX_SYNC = b'\xb5\x62'
+    # Longest UBX payload accepted; a longer length field means a false sync match
+    UBX_LIMIT = 512
+    # NAV-PVT payload up to pDOP: iTOW, date, time, valid, tAcc, nano, fixType, flags, flags2, numSV,
+    # lon, lat, height, hMSL, hAcc, vAcc, velN, velE, velD, gSpeed, headMot, sAcc, headAcc, pDOP
+    UBX_NAV_PVT = '<IHBBBBBBIiBBBBiiiiIIiiiiiIIH'
+    UBX_NAV_PVT_SIZE = struct.calcsize(UBX_NAV_PVT)
+    # NAV-DOP payload: iTOW, gDOP, pDOP, tDOP, vDOP, hDOP, nDOP, eDOP (0.01 units)
+    UBX_NAV_DOP = '<IHHHHHHH'
+
+    # Fix history entry: tick, latitude E7, longitude E7, speed (cm/s), course (centidegrees), HDOP x10
+    HISTORY_ENTRY = '<IiiHHH'
+    # then speed (knots), course and HDOP as raw sentence text, HISTORY_RAW bytes each and NUL padded, for the
+    # ones lazy mode had not decoded yet; position_at() decodes them in place of the numbers when it needs them
+    HISTORY_RAW = 8
+    HISTORY_RAW_OFFSET = struct.calcsize(HISTORY_ENTRY)
+    HISTORY_ENTRY_SIZE = HISTORY_RAW_OFFSET + 3 * HISTORY_RAW
+    # Fixes parsed closer together than this are one epoch (e.g. GGA + RMC, or a UART backlog read at once);
+    # well under the 100 ms period of a 10 Hz receiver
+    HISTORY_MERGE_MS = 50
+    # Position error model of position_at(), in metres: UERE x HDOP for a fix, plus unmodelled
+    # acceleration and a speed-proportional heading/speed error while extrapolating
+    UERE = 5.0
+    DR_ACCELERATION = 1.0
+    DR_SPEED_ERROR = 0.1
+
+    def __init__(self, local_offset=0, location_formatting='ddm', sentences=None, lazy=False, history=0,
+                 protocol='nmea'):
         """
         Setup GPS Object Status Flags, Internal Data Registers, etc
             local_offset (int): Timzone Difference to UTC
@@ -46,28 +485,84 @@ class MicropyGPS(object):
                                        Decimal Degree Minute (ddm) - 40° 26.767′ N
                                        Degrees Minutes Seconds (dms) - 40° 26′ 46″ N
                                        Decimal Degrees (dd) - 40.446° N
+            sentences (iterable): Sentence types to parse, see set_sentences(). None parses all supported types
+            lazy (bool): Keep the latest sentence of each kind and only convert timestamp, date, speed,
+                         course, altitude, geoid_height and DOP values when they are read. Deferred fields are not
+                         validated while parsing; one that turns out to be malformed keeps the previous value
+            history (int): Number of recent fixes kept for position_at() (0 disables the history)
+            protocol (str): 'nmea' for NMEA text, or 'ubx' for u-blox binary NAV-PVT / NAV-DOP messages, which
+                            update the same attributes (sentences and lazy only apply to NMEA)
         """
+        if protocol not in ('nmea', 'ubx'):
+            raise ValueError("Unsupported protocol: " + protocol)
 
         #####################
         # Object Status Flags
         self.sentence_active = False
         self.active_segment = 0
         self.process_crc = False
-        self.gps_segments = []
         self.crc_xor = 0
         self.char_count = 0
         self.fix_time = 0
+        self._carry = b''
+        self.protocol = protocol
+        self._ubx = protocol == 'ubx'
+
+        #####################
+        # Sentence Buffer
+        # Preallocated so receiving a sentence doesn't create garbage; gps_segments hands out fields on demand
+        self._sentence = bytearray(self.SENTENCE_LIMIT + 2)
+        self._sentence_len = 0
+        self._field_starts = bytearray(self.FIELD_LIMIT)
+        self.gps_segments = _SentenceFields(self)
 
         #####################
         # Sentence Statistics
         self.crc_fails = 0
         self.clean_sentences = 0
         self.parsed_sentences = 0
+        self.skipped_sentences = 0
+        # Per sentence type (or UBX message name): [parsed, failed, ticks_us spent in the parser]
+        self.sentence_stats = dict()
+        # Bytes fed to update_bytes() and ticks_us spent in it, parsing included
+        self.bytes_received = 0
+        self.update_us = 0
+
+        #####################
+        # Sentence Selection
+        self._parsers = self.supported_sentences
+        self._sentence_filter = None
+        self.set_sentences(sentences)
+
+        #####################
+        # Deferred Decoding
+        self.lazy = lazy
+        self._deferred = dict()
+        self._raw_sentences = dict()
+        # Buffers for the next sentence once a snapshot holds the current ones
+        self._spare_buffers = None
+        if lazy:
+            # One snapshot per parsed kind, preallocated like the sentence buffer (others come on demand)
+            kinds = set(key[2:] for key in self._parsers)
+            for kind, positions in self.__DEFERRED_FIELDS.items():
+                if kind in kinds:
+                    self._raw_sentences[kind] = _SentenceSnapshot(self, positions)
+
+        #####################
+        # Fix History
+        # Ring of HISTORY_ENTRY records in one preallocated bytearray, oldest overwritten first
+        self.history_size = history
+        self._history = bytearray(history * self.HISTORY_ENTRY_SIZE)
+        self._history_head = 0
+        self._history_count = 0
+        self._velocity_tick = None
 
         #####################
         # Logging Related
         self.log_handle = None
         self.log_en = False
+        self._log_raw = False
+        self._log_valid = False
 
         #####################
         # Data From Sentences
@@ -98,6 +593,8 @@ class MicropyGPS(object):
         self.valid = False
         self.fix_stat = 0
         self.fix_type = 1
+        # Receiver's own horizontal accuracy estimate in metres (UBX only, None from NMEA)
+        self.horizontal_accuracy = None
 
     ########################################
     # Coordinates Translation Functions
@@ -128,23 +625,168 @@ class MicropyGPS(object):
         else:
             return self._longitude
 
+    ########################################
+    # Deferred Field Decoding
+    ########################################
+    def _snapshot(self, kind):
+        """Keep the sentence being parsed so its deferred fields can be decoded later. The snapshot takes
+        the parser buffers; gps_segments still reads them until the next sentence starts"""
+        raw = self._raw_sentences.get(kind)
+        if raw is None:
+            raw = _SentenceSnapshot(self, self.__DEFERRED_FIELDS[kind])
+            self._raw_sentences[kind] = raw
+        if raw._sentence is not self._sentence:
+            self._spare_buffers = raw.take(self)
+        return raw
+
+    def _next_buffers(self):
+        """Switch to the spare buffers before a new sentence overwrites ones a snapshot holds"""
+        self._sentence, self._field_starts = self._spare_buffers
+        self._spare_buffers = None
+
+    def _decode_deferred(self, name, previous):
+        """Decode a deferred attribute from the copy of the sentence that last carried it. A malformed field
+        leaves the previous value in place, as a sentence failing to parse would in eager mode"""
+        raw = self._deferred.pop(name)
+        try:
+            field = raw.fields[raw.positions[name]]
+            if name == 'timestamp':
+                if not field:
+                    return [0, 0, 0.0]
+                return [(int(field[0:2]) + self.local_offset) % 24, int(field[2:4]), float(field[4:])]
+            if name == 'date':
+                if not field:
+                    return (0, 0, 0)
+                return (int(field[0:2]), int(field[2:4]), int(field[4:6]))
+            if name == 'speed':
+                spd_knt = float(field) if field else 0.0
+                return [spd_knt, spd_knt * 1.151, spd_knt * 1.852]
+            return float(field) if field else 0.0
+        except (ValueError, IndexError):
+            return previous
+
+    @property
+    def timestamp(self):
+        if 'timestamp' in self._deferred:
+            self._timestamp = self._decode_deferred('timestamp', self._timestamp)
+        return self._timestamp
+
+    @timestamp.setter
+    def timestamp(self, value):
+        self._timestamp = value
+        self._deferred.pop('timestamp', None)
+
+    @property
+    def date(self):
+        if 'date' in self._deferred:
+            self._date = self._decode_deferred('date', self._date)
+        return self._date
+
+    @date.setter
+    def date(self, value):
+        self._date = value
+        self._deferred.pop('date', None)
+
+    @property
+    def speed(self):
+        if 'speed' in self._deferred:
+            self._speed = self._decode_deferred('speed', self._speed)
+        return self._speed
+
+    @speed.setter
+    def speed(self, value):
+        self._speed = value
+        self._deferred.pop('speed', None)
+
+    @property
+    def course(self):
+        if 'course' in self._deferred:
+            self._course = self._decode_deferred('course', self._course)
+        return self._course
+
+    @course.setter
+    def course(self, value):
+        self._course = value
+        self._deferred.pop('course', None)
+
+    @property
+    def altitude(self):
+        if 'altitude' in self._deferred:
+            self._altitude = self._decode_deferred('altitude', self._altitude)
+        return self._altitude
+
+    @altitude.setter
+    def altitude(self, value):
+        self._altitude = value
+        self._deferred.pop('altitude', None)
+
+    @property
+    def geoid_height(self):
+        if 'geoid_height' in self._deferred:
+            self._geoid_height = self._decode_deferred('geoid_height', self._geoid_height)
+        return self._geoid_height
+
+    @geoid_height.setter
+    def geoid_height(self, value):
+        self._geoid_height = value
+        self._deferred.pop('geoid_height', None)
+
+    @property
+    def hdop(self):
+        if 'hdop' in self._deferred:
+            self._hdop = self._decode_deferred('hdop', self._hdop)
+        return self._hdop
+
+    @hdop.setter
+    def hdop(self, value):
+        self._hdop = value
+        self._deferred.pop('hdop', None)
+
+    @property
+    def pdop(self):
+        if 'pdop' in self._deferred:
+            self._pdop = self._decode_deferred('pdop', self._pdop)
+        return self._pdop
+
+    @pdop.setter
+    def pdop(self, value):
+        self._pdop = value
+        self._deferred.pop('pdop', None)
+
+    @property
+    def vdop(self):
+        if 'vdop' in self._deferred:
+            self._vdop = self._decode_deferred('vdop', self._vdop)
+        return self._vdop
+
+    @vdop.setter
+    def vdop(self, value):
+        self._vdop = value
+        self._deferred.pop('vdop', None)
+
     ########################################
     # Logging Related Functions
     ########################################
-    def start_logging(self, target_file, mode="append"):
+    def start_logging(self, target_file, mode="append", valid_only=False, buffer_size=1024, flush_ms=5000,
+                      max_size=0, keep=2):
         """
-        Create GPS data log object
+        Create GPS data log object, a GPSLog buffering writes and rotating files past max_size bytes.
+        By default the raw receiver data is logged: every printable char fed to update(), every block fed
+        to update_bytes(). valid_only logs just the sentences that pass the sentence filter and the CRC
+        check, one per line (UBX: frames with a good checksum)
         """
         # Set Write Mode Overwrite or Append
-        mode_code = 'w' if mode == 'new' else 'a'
+        mode_code = 'new' if mode == 'new' else 'append'
 
         try:
-            self.log_handle = open(target_file, mode_code)
-        except AttributeError:
+            self.log_handle = GPSLog(target_file, mode_code, buffer_size, flush_ms, max_size, keep)
+        except (AttributeError, TypeError, OSError):
             print("Invalid FileName")
             return False
 
         self.log_en = True
+        self._log_raw = not valid_only
+        self._log_valid = valid_only
         return True
 
     def stop_logging(self):
@@ -158,17 +800,55 @@ class MicropyGPS(object):
             return False
 
         self.log_en = False
+        self._log_raw = False
+        self._log_valid = False
         return True
 
     def write_log(self, log_string):
-        """Attempts to write the last valid NMEA sentence character to the active file handler
+        """Attempts to queue receiver data or a valid sentence on the active log
         """
         try:
             self.log_handle.write(log_string)
-        except TypeError:
+        except (TypeError, AttributeError):
             return False
         return True
 
+    def _log_sentence(self, buf, start, end):
+        """Log buf[start:end] as one line, '$' included"""
+        if buf[start] != 36:
+            self.write_log(b'$')
+        self.write_log(memoryview(buf)[start:end])
+        self.write_log(b'\r\n')
+
+    ########################################
+    # Sentence Selection
+    ########################################
+    def set_sentences(self, sentences=None):
+        """
+        Limit parsing to the given sentence types. Everything else is dropped right after its type field,
+        without being stored or CRC checked, and counted in skipped_sentences.
+            sentences (iterable): Full types ('GNGGA') or 3 letter types matching every talker ('GGA').
+                                  None parses all supported types again
+        """
+        if sentences is None:
+            self._parsers = self.supported_sentences
+            self._sentence_filter = None
+            return
+
+        parsers = dict()
+        for sentence in sentences:
+            if len(sentence) == 3:
+                matches = [key for key in self.supported_sentences if key[2:] == sentence]
+            else:
+                matches = [sentence] if sentence in self.supported_sentences else []
+            if not matches:
+                raise ValueError("Unsupported sentence type: " + sentence)
+            for key in matches:
+                parsers[key] = self.supported_sentences[key]
+
+        self._parsers = parsers
+        self._sentence_filter = set(key.encode() for key in parsers)
+
     ########################################
     # Sentence Parsers
     ########################################
@@ -177,37 +857,42 @@ class MicropyGPS(object):
         Updates UTC timestamp, latitude, longitude, Course, Speed, Date, and fix status
         """
 
-        # UTC Timestamp
-        try:
-            utc_string = self.gps_segments[1]
+        # UTC Timestamp and Date stamp, decoded on first access in lazy mode
+        if self.lazy:
+            raw = self._snapshot('RMC')
+            self._deferred['timestamp'] = raw
+            self._deferred['date'] = raw
+        else:
+            try:
+                utc_string = self.gps_segments[1]
 
-            if utc_string:  # Possible timestamp found
-                hours = (int(utc_string[0:2]) + self.local_offset) % 24
-                minutes = int(utc_string[2:4])
-                seconds = float(utc_string[4:])
-                self.timestamp = [hours, minutes, seconds]
-            else:  # No Time stamp yet
-                self.timestamp = [0, 0, 0.0]
+                if utc_string:  # Possible timestamp found
+                    hours = (int(utc_string[0:2]) + self.local_offset) % 24
+                    minutes = int(utc_string[2:4])
+                    seconds = float(utc_string[4:])
+                    self.timestamp = [hours, minutes, seconds]
+                else:  # No Time stamp yet
+                    self.timestamp = [0, 0, 0.0]
 
-        except ValueError:  # Bad Timestamp value present
-            return False
+            except ValueError:  # Bad Timestamp value present
+                return False
 
-        # Date stamp
-        try:
-            date_string = self.gps_segments[9]
-
-            # Date string printer function assumes to be year >=2000,
-            # date_string() must be supplied with the correct century argument to display correctly
-            if date_string:  # Possible date stamp found
-                day = int(date_string[0:2])
-                month = int(date_string[2:4])
-                year = int(date_string[4:6])
-                self.date = (day, month, year)
-            else:  # No Date stamp yet
-                self.date = (0, 0, 0)
-
-        except ValueError:  # Bad Date stamp value present
-            return False
+            # Date stamp
+            try:
+                date_string = self.gps_segments[9]
+
+                # Date string printer function assumes to be year >=2000,
+                # date_string() must be supplied with the correct century argument to display correctly
+                if date_string:  # Possible date stamp found
+                    day = int(date_string[0:2])
+                    month = int(date_string[2:4])
+                    year = int(date_string[4:6])
+                    self.date = (day, month, year)
+                else:  # No Date stamp yet
+                    self.date = (0, 0, 0)
+
+            except ValueError:  # Bad Date stamp value present
+                return False
 
         # Check Receiver Data Valid Flag
         if self.gps_segments[2] == 'A':  # Data from Receiver is Valid/Has Fix
@@ -234,33 +919,41 @@ class MicropyGPS(object):
             if lon_hemi not in self.__HEMISPHERES:
                 return False
 
-            # Speed
-            try:
-                spd_knt = float(self.gps_segments[7])
-            except ValueError:
-                return False
+            # Speed and Course, decoded on first access in lazy mode
+            if not self.lazy:
+                try:
+                    spd_knt = float(self.gps_segments[7])
+                except ValueError:
+                    return False
 
-            # Course
-            try:
-                if self.gps_segments[8]:
-                    course = float(self.gps_segments[8])
-                else:
-                    course = 0.0
-            except ValueError:
-                return False
+                # Course
+                try:
+                    if self.gps_segments[8]:
+                        course = float(self.gps_segments[8])
+                    else:
+                        course = 0.0
+                except ValueError:
+                    return False
 
             # TODO - Add Magnetic Variation
 
             # Update Object Data
             self._latitude = [lat_degs, lat_mins, lat_hemi]
             self._longitude = [lon_degs, lon_mins, lon_hemi]
-            # Include mph and hm/h
-            self.speed = [spd_knt, spd_knt * 1.151, spd_knt * 1.852]
-            self.course = course
+            if self.lazy:
+                self._deferred['speed'] = raw
+                self._deferred['course'] = raw
+            else:
+                # Include mph and hm/h
+                self.speed = [spd_knt, spd_knt * 1.151, spd_knt * 1.852]
+                self.course = course
             self.valid = True
 
             # Update Last Fix Time
             self.new_fix_time()
+            if self.history_size:
+                self._velocity_tick = _ticks_ms()
+            self._record_fix()
 
         else:  # Clear Position Data if Sentence is 'Invalid'
             self._latitude = [0, 0.0, 'N']
@@ -275,20 +968,23 @@ class MicropyGPS(object):
         """Parse Geographic Latitude and Longitude (GLL)Sentence. Updates UTC timestamp, latitude,
         longitude, and fix status"""
 
-        # UTC Timestamp
-        try:
-            utc_string = self.gps_segments[5]
+        # UTC Timestamp, decoded on first access in lazy mode
+        if self.lazy:
+            self._deferred['timestamp'] = self._snapshot('GLL')
+        else:
+            try:
+                utc_string = self.gps_segments[5]
 
-            if utc_string:  # Possible timestamp found
-                hours = (int(utc_string[0:2]) + self.local_offset) % 24
-                minutes = int(utc_string[2:4])
-                seconds = float(utc_string[4:])
-                self.timestamp = [hours, minutes, seconds]
-            else:  # No Time stamp yet
-                self.timestamp = [0, 0, 0.0]
+                if utc_string:  # Possible timestamp found
+                    hours = (int(utc_string[0:2]) + self.local_offset) % 24
+                    minutes = int(utc_string[2:4])
+                    seconds = float(utc_string[4:])
+                    self.timestamp = [hours, minutes, seconds]
+                else:  # No Time stamp yet
+                    self.timestamp = [0, 0, 0.0]
 
-        except ValueError:  # Bad Timestamp value present
-            return False
+            except ValueError:  # Bad Timestamp value present
+                return False
 
         # Check Receiver Data Valid Flag
         if self.gps_segments[6] == 'A':  # Data from Receiver is Valid/Has Fix
@@ -322,6 +1018,7 @@ class MicropyGPS(object):
 
             # Update Last Fix Time
             self.new_fix_time()
+            self._record_fix()
 
         else:  # Clear Position Data if Sentence is 'Invalid'
             self._latitude = [0, 0.0, 'N']
@@ -332,6 +1029,14 @@ class MicropyGPS(object):
 
     def gpvtg(self):
         """Parse Track Made Good and Ground Speed (VTG) Sentence. Updates speed and course"""
+        if self.lazy:
+            raw = self._snapshot('VTG')
+            self._deferred['speed'] = raw
+            self._deferred['course'] = raw
+            if self.history_size:
+                self._velocity_tick = _ticks_ms()
+            return True
+
         try:
             course = float(self.gps_segments[1]) if self.gps_segments[1] else 0.0
             spd_knt = float(self.gps_segments[5]) if self.gps_segments[5] else 0.0
@@ -341,6 +1046,8 @@ class MicropyGPS(object):
         # Include mph and km/h
         self.speed = (spd_knt, spd_knt * 1.151, spd_knt * 1.852)
         self.course = course
+        if self.history_size:
+            self._velocity_tick = _ticks_ms()
         return True
 
     def gpgga(self):
@@ -348,18 +1055,19 @@ class MicropyGPS(object):
         fix status, satellites in use, Horizontal Dilution of Precision (HDOP), altitude, geoid height and fix status"""
 
         try:
-            # UTC Timestamp
-            utc_string = self.gps_segments[1]
-
-            # Skip timestamp if receiver doesn't have on yet
-            if utc_string:
-                hours = (int(utc_string[0:2]) + self.local_offset) % 24
-                minutes = int(utc_string[2:4])
-                seconds = float(utc_string[4:])
-            else:
-                hours = 0
-                minutes = 0
-                seconds = 0.0
+            # UTC Timestamp, decoded on first access in lazy mode
+            if not self.lazy:
+                utc_string = self.gps_segments[1]
+
+                # Skip timestamp if receiver doesn't have on yet
+                if utc_string:
+                    hours = (int(utc_string[0:2]) + self.local_offset) % 24
+                    minutes = int(utc_string[2:4])
+                    seconds = float(utc_string[4:])
+                else:
+                    hours = 0
+                    minutes = 0
+                    seconds = 0.0
 
             # Number of Satellites in Use
             satellites_in_use = int(self.gps_segments[7])
@@ -370,11 +1078,12 @@ class MicropyGPS(object):
         except (ValueError, IndexError):
             return False
 
-        try:
-            # Horizontal Dilution of Precision
-            hdop = float(self.gps_segments[8])
-        except (ValueError, IndexError):
-            hdop = 0.0
+        # Horizontal Dilution of Precision, decoded on first access in lazy mode
+        if not self.lazy:
+            try:
+                hdop = float(self.gps_segments[8])
+            except (ValueError, IndexError):
+                hdop = 0.0
 
         # Process Location and Speed Data if Fix is GOOD
         if fix_stat:
@@ -401,29 +1110,39 @@ class MicropyGPS(object):
             if lon_hemi not in self.__HEMISPHERES:
                 return False
 
-            # Altitude / Height Above Geoid
-            try:
-                altitude = float(self.gps_segments[9])
-                geoid_height = float(self.gps_segments[11])
-            except ValueError:
-                altitude = 0
-                geoid_height = 0
+            # Altitude / Height Above Geoid, decoded on first access in lazy mode
+            if not self.lazy:
+                try:
+                    altitude = float(self.gps_segments[9])
+                    geoid_height = float(self.gps_segments[11])
+                except ValueError:
+                    altitude = 0
+                    geoid_height = 0
+                self.altitude = altitude
+                self.geoid_height = geoid_height
 
             # Update Object Data
             self._latitude = [lat_degs, lat_mins, lat_hemi]
             self._longitude = [lon_degs, lon_mins, lon_hemi]
-            self.altitude = altitude
-            self.geoid_height = geoid_height
 
         # Update Object Data
-        self.timestamp = [hours, minutes, seconds]
+        if self.lazy:
+            raw = self._snapshot('GGA')
+            self._deferred['timestamp'] = raw
+            self._deferred['hdop'] = raw
+            if fix_stat:
+                self._deferred['altitude'] = raw
+                self._deferred['geoid_height'] = raw
+        else:
+            self.timestamp = [hours, minutes, seconds]
+            self.hdop = hdop
         self.satellites_in_use = satellites_in_use
-        self.hdop = hdop
         self.fix_stat = fix_stat
 
         # If Fix is GOOD, update fix timestamp
         if fix_stat:
             self.new_fix_time()
+            self._record_fix()
 
         return True
 
@@ -451,13 +1170,14 @@ class MicropyGPS(object):
             else:
                 break
 
-        # PDOP,HDOP,VDOP
-        try:
-            pdop = float(self.gps_segments[15])
-            hdop = float(self.gps_segments[16])
-            vdop = float(self.gps_segments[17])
-        except ValueError:
-            return False
+        # PDOP,HDOP,VDOP, decoded on first access in lazy mode
+        if not self.lazy:
+            try:
+                pdop = float(self.gps_segments[15])
+                hdop = float(self.gps_segments[16])
+                vdop = float(self.gps_segments[17])
+            except ValueError:
+                return False
 
         # Update Object Data
         self.fix_type = fix_type
@@ -467,9 +1187,15 @@ class MicropyGPS(object):
             self.new_fix_time()
 
         self.satellites_used = sats_used
-        self.hdop = hdop
-        self.vdop = vdop
-        self.pdop = pdop
+        if self.lazy:
+            raw = self._snapshot('GSA')
+            self._deferred['hdop'] = raw
+            self._deferred['vdop'] = raw
+            self._deferred['pdop'] = raw
+        else:
+            self.hdop = hdop
+            self.vdop = vdop
+            self.pdop = pdop
 
         return True
 
@@ -545,17 +1271,34 @@ class MicropyGPS(object):
 
     def new_sentence(self):
         """Adjust Object Flags in Preparation for a New Sentence"""
-        self.gps_segments = ['']
+        if self._spare_buffers is not None:
+            self._next_buffers()
+        self._sentence_len = 0
         self.active_segment = 0
         self.crc_xor = 0
         self.sentence_active = True
         self.process_crc = True
         self.char_count = 0
 
+    def new_segment(self):
+        """Start a new field at the current end of the sentence buffer. Drops the sentence if it has too many"""
+        if self.active_segment + 1 >= self.FIELD_LIMIT:
+            self.sentence_active = False
+            return False
+        self.active_segment += 1
+        self._field_starts[self.active_segment] = self._sentence_len
+        return True
+
     def update(self, new_char):
         """Process a new input char and updates GPS object if necessary based on special characters ('$', ',', '*')
-        Function builds a list of received string that are validate by CRC prior to parsing by the  appropriate
-        sentence function. Returns sentence type on successful parse, None otherwise"""
+        Function stores the received sentence in a fixed buffer that is validated by CRC prior to parsing by the
+        appropriate sentence function. Returns sentence type on successful parse, None otherwise"""
+
+        if self._ubx:
+            data = bytes((ord(new_char),))
+            if self._log_raw:
+                self.write_log(data)
+            return self.update_ubx(data)
 
         valid_sentence = False
 
@@ -565,8 +1308,8 @@ class MicropyGPS(object):
         if 10 <= ascii_char <= 126:
             self.char_count += 1
 
-            # Write Character to log file if enabled
-            if self.log_en:
+            # Write Character to log if raw logging is enabled
+            if self._log_raw:
                 self.write_log(new_char)
 
             # Check if a new string is starting ($)
@@ -576,35 +1319,46 @@ class MicropyGPS(object):
 
             elif self.sentence_active:
 
+                # Store every char, separators included, so fields stay contiguous in the buffer
+                sentence_len = self._sentence_len
+                if sentence_len == len(self._sentence):
+                    self.sentence_active = False
+                    return None
+                self._sentence[sentence_len] = ascii_char
+                self._sentence_len = sentence_len + 1
+
                 # Check if sentence is ending (*)
                 if new_char == '*':
                     self.process_crc = False
-                    self.active_segment += 1
-                    self.gps_segments.append('')
+                    self.new_segment()
                     return None
 
-                # Check if a section is ended (,), Create a new substring to feed
-                # characters to
+                # Check if a section is ended (,), Start a new field
                 elif new_char == ',':
-                    self.active_segment += 1
-                    self.gps_segments.append('')
 
-                # Store All Other printable character and check CRC when ready
-                else:
-                    self.gps_segments[self.active_segment] += new_char
+                    # Drop unwanted sentences as soon as their type is known
+                    if self.active_segment == 0 and self._sentence_filter is not None and \
+                            bytes(self._sentence[0:sentence_len]) not in self._sentence_filter:
+                        self.sentence_active = False
+                        self.skipped_sentences += 1
+                        return None
+
+                    if not self.new_segment():
+                        return None
+
+                # All other printable characters are data, check CRC when ready
+                elif not self.process_crc:
 
                     # When CRC input is disabled, sentence is nearly complete
-                    if not self.process_crc:
-
-                        if len(self.gps_segments[self.active_segment]) == 2:
-                            try:
-                                final_crc = int(self.gps_segments[self.active_segment], 16)
-                                if self.crc_xor == final_crc:
-                                    valid_sentence = True
-                                else:
-                                    self.crc_fails += 1
-                            except ValueError:
-                                pass  # CRC Value was deformed and could not have been correct
+                    if self._sentence_len - self._field_starts[self.active_segment] == 2:
+                        crc_hi = _hex_value(self._sentence[sentence_len - 1])
+                        crc_lo = _hex_value(ascii_char)
+                        # A deformed CRC value could not have been correct
+                        if crc_hi >= 0 and crc_lo >= 0:
+                            if self.crc_xor == (crc_hi << 4) | crc_lo:
+                                valid_sentence = True
+                            else:
+                                self.crc_fails += 1
 
                 # Update CRC
                 if self.process_crc:
@@ -614,15 +1368,18 @@ class MicropyGPS(object):
                 if valid_sentence:
                     self.clean_sentences += 1  # Increment clean sentences received
                     self.sentence_active = False  # Clear Active Processing Flag
+                    if self._log_valid:
+                        self._log_sentence(self._sentence, 0, self._sentence_len)
 
-                    if self.gps_segments[0] in self.supported_sentences:
+                    sentence_type = self.gps_segments[0]
+                    if sentence_type in self._parsers:
 
                         # parse the Sentence Based on the message type, return True if parse is clean
-                        if self.supported_sentences[self.gps_segments[0]](self):
+                        if self._parse(sentence_type):
 
                             # Let host know that the GPS object was updated by returning parsed sentence type
                             self.parsed_sentences += 1
-                            return self.gps_segments[0]
+                            return sentence_type
 
                 # Check that the sentence buffer isn't filling up with Garage waiting for the sentence to complete
                 if self.char_count > self.SENTENCE_LIMIT:
@@ -631,6 +1388,281 @@ class MicropyGPS(object):
         # Tell Host no new sentence was parsed
         return None
 
+    def update_bytes(self, buf):
+        """Process a block of raw receiver bytes (bytes, bytearray or memoryview). Sentence boundaries ('$', '*')
+        are located in bulk and every complete sentence is CRC checked in one pass before being copied into the
+        sentence buffer and handed to the appropriate sentence function. Incomplete sentences are carried over to the next call. Statistics
+        match feeding the same bytes through update(). Returns last sentence type parsed from buf, None otherwise"""
+
+        start = _ticks_us()
+        self.bytes_received += len(buf)
+
+        # Raw logging takes the block as received
+        if self._log_raw:
+            self.write_log(buf)
+
+        if self._ubx:
+            parsed = self.update_ubx(buf)
+            self.update_us += _ticks_diff(_ticks_us(), start)
+            return parsed
+
+        if self._carry:
+            buf = self._carry + bytes(buf)
+            self._carry = b''
+        elif type(buf) is not bytes:
+            buf = bytes(buf)
+
+        parsed = None
+        end = len(buf)
+        view = memoryview(buf)
+        pos = buf.find(b'$')
+
+        # Bytes ahead of the first '$' belong to a sentence the char path still has open
+        if self.sentence_active:
+            parsed = self._update_chars(buf[:end if pos < 0 else pos])
+
+        while pos >= 0:
+            self.sentence_active = False
+            restart = buf.find(b'$', pos + 1)
+
+            # Drop unwanted sentences as soon as their type is known, before looking for the CRC
+            if self._sentence_filter is not None:
+                comma = buf.find(b',', pos + 1, end if restart < 0 else restart)
+                if comma >= 0 and buf[pos + 1:comma] not in self._sentence_filter:
+                    # Types are 5 chars, any other length may hide stray bytes the char path would drop
+                    if comma - pos == 6 or _nmea_xor(buf, pos + 1, comma) >= 0:
+                        self.skipped_sentences += 1
+                    else:
+                        parsed = self._update_chars(buf[pos:end if restart < 0 else restart]) or parsed
+                    pos = restart
+                    continue
+
+            star = buf.find(b'*', pos + 1)
+
+            # Sentence not finished in this block, keep it for the next one unless it's already garbage
+            if star < 0 or star + 3 > end:
+                if restart < 0:
+                    if end - pos <= self.SENTENCE_LIMIT + 2:
+                        self._carry = buf[pos:]
+                    break
+                pos = restart
+                continue
+
+            # A new sentence started before this one was complete
+            if 0 <= restart < star + 3:
+                pos = restart
+                continue
+
+            crc_hi = _hex_value(buf[star + 1])
+            crc_lo = _hex_value(buf[star + 2])
+            crc_xor = _nmea_xor(buf, pos + 1, star)
+
+            # Fast path: well formed sentence within the char limit and a matching CRC
+            clean = star + 2 - pos <= self.SENTENCE_LIMIT + 1 and crc_hi >= 0 and crc_lo >= 0 \
+                and crc_xor == (crc_hi << 4) | crc_lo
+
+            if clean:
+                if self._spare_buffers is not None:
+                    self._next_buffers()
+                starts = self._field_starts
+                # Record field offsets relative to the char after '$', the CRC being the last field
+                field = 0
+                comma = buf.find(b',', pos + 1, star)
+                while comma >= 0 and field < self.FIELD_LIMIT - 2:
+                    field += 1
+                    starts[field] = comma - pos
+                    comma = buf.find(b',', comma + 1, star)
+                clean = comma < 0
+
+            if clean:
+                field += 1
+                starts[field] = star - pos
+                self.active_segment = field
+                self._sentence_len = star + 2 - pos
+                self._sentence[0:self._sentence_len] = view[pos + 1:star + 3]
+                self.clean_sentences += 1
+                if self._log_valid:
+                    self._log_sentence(buf, pos, star + 3)
+
+                sentence_type = self.gps_segments[0]
+                if sentence_type in self._parsers:
+                    if self._parse(sentence_type):
+                        self.parsed_sentences += 1
+                        parsed = sentence_type
+
+            # Anything else (CRC fail, stray bytes, overrun, too many fields) is rare; let the char path
+            # account for it exactly as it would have, up to the next '$'
+            else:
+                parsed = self._update_chars(buf[pos:end if restart < 0 else restart]) or parsed
+
+            pos = restart
+
+        self.update_us += _ticks_diff(_ticks_us(), start)
+        return parsed
+
+    def _parse(self, sentence_type):
+        """Run the parser of sentence_type on the buffered sentence, keeping count and time per type"""
+        start = _ticks_us()
+        clean = self._parsers[sentence_type](self)
+        self._count(sentence_type, clean, start)
+        return clean
+
+    def _count(self, name, clean, start):
+        """Add one parse of name, started at ticks_us start, to sentence_stats"""
+        entry = self.sentence_stats.get(name)
+        if entry is None:
+            entry = self.sentence_stats[name] = [0, 0, 0]
+        entry[0] += 1
+        if not clean:
+            entry[1] += 1
+        entry[2] += _ticks_diff(_ticks_us(), start)
+
+    def stats(self):
+        """Parser statistics as one dict: the sentence counters, bytes and ticks_us spent in update_bytes(),
+        per type [parsed, failed, ticks_us] (the live sentence_stats dict), fixes in the history and, while
+        logging, the log statistics"""
+        stats = {'bytes_received': self.bytes_received, 'update_us': self.update_us,
+                 'clean_sentences': self.clean_sentences, 'parsed_sentences': self.parsed_sentences,
+                 'crc_fails': self.crc_fails, 'skipped_sentences': self.skipped_sentences,
+                 'sentences': self.sentence_stats, 'history': self._history_count}
+        if self.log_en:
+            stats['log'] = self.log_handle.stats()
+        return stats
+
+    def _update_chars(self, chars):
+        """Feed bytes through update() one char at a time. Raw logging already has them from update_bytes()"""
+        log_raw = self._log_raw
+        self._log_raw = False
+        parsed = None
+        for b in chars:
+            parsed = self.update(chr(b)) or parsed
+        self._log_raw = log_raw
+        return parsed
+
+    ########################################
+    # UBX Binary Protocol
+    ########################################
+    @staticmethod
+    def _ddm(value_e7, positive, negative):
+        """[degrees, minutes, hemisphere] of a signed 1e-7 degree coordinate"""
+        magnitude = abs(value_e7)
+        degrees_part = magnitude // 10000000
+        return [degrees_part, (magnitude - degrees_part * 10000000) * 0.000006,
+                negative if value_e7 < 0 else positive]
+
+    def ubx_nav_pvt(self, buf, offset, length):
+        """Parse a UBX NAV-PVT message. Updates timestamp, date, latitude, longitude, speed, course, altitude,
+        geoid height, satellites in use, PDOP, fix type and status, and the horizontal accuracy estimate"""
+        if length < self.UBX_NAV_PVT_SIZE:
+            return False
+        (_, year, month, day, hour, minute, second, valid, _, nano, fix_type, flags, _, num_sv,
+         lon, lat, height, h_msl, h_acc, _, _, _, _, g_speed, head_mot, _, _, p_dop) = \
+            struct.unpack_from(self.UBX_NAV_PVT, buf, offset)
+
+        # Time and date, when the receiver flags them valid
+        if valid & 0x02:
+            self.timestamp = [(hour + self.local_offset) % 24, minute, max(0.0, second + nano / 1000000000)]
+        if valid & 0x01:
+            self.date = (day, month, year % 100)
+
+        self.satellites_in_use = num_sv
+        self.pdop = p_dop / 100
+        self.fix_type = self.__FIX_3D if fix_type in (3, 4) else self.__FIX_2D if fix_type == 2 else self.__NO_FIX
+
+        # gnssFixOK with a 2D, 3D or GNSS + dead reckoning fix
+        if flags & 0x01 and 2 <= fix_type <= 4:
+            self._latitude = self._ddm(lat, 'N', 'S')
+            self._longitude = self._ddm(lon, 'E', 'W')
+            self.altitude = h_msl / 1000
+            self.geoid_height = (height - h_msl) / 1000
+            # Include mph and km/h
+            spd_knt = g_speed * 0.0036 / 1.852
+            self.speed = [spd_knt, spd_knt * 1.151, spd_knt * 1.852]
+            self.course = head_mot / 100000
+            self.horizontal_accuracy = h_acc / 1000
+            self.fix_stat = 1
+            self.valid = True
+
+            # Update Last Fix Time
+            self.new_fix_time()
+            if self.history_size:
+                self._velocity_tick = _ticks_ms()
+            self._record_fix()
+        else:
+            self._latitude = [0, 0.0, 'N']
+            self._longitude = [0, 0.0, 'W']
+            self.speed = [0.0, 0.0, 0.0]
+            self.course = 0.0
+            self.fix_stat = 0
+            self.valid = False
+        return True
+
+    def ubx_nav_dop(self, buf, offset, length):
+        """Parse a UBX NAV-DOP message. Updates PDOP, HDOP and VDOP"""
+        if length < 18:
+            return False
+        _, _, p_dop, _, v_dop, h_dop, _, _ = struct.unpack_from(self.UBX_NAV_DOP, buf, offset)
+        self.pdop = p_dop / 100
+        self.hdop = h_dop / 100
+        self.vdop = v_dop / 100
+        return True
+
+    def update_ubx(self, buf):
+        """Process a block of raw receiver bytes holding UBX frames. Frames are located by their sync chars
+        and checked with the Fletcher checksum; incomplete frames are carried over to the next call, and bytes
+        outside frames (NMEA text, noise) are ignored. Statistics reuse the NMEA counters: clean_sentences for
+        frames with a good checksum, crc_fails, parsed_sentences and skipped_sentences for messages without a
+        parser. Returns the last message type parsed from buf ('NAV-PVT'), None otherwise"""
+        if self._carry:
+            buf = self._carry + bytes(buf)
+            self._carry = b''
+        elif type(buf) is not bytes:
+            buf = bytes(buf)
+
+        parsed = None
+        end = len(buf)
+        sync = self.UBX_SYNC
+        consumed = 0
+        pos = buf.find(sync)
+        while pos >= 0:
+            # Header and checksum need 8 bytes
+            if pos + 8 > end:
+                self._carry = buf[pos:]
+                return parsed
+            length = buf[pos + 4] | buf[pos + 5] << 8
+            if length > self.UBX_LIMIT:
+                pos = buf.find(sync, pos + 1)
+                continue
+            frame_end = pos + 8 + length
+            if frame_end > end:
+                self._carry = buf[pos:]
+                return parsed
+            if _ubx_checksum(buf, pos + 2, frame_end - 2) != buf[frame_end - 2] | buf[frame_end - 1] << 8:
+                self.crc_fails += 1
+                pos = buf.find(sync, pos + 1)
+                continue
+
+            self.clean_sentences += 1
+            if self._log_valid:
+                self.write_log(memoryview(buf)[pos:frame_end])
+            message = self.supported_ubx_messages.get(buf[pos + 2] << 8 | buf[pos + 3])
+            if message is None:
+                self.skipped_sentences += 1
+            else:
+                start = _ticks_us()
+                clean = message[1](self, buf, pos + 6, length)
+                self._count(message[0], clean, start)
+                if clean:
+                    self.parsed_sentences += 1
+                    parsed = message[0]
+            consumed = frame_end
+            pos = buf.find(sync, frame_end)
+
+        # A first sync char at the very end, outside any frame, may start the next one
+        if end > consumed and buf[end - 1] == 0xB5:
+            self._carry = buf[end - 1:]
+        return parsed
+
     def new_fix_time(self):
         """Updates a high resolution counter with current time when fix is updated. Currently only triggered from
         GGA, GSA and RMC sentences"""
@@ -639,6 +1671,157 @@ class MicropyGPS(object):
         except NameError:
             self.fix_time = time.time()
 
+    ########################################
+    # Fix History
+    ########################################
+    @staticmethod
+    def _e7(coordinate):
+        """Signed 1e-7 degrees of a [degrees, minutes, hemisphere] coordinate (south and west negative)"""
+        value = coordinate[0] * 10000000 + int(coordinate[1] * 10000000 / 60 + 0.5)
+        return -value if coordinate[2] in ('S', 'W') else value
+
+    def _record_raw(self, name, at):
+        """Copy the field of a deferred attribute lazy mode has not decoded into the fix history at byte
+        offset at. Returns False, leaving the slot empty, when the value is decoded or too long for it"""
+        history = self._history
+        raw = self._deferred.get(name)
+        if raw is not None:
+            field = raw.positions[name]
+            last = raw.active_segment
+            if field <= last:
+                starts = raw._field_starts
+                start = starts[field]
+                end = starts[field + 1] - 1 if field < last else raw._sentence_len
+                length = end - start
+                if 0 < length <= self.HISTORY_RAW:
+                    history[at:at + length] = raw._sentence[start:end]
+                    if length < self.HISTORY_RAW:
+                        history[at + length] = 0
+                    return True
+        history[at] = 0
+        return False
+
+    def _record_fix(self):
+        """Add the current position to the fix history. Speed and course come from the receiver when an
+        RMC or VTG sentence updated them in the last 2 s, otherwise from the previous history entry.
+        Values lazy mode has not decoded are stored as text, so recording a fix decodes nothing"""
+        ring = self.history_size
+        if not ring:
+            return
+        size = self.HISTORY_ENTRY_SIZE
+        history = self._history
+        now = _ticks_ms()
+        lat_e7 = self._e7(self._latitude)
+        lon_e7 = self._e7(self._longitude)
+
+        index = self._history_head
+        previous = self._history_count
+        newest = (index - 1) % ring
+        if previous and _ticks_diff(now, struct.unpack_from('<I', history, newest * size)[0]) < self.HISTORY_MERGE_MS:
+            # Same epoch as the newest entry: replace it rather than derive a speed over a few ms
+            index = newest
+            previous -= 1
+        raw = index * size + self.HISTORY_RAW_OFFSET
+        width = self.HISTORY_RAW
+
+        if self.horizontal_accuracy is not None:
+            # UBX reports the accuracy itself: store the HDOP that gives it under the UERE model
+            hdop = min(0xFFFF, int(self.horizontal_accuracy / self.UERE * 10 + 0.5))
+            history[raw + 2 * width] = 0
+        elif self._record_raw('hdop', raw + 2 * width):
+            hdop = 0
+        else:
+            hdop = min(0xFFFF, int(self.hdop * 10 + 0.5))
+
+        if self._velocity_tick is not None and _ticks_diff(now, self._velocity_tick) < 2000:
+            speed = 0.0 if self._record_raw('speed', raw) else self.speed[2] / 3.6
+            course = 0.0 if self._record_raw('course', raw + width) else self.course
+        elif previous:
+            tick, lat, lon = struct.unpack_from('<Iii', history, ((index - 1) % ring) * size)
+            seconds = _ticks_diff(now, tick) / 1000
+            east, north = offset_e7(lat, lon, lat_e7, lon_e7)
+            speed = sqrt(north * north + east * east) / seconds
+            course = degrees(atan2(east, north)) % 360
+            history[raw] = history[raw + width] = 0
+        else:
+            speed = 0.0
+            course = 0.0
+            history[raw] = history[raw + width] = 0
+
+        struct.pack_into(self.HISTORY_ENTRY, history, index * size, now, lat_e7, lon_e7,
+                         min(0xFFFF, int(speed * 100 + 0.5)), int(course * 100 + 0.5) % 36000, hdop)
+        if index == self._history_head:
+            self._history_head = (index + 1) % ring
+            self._history_count = min(self._history_count + 1, ring)
+
+    def _history_value(self, index, field, value):
+        """value (field 0 speed in cm/s, 1 course in centidegrees, 2 HDOP x10) of history entry index, or the
+        raw text stored in its place decoded to the same unit; malformed text reads as 0"""
+        history = self._history
+        at = index * self.HISTORY_ENTRY_SIZE + self.HISTORY_RAW_OFFSET + field * self.HISTORY_RAW
+        if not history[at]:
+            return value
+        end = at
+        limit = at + self.HISTORY_RAW
+        while end < limit and history[end]:
+            end += 1
+        try:
+            number = float(bytes(history[at:end]).decode())
+        except ValueError:
+            return 0
+        # Knots to cm/s, degrees to centidegrees, HDOP to tenths
+        return number * (1852 / 36 if field == 0 else 100 if field == 1 else 10)
+
+    def position_at(self, tick, max_age=30000):
+        """Position at a ticks_ms() instant, from the fix history.
+
+        Between two recorded fixes the position is interpolated; before the first or after the last one it
+        is dead-reckoned from the nearest fix with its speed and course. Returns (latitude E7, longitude E7,
+        uncertainty in metres), or None without history or when the nearest fix is more than max_age ms away.
+        """
+        count = self._history_count
+        if not count:
+            return None
+        ring = self.history_size
+        size = self.HISTORY_ENTRY_SIZE
+        newest = self._history_head - 1
+        newer = None
+        for back in range(count):
+            index = (newest - back) % ring
+            entry = struct.unpack_from(self.HISTORY_ENTRY, self._history, index * size)
+            age = _ticks_diff(tick, entry[0])
+            if age >= 0:
+                break
+            newer = entry
+            newer_index = index
+
+        hdop = self._history_value(index, 2, entry[5])
+        if age >= 0 and newer is not None:
+            # Bracketed: linear interpolation, off by at most a * t1 * t2 / 2 under acceleration a
+            span = _ticks_diff(newer[0], entry[0])
+            fraction = age / span
+            lat_e7 = entry[1] + int((newer[1] - entry[1]) * fraction)
+            lon_e7 = entry[2] + int((newer[2] - entry[2]) * fraction)
+            hdop = (hdop + (self._history_value(newer_index, 2, newer[5]) - hdop) * fraction) / 10
+            uncertainty = self.UERE * max(hdop, 1.0) + \
+                0.5 * self.DR_ACCELERATION * (age / 1000) * ((span - age) / 1000)
+            return lat_e7, lon_e7, uncertainty
+
+        if abs(age) > max_age:
+            return None
+        _, lat_e7, lon_e7, speed, course, _ = entry
+        speed = self._history_value(index, 0, speed)
+        course = self._history_value(index, 1, course)
+        seconds = age / 1000
+        speed /= 100
+        distance = speed * seconds
+        course = radians(course / 100)
+        lat_e7, lon_e7 = translate_e7(lat_e7, lon_e7, distance * sin(course), distance * cos(course))
+        seconds = abs(seconds)
+        uncertainty = self.UERE * max(hdop / 10, 1.0) + self.DR_SPEED_ERROR * speed * seconds + \
+            0.5 * self.DR_ACCELERATION * seconds * seconds
+        return lat_e7, lon_e7, uncertainty
+
     #########################################
     # User Helper Functions
     # These functions make working with the GPS object data easier
@@ -702,6 +1885,29 @@ class MicropyGPS(object):
 
         return final_dir
 
+    def position_dd(self):
+        """Current position as signed decimal degrees (lat, lon), south and west negative"""
+        lat = self._latitude[0] + self._latitude[1] / 60
+        lon = self._longitude[0] + self._longitude[1] / 60
+        return (-lat if self._latitude[2] == 'S' else lat), (-lon if self._longitude[2] == 'W' else lon)
+
+    def distance_to(self, lat, lon):
+        """Great-circle distance in metres from the current position to a target in signed decimal degrees"""
+        here = self.position_dd()
+        return haversine(here[0], here[1], lat, lon)
+
+    def bearing_to(self, lat, lon):
+        """Initial bearing in degrees from the current position to a target in signed decimal degrees"""
+        here = self.position_dd()
+        return bearing(here[0], here[1], lat, lon)
+
+    def time_to(self, lat, lon):
+        """Seconds to reach a target at the current ground speed, None when not moving"""
+        speed = self.speed[2] / 3.6
+        if speed <= 0:
+            return None
+        return self.distance_to(lat, lon) / speed
+
     def latitude_string(self):
         """
         Create a readable string of the current latitude data
@@ -826,5 +2032,9 @@ class MicropyGPS(object):
                            'GNGSA': gpgsa,
                           }
 
+    # UBX messages by class << 8 | id: (name, parser)
+    supported_ubx_messages = {0x0107: ('NAV-PVT', ubx_nav_pvt),
+                              0x0104: ('NAV-DOP', ubx_nav_dop)}
+
 if __name__ == "__main__":
     pass
\ No newline at end of file
@@ -0,0 +1,230 @@
+"""
+ringlog - append-only, bounded record log for flash storage (MicroPython / CPython)
+
+Records are appended to a small fixed set of segment files ('seg0.log' ... 'seg<n-1>.log') and read
+back in order from a persisted cursor. Segment with sequence number s lives in slot s % n, so when
+the log is full the oldest segment is overwritten (oldest-first eviction).
+
+    segment  b'RL' + <I sequence> then records
+    record   <BHI magic 0xA5, payload length, CRC32 of payload> + payload
+
+A record torn by a power loss fails its length or CRC check: readers treat it as the end of that
+segment and the writer starts a new segment instead of appending after it. The cursor is written to
+a temporary file and renamed over the old one, so it is either the old or the new position.
+"""
+
+try:
+    import uos as os
+except ImportError:
+    import os
+try:
+    import ustruct as struct
+except ImportError:
+    import struct
+try:
+    from ubinascii import crc32
+except ImportError:
+    try:
+        from binascii import crc32
+    except ImportError:
+        crc32 = None
+
+if crc32 is None:
+    def crc32(data, crc=0):
+        """Bitwise CRC-32 for ports built without binascii.crc32"""
+        crc ^= 0xFFFFFFFF
+        for b in data:
+            crc ^= b
+            for _ in range(8):
+                crc = (crc >> 1) ^ (0xEDB88320 & -(crc & 1))
+        return crc ^ 0xFFFFFFFF
+
+SEGMENT_MAGIC = b'RL'
+SEGMENT_HEADER = '<2sI'
+SEGMENT_HEADER_SIZE = struct.calcsize(SEGMENT_HEADER)
+RECORD_MAGIC = 0xA5
+RECORD_HEADER = '<BHI'
+RECORD_HEADER_SIZE = struct.calcsize(RECORD_HEADER)
+CURSOR_FORMAT = '<II'
+
+
+class RingLog(object):
+    """Bounded append-only log of byte records with a persisted read cursor"""
+
+    def __init__(self, directory, segment_size=16384, segments=4):
+        if segments < 2:
+            raise ValueError('RingLog needs at least 2 segments')
+        self.directory = directory
+        self.segment_size = segment_size
+        self.segments = segments
+
+        # Statistics
+        self.records_written = 0
+        self.bytes_written = 0
+        self.evicted_segments = 0
+        self.corrupt_records = 0
+
+        try:
+            os.mkdir(directory)
+        except OSError:
+            pass
+
+        # Find the newest segment and the end of its valid records
+        self._write_seq = 0
+        self._write_offset = 0
+        self._rotate = True
+        first_seq = None
+        for slot in range(segments):
+            seq = self._segment_seq(slot)
+            if seq is None or seq % segments != slot:
+                continue
+            if first_seq is None or seq < first_seq:
+                first_seq = seq
+            if seq >= self._write_seq:
+                self._write_seq = seq
+        if first_seq is not None:
+            end, clean = self._scan_segment(self._write_seq)
+            self._write_offset = end
+            self._rotate = not clean
+
+        self._cursor = self._load_cursor()
+        if first_seq is None:
+            self._cursor = (0, SEGMENT_HEADER_SIZE)
+        elif self._cursor is None or self._cursor[0] < first_seq:
+            self._cursor = (first_seq, SEGMENT_HEADER_SIZE)
+
+    ########################################
+    # Files
+    ########################################
+    def _path(self, seq):
+        return '%s/seg%d.log' % (self.directory, seq % self.segments)
+
+    def _segment_seq(self, slot):
+        """Sequence number stored in a slot's header, or None if the slot is unused"""
+        try:
+            with open('%s/seg%d.log' % (self.directory, slot), 'rb') as f:
+                header = f.read(SEGMENT_HEADER_SIZE)
+        except OSError:
+            return None
+        if len(header) < SEGMENT_HEADER_SIZE:
+            return None
+        magic, seq = struct.unpack(SEGMENT_HEADER, header)
+        return seq if magic == SEGMENT_MAGIC else None
+
+    def _scan_segment(self, seq):
+        """Return (end of the last valid record, True if nothing follows it)"""
+        path = self._path(seq)
+        end = SEGMENT_HEADER_SIZE
+        with open(path, 'rb') as f:
+            f.seek(end)
+            while True:
+                record = self._read_record(f)
+                if record is None:
+                    break
+                end += RECORD_HEADER_SIZE + len(record)
+        return end, os.stat(path)[6] == end
+
+    def _read_record(self, f):
+        """Read one record at the file position; None at the end of the segment or on a torn record"""
+        header = f.read(RECORD_HEADER_SIZE)
+        if len(header) < RECORD_HEADER_SIZE:
+            return None
+        magic, length, checksum = struct.unpack(RECORD_HEADER, header)
+        if magic != RECORD_MAGIC:
+            return None
+        payload = f.read(length)
+        if len(payload) < length or crc32(payload) & 0xFFFFFFFF != checksum:
+            self.corrupt_records += 1
+            return None
+        return payload
+
+    def _load_cursor(self):
+        try:
+            with open(self.directory + '/cursor', 'rb') as f:
+                data = f.read()
+            return struct.unpack(CURSOR_FORMAT, data)
+        except (OSError, ValueError):
+            return None
+
+    def _store_cursor(self):
+        tmp = self.directory + '/cursor.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(struct.pack(CURSOR_FORMAT, self._cursor[0], self._cursor[1]))
+        os.rename(tmp, self.directory + '/cursor')
+        self.bytes_written += struct.calcsize(CURSOR_FORMAT)
+
+    def _new_segment(self):
+        seq = self._write_seq + 1 if (self._write_offset or self._write_seq) else 0
+        evicted = seq - self.segments
+        if evicted >= 0 and self._cursor[0] <= evicted:
+            # The oldest segment still holds unread records: drop them
+            self.evicted_segments += 1
+            self._cursor = (evicted + 1, SEGMENT_HEADER_SIZE)
+            self._store_cursor()
+        with open(self._path(seq), 'wb') as f:
+            f.write(struct.pack(SEGMENT_HEADER, SEGMENT_MAGIC, seq))
+        self.bytes_written += SEGMENT_HEADER_SIZE
+        self._write_seq = seq
+        self._write_offset = SEGMENT_HEADER_SIZE
+        self._rotate = False
+
+    ########################################
+    # Public API
+    ########################################
+    def append(self, payload):
+        """Append one record (bytes). Raises ValueError if it cannot fit in a segment."""
+        size = RECORD_HEADER_SIZE + len(payload)
+        if size > self.segment_size - SEGMENT_HEADER_SIZE or len(payload) > 0xFFFF:
+            raise ValueError('Record too large for segment')
+        if self._rotate or self._write_offset + size > self.segment_size:
+            self._new_segment()
+        with open(self._path(self._write_seq), 'ab') as f:
+            f.write(struct.pack(RECORD_HEADER, RECORD_MAGIC, len(payload), crc32(payload) & 0xFFFFFFFF))
+            f.write(payload)
+        self._write_offset += size
+        self.records_written += 1
+        self.bytes_written += size
+
+    def read(self, max_records=1):
+        """Return up to max_records unread records as (payload, position) pairs, oldest first.
+        Nothing is consumed until commit() is called with a returned position."""
+        records = []
+        seq, offset = self._cursor
+        while len(records) < max_records and seq <= self._write_seq:
+            if seq == self._write_seq and offset >= self._write_offset:
+                break
+            try:
+                with open(self._path(seq), 'rb') as f:
+                    header = f.read(SEGMENT_HEADER_SIZE)
+                    if len(header) == SEGMENT_HEADER_SIZE and struct.unpack(SEGMENT_HEADER, header) == (SEGMENT_MAGIC, seq):
+                        f.seek(offset)
+                        while len(records) < max_records:
+                            if seq == self._write_seq and offset >= self._write_offset:
+                                break
+                            payload = self._read_record(f)
+                            if payload is None:
+                                break
+                            offset += RECORD_HEADER_SIZE + len(payload)
+                            records.append((payload, (seq, offset)))
+                        if len(records) == max_records:
+                            break
+            except OSError:
+                pass
+            seq += 1
+            offset = SEGMENT_HEADER_SIZE
+        return records
+
+    def commit(self, position):
+        """Mark every record up to position (as returned by read()) as consumed"""
+        if tuple(position) > tuple(self._cursor):
+            self._cursor = tuple(position)
+            self._store_cursor()
+
+    def pending(self):
+        """True if there are unread records"""
+        seq, offset = self._cursor
+        return seq < self._write_seq or (seq == self._write_seq and offset < self._write_offset)
+
+    def bytes_per_record(self):
+        """Flash bytes written (records, segment headers and cursor updates) per stored record"""
+        return self.bytes_written / self.records_written if self.records_written else 0
@@ -0,0 +1,212 @@
+"""
+scanpack - compact packed records for Wi-Fi scan results
+
+Each scan is packed into binary blocks, each carried as a single text line so it fits the line-oriented
+pending files and Adafruit IO values:
+
+    WD1:<base64 block>\\n
+
+Block layout (little endian, no padding, version 1):
+
+    header  <IiiBB   14 bytes: time (device epoch seconds, mod 2**32) at 0, latitude E7 at 4, longitude
+                     E7 at 8, HDOP x10 at 12 (254 at most, 255 = unknown), number of rows at 13
+    row     <6sbBBB  10 bytes: BSSID at 0, RSSI (dBm, clamped to -128..127) at 6, auth code as reported
+                     by WLAN.scan() at 7, channel at 8, SSID length at 9, followed by the SSID bytes (at
+                     most MAX_SSID, longer ones are cut)
+
+A block holds at most MAX_ROWS rows and, when encode_scan() is given max_line, only as many as keep the
+line within it; the rows that do not fit go on in new blocks with the same header fields.
+
+Consolidated AP estimates (apestimator.py) use their own line type, one position per AP, split the same
+way:
+
+    WE1:<base64 block>\\n
+
+    header  <IB         5 bytes: time (device epoch seconds, mod 2**32) at 0, number of rows at 4
+    row     <6siibBBHB  20 bytes: BSSID at 0, latitude E7 at 6, longitude E7 at 10, best RSSI at 14,
+                        auth code at 15, channel at 16, samples (65535 at most) at 17, SSID length at 19,
+                        followed by the SSID bytes (at most MAX_SSID)
+
+Runs on MicroPython (ustruct/ubinascii) and CPython (struct/binascii).
+"""
+
+try:
+    import ustruct as struct
+except ImportError:
+    import struct
+try:
+    import ubinascii as binascii
+except ImportError:
+    import binascii
+
+VERSION = 1
+MARKER = 'WD1:'
+HEADER = '<IiiBB'
+ROW = '<6sbBBB'
+HEADER_SIZE = struct.calcsize(HEADER)
+ROW_SIZE = struct.calcsize(ROW)
+ESTIMATE_MARKER = 'WE1:'
+ESTIMATE_HEADER = '<IB'
+ESTIMATE_ROW = '<6siibBBHB'
+ESTIMATE_HEADER_SIZE = struct.calcsize(ESTIMATE_HEADER)
+ESTIMATE_ROW_SIZE = struct.calcsize(ESTIMATE_ROW)
+MAX_ROWS = 32
+MAX_SSID = 32
+HDOP_UNKNOWN = 255
+
+
+def to_e7(degrees, hemisphere=None):
+    """Convert decimal degrees to a signed fixed-point integer (1e-7 degree units). South and West
+    hemispheres make the value negative whatever the sign of degrees."""
+    value = int(round(abs(degrees) * 10000000)) if hemisphere else int(round(degrees * 10000000))
+    if hemisphere in ('S', 'W'):
+        value = -value
+    return value
+
+
+def _line_budget(max_line, marker):
+    """Largest block whose encoded line (JSON-escaped newline included) fits in max_line bytes"""
+    if max_line is None:
+        return None
+    return (max_line - len(marker) - 2) // 4 * 3
+
+
+def pack_scan(timestamp, lat_e7, lon_e7, hdop, networks, max_bytes=None):
+    """Pack one scan into a list of binary blocks (bytearray) of at most MAX_ROWS rows and max_bytes bytes.
+
+    networks are WLAN.scan() tuples: (ssid, bssid, channel, rssi, security, hidden); hdop is a float or None
+    """
+    hdop10 = HDOP_UNKNOWN if hdop is None else min(int(hdop * 10 + 0.5), HDOP_UNKNOWN - 1)
+    header = struct.pack(HEADER, int(timestamp) & 0xFFFFFFFF, lat_e7, lon_e7, hdop10, 0)
+    blocks = []
+    block = None
+    for net in networks:
+        ssid = bytes(net[0][:MAX_SSID])
+        row = struct.pack(ROW, bytes(net[1]), max(-128, min(127, net[3])), net[4] & 0xFF, net[2] & 0xFF, len(ssid))
+        if block is None or block[HEADER_SIZE - 1] == MAX_ROWS or \
+                (max_bytes and len(block) + len(row) + len(ssid) > max_bytes):
+            block = bytearray(header)
+            blocks.append(block)
+        block.extend(row)
+        block.extend(ssid)
+        block[HEADER_SIZE - 1] += 1
+    return blocks
+
+
+def encode_block(block, marker=MARKER):
+    """Encode a packed block as one text line (marker + base64 + newline)"""
+    return marker + binascii.b2a_base64(block).decode().strip() + '\n'
+
+
+def encode_scan(timestamp, lat_e7, lon_e7, hdop, networks, max_line=None):
+    """Pack and encode one scan; returns the text lines (each at most max_line bytes with its newline
+    JSON-escaped) to append to a batch"""
+    blocks = pack_scan(timestamp, lat_e7, lon_e7, hdop, networks, _line_budget(max_line, MARKER))
+    return ''.join(encode_block(b) for b in blocks)
+
+
+def pack_estimates(timestamp, estimates, max_bytes=None):
+    """Pack AP estimates (bssid, ssid, auth, channel, best_rssi, lat_e7, lon_e7, samples) into a list
+    of binary blocks (bytearray) of at most MAX_ROWS rows and max_bytes bytes. The row stores them in
+    another order: see the module docstring"""
+    header = struct.pack(ESTIMATE_HEADER, int(timestamp) & 0xFFFFFFFF, 0)
+    blocks = []
+    block = None
+    for bssid, ssid, auth, channel, rssi, lat_e7, lon_e7, samples in estimates:
+        ssid = bytes(ssid[:MAX_SSID])
+        row = struct.pack(ESTIMATE_ROW, bytes(bssid), lat_e7, lon_e7, rssi, auth, channel,
+                          min(samples, 0xFFFF), len(ssid))
+        if block is None or block[ESTIMATE_HEADER_SIZE - 1] == MAX_ROWS or \
+                (max_bytes and len(block) + len(row) + len(ssid) > max_bytes):
+            block = bytearray(header)
+            blocks.append(block)
+        block.extend(row)
+        block.extend(ssid)
+        block[ESTIMATE_HEADER_SIZE - 1] += 1
+    return blocks
+
+
+def encode_estimates(timestamp, estimates, max_line=None):
+    """Pack and encode AP estimates; returns the text lines (each at most max_line bytes with its newline
+    JSON-escaped) to append to a batch"""
+    blocks = pack_estimates(timestamp, estimates, _line_budget(max_line, ESTIMATE_MARKER))
+    return ''.join(encode_block(b, ESTIMATE_MARKER) for b in blocks)
+
+
+def decode_block(block):
+    """Decode a packed block into (timestamp, lat_e7, lon_e7, hdop, rows).
+
+    hdop is a float or None, rows are (bssid, rssi, auth, channel, ssid) with bssid and ssid as bytes,
+    in the order of the block's row fields.
+    Raises ValueError if the block is truncated.
+    """
+    if len(block) < HEADER_SIZE:
+        raise ValueError('Truncated scan header')
+    timestamp, lat_e7, lon_e7, hdop10, count = struct.unpack_from(HEADER, block, 0)
+    pos = HEADER_SIZE
+    rows = []
+    for _ in range(count):
+        if pos + ROW_SIZE > len(block):
+            raise ValueError('Truncated scan row')
+        bssid, rssi, auth, channel, ssid_len = struct.unpack_from(ROW, block, pos)
+        pos += ROW_SIZE
+        if pos + ssid_len > len(block):
+            raise ValueError('Truncated SSID')
+        rows.append((bssid, rssi, auth, channel, bytes(block[pos:pos + ssid_len])))
+        pos += ssid_len
+    hdop = None if hdop10 == HDOP_UNKNOWN else hdop10 / 10
+    return timestamp, lat_e7, lon_e7, hdop, rows
+
+
+def decode_estimate_block(block):
+    """Decode an estimate block into (timestamp, rows) with rows as
+    (bssid, ssid, auth, channel, best_rssi, lat_e7, lon_e7, samples).
+    Raises ValueError if the block is truncated."""
+    if len(block) < ESTIMATE_HEADER_SIZE:
+        raise ValueError('Truncated estimate header')
+    timestamp, count = struct.unpack_from(ESTIMATE_HEADER, block, 0)
+    pos = ESTIMATE_HEADER_SIZE
+    rows = []
+    for _ in range(count):
+        if pos + ESTIMATE_ROW_SIZE > len(block):
+            raise ValueError('Truncated estimate row')
+        bssid, lat_e7, lon_e7, rssi, auth, channel, samples, ssid_len = struct.unpack_from(ESTIMATE_ROW, block, pos)
+        pos += ESTIMATE_ROW_SIZE
+        if pos + ssid_len > len(block):
+            raise ValueError('Truncated SSID')
+        rows.append((bssid, bytes(block[pos:pos + ssid_len]), auth, channel, rssi, lat_e7, lon_e7, samples))
+        pos += ssid_len
+    return timestamp, rows
+
+
+def decode_line(line):
+    """Decode one 'WD1:' text line. Returns None for lines in another format (e.g. legacy CSV)."""
+    line = line.strip()
+    if not line.startswith(MARKER):
+        return None
+    return decode_block(binascii.a2b_base64(line[len(MARKER):]))
+
+
+def decode_value(value):
+    """Decode every packed scan in a feed value, skipping lines that are not packed records"""
+    scans = []
+    for line in value.split('\n'):
+        scan = decode_line(line)
+        if scan is not None:
+            scans.append(scan)
+    return scans
+
+
+def decode_estimates(value):
+    """Decode every 'WE1:' line in a feed value into (timestamp, rows) pairs"""
+    blocks = []
+    for line in value.split('\n'):
+        line = line.strip()
+        if line.startswith(ESTIMATE_MARKER):
+            blocks.append(decode_estimate_block(binascii.a2b_base64(line[len(ESTIMATE_MARKER):])))
+    return blocks
+
+
+def format_bssid(bssid):
+    """Format a 6-byte BSSID as AA:BB:CC:DD:EE:FF"""
+    return ':'.join('%02X' % b for b in bssid)
@@ -0,0 +1,99 @@
+"""
+scansched - motion-adaptive scan scheduling (MicroPython / CPython)
+
+Instead of scanning on a fixed period, the scheduler is polled with the current position, speed and
+course and answers whether a scan is due:
+
+    moving      every `distance` metres travelled since the last scan, or once the heading has turned
+                by `turn` degrees; never sooner than min_interval, never later than max_interval
+    stationary  after min_idle, doubling after every stationary scan up to max_idle; moving resets it
+    no fix      every max_interval, like a fixed-period loop
+
+Distance is the path length accumulated between polls while the speed is at least still_speed, so
+position jitter of a parked receiver does not add up to travel. Ticks are ticks_ms() values,
+positions signed E7 coordinates, speed in m/s and course in degrees.
+"""
+
+try:
+    from utime import ticks_diff
+except ImportError:
+    def ticks_diff(end, start):
+        return ((end - start + 0x20000000) & 0x3FFFFFFF) - 0x20000000
+
+from micropyGPS import equirectangular_e7
+
+
+class ScanScheduler(object):
+    """Decides when to scan from motion, and counts APs found per scan and per km"""
+
+    def __init__(self, distance=150, min_interval=5000, max_interval=35000, min_idle=35000, max_idle=300000,
+                 still_speed=1.0, turn=60):
+        self.distance = distance
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.min_idle = min_idle
+        self.max_idle = max_idle
+        self.still_speed = still_speed
+        self.turn = turn
+        self.idle_interval = min_idle
+        self.travelled = 0.0
+        self._last_scan = None
+        self._course = None
+        self._lat = None
+        self._lon = None
+
+        # Statistics
+        self.scans = 0
+        self.idle_scans = 0
+        self.meters = 0.0
+        self.aps = 0
+
+    def update(self, lat_e7, lon_e7, speed):
+        """Feed the current position; the step from the previous one counts as travel when moving"""
+        if self._lat is not None and speed >= self.still_speed:
+            step = equirectangular_e7(self._lat, self._lon, lat_e7, lon_e7)
+            self.travelled += step
+            self.meters += step
+        self._lat = lat_e7
+        self._lon = lon_e7
+
+    def _moving(self, speed):
+        return speed >= self.still_speed or self.travelled >= self.distance
+
+    def due(self, now, speed=None, course=None):
+        """True if a scan should start at tick now. speed is None when there is no usable fix"""
+        if self._last_scan is None:
+            return True
+        elapsed = ticks_diff(now, self._last_scan)
+        if elapsed < self.min_interval:
+            return False
+        if speed is None:
+            return elapsed >= self.max_interval
+        if not self._moving(speed):
+            return elapsed >= self.idle_interval
+        if elapsed >= self.max_interval or self.travelled >= self.distance:
+            return True
+        if self.turn and course is not None and self._course is not None and speed >= self.still_speed:
+            return abs((course - self._course + 180) % 360 - 180) >= self.turn
+        return False
+
+    def scanned(self, now, speed=None, course=None, found=0):
+        """Record a scan started at tick now that found `found` new APs"""
+        if speed is not None and not self._moving(speed):
+            self.idle_scans += 1
+            # Back off when the idle timeout fired, not on the first scan after stopping
+            if ticks_diff(now, self._last_scan or now) >= self.idle_interval:
+                self.idle_interval = min(self.idle_interval * 2, self.max_idle)
+        else:
+            self.idle_interval = self.min_idle
+        self._last_scan = now
+        self._course = course
+        self.travelled = 0.0
+        self.scans += 1
+        self.aps += found
+
+    def aps_per_km(self):
+        return self.aps * 1000 / self.meters if self.meters else 0.0
+
+    def aps_per_scan(self):
+        return self.aps / self.scans if self.scans else 0.0
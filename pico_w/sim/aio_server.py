@@ -0,0 +1,222 @@
+"""
+Local stand-in for the parts of the Adafruit IO REST API the firmware uses (host only, CPython).
+
+    python3 sim/aio_server.py [--port 8080] [--key aio_test] [--max-value 1024] [--rate 30] [--chunk 0]
+                              [--latency 0]
+
+Point the device (or the simulation) at it with AIO_URL = "http://<host>:8080" in config.py.
+
+    POST /api/v2/<user>/feeds/<feed>/data         {"value": "..."}
+    POST /api/v2/<user>/feeds/<feed>/data/batch   [{"value": "..."}, ...]  (or {"data": [...]})
+    GET  /api/v2/<user>/feeds/<feed>/data?limit=N
+
+Like the real service it speaks HTTP/1.1 keep-alive, checks X-AIO-Key, refuses values longer than the
+per-value limit (a batch keeps the valid records and only acknowledges those) and answers 429 once more
+data points than the per-minute rate arrive. With chunk > 0, GET responses are sent with chunked
+transfer encoding in chunks of that size (to exercise streaming clients on large feed histories).
+With latency > 0 every request is answered that many milliseconds late, like the service behind a phone
+hotspot; sleep is what waits it out (the simulation passes its virtual clock's advance).
+Counters in AioStandIn.stats show what the device sent.
+"""
+
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class AioStandIn(object):
+    """Feed storage and accounting shared by all connections"""
+
+    def __init__(self, key='aio_test', max_value=1024, rate=0, chunk=0, latency=0, sleep=time.sleep):
+        self.key = key
+        self.max_value = max_value
+        self.rate = rate
+        self.chunk = chunk
+        self.latency = latency
+        self.sleep = sleep
+        self.feeds = {}
+        self.lock = threading.Lock()
+        self.window = []
+        self.stats = {'requests': 0, 'connections': 0, 'bytes_received': 0,
+                      'records': 0, 'rejected_values': 0, 'throttled': 0}
+
+    def values(self, feed):
+        with self.lock:
+            return [record['value'] for record in self.feeds.get(feed, [])]
+
+    def store(self, feed, values):
+        """Stores the acceptable values, returns the created records or None when throttled"""
+        with self.lock:
+            now = time.monotonic()
+            self.window = [t for t in self.window if now - t < 60]
+            if self.rate and len(self.window) + len(values) > self.rate:
+                self.stats['throttled'] += 1
+                return None
+            created = []
+            records = self.feeds.setdefault(feed, [])
+            for value in values:
+                if not isinstance(value, str) or len(value.encode()) > self.max_value:
+                    self.stats['rejected_values'] += 1
+                    continue
+                record = {'id': str(self.stats['records'] + 1), 'value': value, 'feed_key': feed,
+                          'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())}
+                records.append(record)
+                created.append(record)
+                self.window.append(now)
+                self.stats['records'] += 1
+            return created
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    aio = None
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.aio.stats['connections'] += 1
+
+    def _reply(self, status, body, chunk=0):
+        if self.aio.latency:
+            self.aio.sleep(self.aio.latency / 1000)
+        out = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        if chunk:
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for i in range(0, len(out), chunk):
+                part = out[i:i + chunk]
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(part), part))
+            self.wfile.write(b'0\r\n\r\n')
+            return
+        self.send_header('Content-Length', str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def _feed(self):
+        # /api/v2/<user>/feeds/<feed>/data[/batch]
+        parts = self.path.split('?', 1)[0].strip('/').split('/')
+        if len(parts) < 6 or parts[:2] != ['api', 'v2'] or parts[3] != 'feeds' or parts[5] != 'data':
+            return None, None
+        return parts[4], parts[6:]
+
+    def _authorized(self):
+        if self.headers.get('X-AIO-Key') != self.aio.key:
+            self._reply(401, {'error': 'not authorized'})
+            return False
+        return True
+
+    def _body(self):
+        if 'chunked' in (self.headers.get('Transfer-Encoding') or '').lower():
+            parts = []
+            while True:
+                size = int(self.rfile.readline().split(b';')[0].strip(), 16)
+                if not size:
+                    while self.rfile.readline() not in (b'\r\n', b''):
+                        pass
+                    return b''.join(parts)
+                parts.append(self.rfile.read(size))
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def do_POST(self):
+        raw = self._body()
+        length = len(raw)
+        self.aio.stats['requests'] += 1
+        self.aio.stats['bytes_received'] += length
+        if not self._authorized():
+            return
+        feed, rest = self._feed()
+        if feed is None or rest not in ([], ['batch']):
+            self._reply(404, {'error': 'not found'})
+            return
+        try:
+            body = json.loads(raw)
+        except ValueError:
+            self._reply(400, {'error': 'invalid JSON'})
+            return
+
+        if rest == ['batch']:
+            items = body.get('data') if isinstance(body, dict) else body
+            if not isinstance(items, list):
+                self._reply(400, {'error': 'expected a list of data records'})
+                return
+            created = self.aio.store(feed, [item.get('value') for item in items if isinstance(item, dict)])
+            if created is None:
+                self._reply(429, {'error': 'throttled'})
+            else:
+                self._reply(200, created)
+        else:
+            created = self.aio.store(feed, [body.get('value') if isinstance(body, dict) else None])
+            if created is None:
+                self._reply(429, {'error': 'throttled'})
+            elif not created:
+                self._reply(422, {'error': 'value too long'})
+            else:
+                self._reply(200, created[0])
+
+    def do_GET(self):
+        self.aio.stats['requests'] += 1
+        if not self._authorized():
+            return
+        feed, rest = self._feed()
+        if feed is None or rest:
+            self._reply(404, {'error': 'not found'})
+            return
+        limit = 1000
+        if '?' in self.path:
+            for pair in self.path.split('?', 1)[1].split('&'):
+                name, _, value = pair.partition('=')
+                if name == 'limit' and value.isdigit():
+                    limit = int(value)
+        with self.aio.lock:
+            records = list(reversed(self.aio.feeds.get(feed, [])))[:limit]
+        self._reply(200, records, self.aio.chunk)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that drop a connection mid-response (e.g. a streamed body closed early) are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            ThreadingHTTPServer.handle_error(self, request, client_address)
+
+
+def serve(port=0, host='127.0.0.1', **options):
+    """Starts the stand-in on a background thread. Returns (server, AioStandIn); server.server_address has
+    the port actually bound, call server.shutdown() when done"""
+    aio = AioStandIn(**options)
+    handler = type('Handler', (_Handler,), {'aio': aio})
+    server = _Server((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, aio
+
+
+def main(argv):
+    options = {'port': 8080, 'key': 'aio_test', 'max-value': 1024, 'rate': 0, 'chunk': 0, 'latency': 0}
+    for i in range(1, len(argv) - 1, 2):
+        name = argv[i].lstrip('-')
+        if name not in options:
+            print(__doc__)
+            return 2
+        options[name] = argv[i + 1] if name == 'key' else int(argv[i + 1])
+    server, aio = serve(options['port'], '0.0.0.0', key=options['key'], max_value=options['max-value'],
+                        rate=options['rate'], chunk=options['chunk'], latency=options['latency'])
+    print('Adafruit IO stand-in on port %d' % server.server_address[1])
+    try:
+        while True:
+            time.sleep(10)
+            print(json.dumps(aio.stats))
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
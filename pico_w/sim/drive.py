@@ -0,0 +1,292 @@
+"""
+Runs main.py on CPython against a recorded drive, faster than real time (host only), from the pico_w
+directory:
+
+    python3 sim/drive.py [--gps bench/corpus/clean.nmea | --receiver mtk] [--scans scans.jsonl]
+                         [--seconds 0] [--drain 120] [--offline 60:180] [--latency 500]
+                         [--max-value 1024] [--set KEY=VALUE] [--fs DIR] [--log FILE] [--out results.jsonl]
+
+The firmware runs unmodified on the stand-ins in this directory, all on one virtual clock (vclock.py)
+that skips every wait, so a drive replays in a fraction of its length:
+
+    machine.UART   the NMEA log given with --gps (gps_receiver.ReplayPort, recorded timing) or, with
+                   --receiver mtk|ubx|nmea, a gps_receiver.SimulatedReceiver driving a straight line
+    network.WLAN   scans from --scans, a JSONL file of {"t": seconds, "networks": [[ssid, "aa:bb:cc:dd:ee:ff",
+                   channel, rssi, security, hidden], ...]} (each scan returns the last entry at or before
+                   its time), or else a synthetic field of access points along the track; --offline a:b
+                   (repeatable) drops the link between a and b seconds
+    uos            a scratch directory (--fs, a new temporary one by default) playing the flash volume
+    Adafruit IO    aio_server.py in process, reached over plain HTTP (there is no TLS on the host), each
+                   request answered --latency ms late on the virtual clock (a phone hotspot round trip);
+                   values over --max-value bytes are refused (a 422, or left out of a batch's answer)
+    config         WIFI_* / AIO_* / GPS_* for the stand-ins; --set KEY=VALUE (repeatable, a Python
+                   literal or a bare string) adds or overrides any Config attribute
+
+The run lasts the replay (or --seconds, required with --receiver) plus --drain seconds for the uploader to
+catch up, then prints one JSON object: virtual and wall time, scans, networks heard on the air against
+networks in the uploaded values, those still held on the board (batch, upload queue, pending log,
+estimator) and those lost, batches and bytes uploaded, and losses on the way (UART overruns, evicted
+pending segments, values refused by Adafruit IO and those the firmware gave up on) and the longest the event loop was blocked by one task.
+Firmware output goes to --log (default: discarded).
+"""
+
+import ast
+import contextlib
+import json
+import math
+import os
+import runpy
+import struct
+import sys
+import tempfile
+import time
+import types
+import zlib
+
+try:
+    SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+except NameError:
+    SIM_DIR = os.path.abspath('sim')
+PICO_DIR = os.path.dirname(SIM_DIR)
+sys.path.insert(0, PICO_DIR)
+sys.path.insert(0, SIM_DIR)
+
+# Host tools first: everything imported before vclock.install() keeps the real clock
+import aio_server  # noqa: E402
+import vclock  # noqa: E402
+from gps_receiver import ReplayPort, SimulatedReceiver  # noqa: E402
+
+KEY = 'aio_drive'
+FEED = 'wardriving'
+SECURITIES = (0, 3, 5, 7)
+
+
+class SyntheticScans(object):
+    """Access points scattered over CELL metre cells (0-3 per cell, placed from a hash of the cell, so
+    every run and every pass sees the same ones). A scan hears those within RANGE metres, with a
+    log-distance RSSI and a few dB of per-scan fading, down to FLOOR dBm."""
+
+    CELL = 50
+    RANGE = 120
+    FLOOR = -90
+
+    def __init__(self, position, start):
+        self.position = position
+        self.start = start
+        self._scale = None
+        self._scan = 0
+
+    def __call__(self, now):
+        pos = self.position(now - self.start)
+        if pos is None:
+            return []
+        lat, lon = pos
+        if self._scale is None:
+            # Metres per degree fixed at the first fix, so the grid does not shift along the drive
+            self._scale = (111195.0, 111195.0 * math.cos(math.radians(lat)))
+        y, x = lat * self._scale[0], lon * self._scale[1]
+        cx, cy = int(x // self.CELL), int(y // self.CELL)
+        reach = self.RANGE // self.CELL + 1
+        self._scan += 1
+        networks = []
+        for gx in range(cx - reach, cx + reach + 1):
+            for gy in range(cy - reach, cy + reach + 1):
+                for k in range(zlib.crc32(struct.pack('<ii', gx, gy)) & 3):
+                    h = zlib.crc32(struct.pack('<iii', gx, gy, k))
+                    d = math.hypot((gx + (h & 0xFFFF) / 65536) * self.CELL - x,
+                                   (gy + (h >> 16) / 65536) * self.CELL - y)
+                    fading = zlib.crc32(struct.pack('<II', h, self._scan)) % 9 - 4
+                    rssi = int(-30 - 27 * math.log10(max(d, 1.0))) + fading
+                    if d > self.RANGE or rssi < self.FLOOR:
+                        continue
+                    networks.append((b'AP-%08X' % h, b'\x02' + struct.pack('>I', h) + bytes((k,)),
+                                     1 + h % 11, rssi, SECURITIES[h >> 30], 0))
+        return networks
+
+
+class RecordedScans(object):
+    """Scan results from a JSONL recording, by time since the start of the drive"""
+
+    def __init__(self, path, start):
+        self.start = start
+        self.times = []
+        self.results = []
+        with open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                self.times.append(float(entry['t']))
+                self.results.append([(n[0].encode(), bytes.fromhex(n[1].replace(':', '')), int(n[2]), int(n[3]),
+                                      int(n[4]), int(n[5])) for n in entry['networks']])
+        order = sorted(range(len(self.times)), key=self.times.__getitem__)
+        self.times = [self.times[i] for i in order]
+        self.results = [self.results[i] for i in order]
+
+    def __call__(self, now):
+        seconds = now - self.start
+        found = None
+        for i, t in enumerate(self.times):
+            if t > seconds:
+                break
+            found = i
+        return [] if found is None else self.results[found]
+
+
+def literal(text):
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return text
+
+
+def bssids_in(text, scanpack, zcodec):
+    """BSSIDs (6 bytes) of every record in a batch or feed value, in any of the firmware's formats"""
+    found = set()
+    text = zcodec.decode(text)
+    for line in text.split('\n'):
+        line = line.strip()
+        if line.startswith(scanpack.MARKER):
+            found.update(row[0] for row in scanpack.decode_line(line)[4])
+        elif line.startswith(scanpack.ESTIMATE_MARKER):
+            for _, rows in scanpack.decode_estimates(line):
+                found.update(row[0] for row in rows)
+        elif ',' in line:
+            found.add(bytes.fromhex(line.rsplit(',', 1)[1].replace(':', '')))
+    return found
+
+
+def report(firmware, aio, port, receiver, started, wall):
+    import machine
+    import network
+    import scanpack
+    import uasyncio
+    import zcodec
+
+    stats = firmware['stats']
+    values = aio.values(FEED)
+    captured = set()
+    for value in values:
+        captured |= bssids_in(value, scanpack, zcodec)
+    held = set()
+    pending = firmware['pendientes'].read(1 << 20)
+    for payload, _ in pending:
+        held |= bssids_in(payload.decode(), scanpack, zcodec)
+    for datos, _ in firmware['cola_envio'].items:
+        held |= bssids_in(datos, scanpack, zcodec)
+    held |= bssids_in(''.join(firmware['lote']._records), scanpack, zcodec)
+    if firmware['estimador'] is not None:
+        held.update(estimate[0] for estimate in firmware['estimador'].flush())
+    held -= captured
+    seen = network.seen
+    flash = 0
+    for root, _, files in os.walk('.'):
+        flash += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    virtual = vclock.clock.monotonic() - started
+    gps = firmware['gps']
+    return {
+        'gps': receiver,
+        'virtual_s': round(virtual, 1), 'wall_s': round(wall, 2), 'speedup': round(virtual / wall, 1) if wall else None,
+        'scans': network.stats['scans'], 'scans_without_position': stats['sin_posicion'],
+        'networks_seen': len(seen), 'networks_captured': len(captured & seen), 'networks_held': len(held & seen),
+        'networks_lost': len(seen - captured - held),
+        'batches_uploaded': stats['lotes_enviados'], 'posts': stats['posts'], 'values_stored': len(values),
+        'bytes_sent': aio.stats['bytes_received'], 'requests': aio.stats['requests'],
+        'connections': aio.stats['connections'],
+        'pending_records': len(pending), 'pending_evicted_segments': firmware['pendientes'].evicted_segments,
+        'values_rejected': aio.stats['rejected_values'], 'values_given_up': stats['valores_rechazados'],
+        'records_skipped': stats['pendientes_saltados'], 'uart_overruns': machine.UART.overruns,
+        'loop_block_max_s': round(uasyncio.stats['longest_step_s'], 2),
+        'gps_bytes': port.stats['sent'] if hasattr(port, 'stats') and 'sent' in port.stats else None,
+        'gps_sentences': gps.parsed_sentences, 'gps_crc_fails': gps.crc_fails,
+        'flash_bytes': flash,
+    }
+
+
+def run(options):
+    server, aio = aio_server.serve(key=KEY, max_value=options['max-value'], latency=options['latency'], sleep=vclock.clock.advance)
+    vclock.install()
+    import machine
+    import network
+    import uasyncio
+
+    clock = vclock.clock
+    if options['receiver']:
+        if not options['seconds']:
+            raise ValueError('--receiver needs --seconds')
+        source = SimulatedReceiver(options['receiver'], 9600, clock=clock.monotonic)
+        port = source.port(9600)
+        duration = options['seconds']
+        where = lambda seconds: (source.lat, source.lon) if seconds <= duration else None  # noqa: E731
+    else:
+        port = ReplayPort(options['gps'], clock.monotonic)
+        duration = options['seconds'] or port.duration
+        start_fix = port.track[0][1:] if port.track else None
+        # Before the first fix the receiver is already where it will get it; after the drive, no air
+        where = lambda seconds: (port.position(seconds) or start_fix) if seconds <= duration else None  # noqa: E731
+    started = clock.monotonic()
+
+    config = types.ModuleType('config')
+    settings = {'WIFI_SSID': 'sim', 'WIFI_PASSWORD': 'sim', 'AIO_USERNAME': 'sim', 'AIO_KEY': KEY,
+                'AIO_FEED': FEED, 'AIO_URL': 'http://127.0.0.1:%d' % server.server_address[1],
+                'GPS_UART': 0, 'GPS_TX_PIN': 0, 'GPS_RX_PIN': 1}
+    settings.update(options['set'])
+    config.Config = type('Config', (), settings)
+    sys.modules['config'] = config
+
+    machine.attach_uart(settings['GPS_UART'], port)
+    scans = RecordedScans(options['scans'], started) if options['scans'] else SyntheticScans(where, started)
+    network.configure(scans=scans, offline=tuple((started + a, started + b) for a, b in options['offline']))
+    uasyncio.stop_at = started + duration + options['drain']
+
+    fs = os.path.abspath(options['fs'] or tempfile.mkdtemp(prefix='pico_fs_'))
+    os.makedirs(fs, exist_ok=True)
+    log = open(options['log'], 'w') if options['log'] else open(os.devnull, 'w')
+    cwd = os.getcwd()
+    os.chdir(fs)
+    wall = time.perf_counter()
+    try:
+        with log, contextlib.redirect_stdout(log):
+            firmware = runpy.run_path(os.path.join(PICO_DIR, 'main.py'), run_name='__main__')
+        wall = time.perf_counter() - wall
+        result = report(firmware, aio, port, options['receiver'] or os.path.basename(options['gps']), started, wall)
+        result['fs'] = fs
+    finally:
+        os.chdir(cwd)
+        vclock.uninstall()
+        server.shutdown()
+    return result
+
+
+def main(argv):
+    options = {'gps': os.path.join(PICO_DIR, 'bench', 'corpus', 'clean.nmea'), 'receiver': None, 'scans': None,
+               'seconds': 0, 'drain': 120, 'latency': 500, 'max-value': 1024, 'offline': [], 'set': {}, 'fs': None, 'log': None, 'out': None}
+    for i in range(1, len(argv) - 1, 2):
+        name, value = argv[i].lstrip('-'), argv[i + 1]
+        if name not in options:
+            print(__doc__)
+            return 2
+        if name == 'offline':
+            a, b = value.split(':')
+            options[name].append((float(a), float(b)))
+        elif name == 'set':
+            key, _, text = value.partition('=')
+            options[name][key] = literal(text)
+        elif name in ('seconds', 'drain', 'latency', 'max-value'):
+            options[name] = float(value)
+        else:
+            options[name] = os.path.abspath(value) if name in ('gps', 'scans', 'log', 'out') else value
+    if len(argv) % 2 == 0:
+        print(__doc__)
+        return 2
+    result = run(options)
+    line = json.dumps(result)
+    print(line)
+    if options['out']:
+        with open(options['out'], 'a') as f:
+            f.write(line + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
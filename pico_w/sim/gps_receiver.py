@@ -0,0 +1,484 @@
+"""
+Simulated GPS receiver on a serial port stand-in (host only, CPython).
+
+    python3 sim/gps_receiver.py [--kind mtk] [--baud 9600] [--target 115200] [--period 200]
+                                [--protocol nmea] [--seconds 5]
+
+SimulatedReceiver behaves like a MediaTek ('mtk') or u-blox ('ubx') module, a generic receiver that
+ignores commands ('nmea') or a dead one ('silent'). It emits one epoch of output per navigation period,
+drifting along a straight drive, and sends it at its own baud rate: bytes reach a SerialPort only as
+fast as the line allows, epochs that do not fit the transmit buffer are dropped, and a port set to
+another baud rate reads garbage and cannot be understood. It answers the PMTK commands (PMTK001 / 605 /
+220 / 251 / 314) and UBX-CFG messages (PRT, MSG, RATE with ACK-ACK / ACK-NAK) used by gpsconfig.py.
+
+SerialPort has the machine.UART methods the firmware uses (any, read, write, init, flush). Run as a
+script it configures the receiver with gpsconfig.ReceiverConfig, then parses the output with
+MicropyGPS for --seconds and prints what was applied and the fixes received per second.
+
+ReplayPort plays a recorded NMEA log back in its recorded timing instead, for a receiver that ignores
+commands, and keeps the recorded track so other stand-ins can tell where the receiver was.
+"""
+
+import bisect
+import json
+import math
+import struct
+import sys
+import time
+
+NMEA_TYPES = ('GGA', 'GLL', 'GSA', 'GSV', 'RMC', 'VTG')
+_PMTK314_ORDER = ('GLL', 'RMC', 'VTG', 'GGA', 'GSA', 'GSV')
+_UBX_NMEA_IDS = {0x00: 'GGA', 0x01: 'GLL', 0x02: 'GSA', 0x03: 'GSV', 0x04: 'RMC', 0x05: 'VTG'}
+NAV_PVT = (0x01, 0x07)
+BAUDRATES = (4800, 9600, 19200, 38400, 57600, 115200, 230400)
+
+
+def _nmea(body):
+    crc = 0
+    for c in body.encode():
+        crc ^= c
+    return ('$%s*%02X\r\n' % (body, crc)).encode()
+
+
+def _ubx(msg_class, msg_id, payload=b''):
+    body = struct.pack('<BBH', msg_class, msg_id, len(payload)) + payload
+    a = b = 0
+    for c in body:
+        a = (a + c) & 0xFF
+        b = (b + a) & 0xFF
+    return b'\xb5\x62' + body + bytes((a, b))
+
+
+def _garble(data):
+    # What a UART at the wrong baud rate sees: never printable, never a UBX sync
+    return bytes(((b * 7 + 0x55) & 0xFF) | 0x80 for b in data)
+
+
+class SimulatedReceiver(object):
+    """Receiver state, command handling and the transmit side of the line"""
+
+    # Bytes the receiver's transmitter can hold; an epoch that does not fit is dropped
+    TX_BUFFER = 1024
+
+    def __init__(self, kind='mtk', baudrate=9600, period_ms=1000, clock=time.monotonic,
+                 start=(21.8818, -102.2916), speed=12.0, course=35.0):
+        self.kind = kind
+        self.baudrate = baudrate
+        self.period_ms = period_ms
+        self.clock = clock
+        self.lat, self.lon = start
+        self.speed = speed
+        self.course = course
+        self.nmea = set(NMEA_TYPES)
+        self.ubx = set()
+        self.nmea_out = True
+        self._tx = bytearray()
+        self._wire = []
+        self._rx = bytearray()
+        self._epoch = 0
+        self._now = clock()
+        self._next_epoch = self._now
+        self._credit = 0.0
+        self.stats = {'epochs': 0, 'dropped_epochs': 0, 'commands': 0, 'acks': 0, 'naks': 0,
+                      'garbled_commands': 0}
+
+    def port(self, baudrate=9600):
+        return SerialPort(self, baudrate)
+
+    # Line
+    def _transmit(self, until):
+        if self._tx:
+            self._credit += (until - self._now) * self.baudrate / 10
+            n = min(int(self._credit), len(self._tx))
+            if n:
+                self._wire.append((self.baudrate, bytes(self._tx[:n])))
+                del self._tx[:n]
+                self._credit -= n
+        if not self._tx:
+            self._credit = 0.0
+        self._now = until
+
+    def advance(self):
+        """Run the receiver up to the current clock time"""
+        now = self.clock()
+        while self._next_epoch <= now:
+            self._transmit(self._next_epoch)
+            if self.kind != 'silent':
+                data = self._epoch_output()
+                if len(self._tx) + len(data) > self.TX_BUFFER:
+                    self.stats['dropped_epochs'] += 1
+                else:
+                    self._tx += data
+                    self.stats['epochs'] += 1
+            self._epoch += 1
+            self._next_epoch += self.period_ms / 1000
+        self._transmit(now)
+
+    def take(self):
+        wire = self._wire
+        self._wire = []
+        return wire
+
+    def _reply(self, data, baudrate=None):
+        if baudrate is None:
+            self._tx += data
+        else:
+            # Sent right away at a given rate (e.g. the old one, just before a baud change)
+            self._wire.append((baudrate, data))
+
+    # Output
+    def _epoch_output(self):
+        seconds = self._epoch * self.period_ms / 1000
+        metres = self.speed * self.period_ms / 1000
+        self.lat += metres * math.cos(math.radians(self.course)) / 111195
+        self.lon += metres * math.sin(math.radians(self.course)) / (111195 * math.cos(math.radians(self.lat)))
+        t = 17 * 3600 + 5 * 60 + seconds
+        hms = '%02d%02d%05.2f' % (t // 3600 % 24, t // 60 % 60, t % 60)
+        lat = abs(self.lat)
+        lon = abs(self.lon)
+        la = '%02d%08.5f,%s' % (int(lat), (lat - int(lat)) * 60, 'N' if self.lat >= 0 else 'S')
+        lo = '%03d%08.5f,%s' % (int(lon), (lon - int(lon)) * 60, 'E' if self.lon >= 0 else 'W')
+        knots = self.speed / 0.514444
+        out = []
+        if self.nmea_out:
+            if 'RMC' in self.nmea:
+                out.append(_nmea('GPRMC,%s,A,%s,%s,%.3f,%.2f,181025,,,A' % (hms, la, lo, knots, self.course)))
+            if 'VTG' in self.nmea:
+                out.append(_nmea('GPVTG,%.2f,T,,M,%.3f,N,%.3f,K,A' % (self.course, knots, knots * 1.852)))
+            if 'GGA' in self.nmea:
+                out.append(_nmea('GPGGA,%s,%s,%s,1,08,0.94,1880.4,M,-8.9,M,,' % (hms, la, lo)))
+            if 'GSA' in self.nmea:
+                out.append(_nmea('GPGSA,A,3,02,05,06,12,13,15,19,24,,,,,1.71,0.94,1.42'))
+            if 'GSV' in self.nmea:
+                for n in range(3):
+                    sats = ','.join('%02d,%02d,%03d,%02d' % (4 * n + i + 1, 20 + 5 * i, 90 * i, 30 + i) for i in range(4))
+                    out.append(_nmea('GPGSV,3,%d,12,%s' % (n + 1, sats)))
+            if 'GLL' in self.nmea:
+                out.append(_nmea('GPGLL,%s,%s,%s,A,A' % (la, lo, hms)))
+        if NAV_PVT in self.ubx:
+            mm_s = self.speed * 1000
+            payload = struct.pack('<IHBBBBBBIiBBBBiiiiIIiiiiiIIHB5sihH',
+                                  int((6 * 86400 + t) * 1000), 2025, 10, 18, int(t // 3600 % 24), int(t // 60 % 60),
+                                  int(t % 60), 0x07, 30, 0, 3, 0x01, 0, 8,
+                                  int(round(self.lon * 1e7)), int(round(self.lat * 1e7)), 1871500, 1880400, 2350, 3500,
+                                  int(mm_s * math.cos(math.radians(self.course))),
+                                  int(mm_s * math.sin(math.radians(self.course))), 0,
+                                  int(mm_s), int(self.course * 100000), 300, 150000, 171, 0, b'\0' * 5, 0, 0, 0)
+            out.append(_ubx(0x01, 0x07, payload))
+        return b''.join(out)
+
+    # Commands
+    def receive(self, data, baudrate):
+        """Bytes written by a port set to baudrate"""
+        if baudrate != self.baudrate:
+            self.stats['garbled_commands'] += 1
+            return
+        if self.kind in ('nmea', 'silent'):
+            return
+        self._rx += data
+        while True:
+            start = self._rx.find(b'$')
+            sync = self._rx.find(b'\xb5\x62')
+            if sync >= 0 and (start < 0 or sync < start):
+                if len(self._rx) < sync + 8:
+                    return
+                length = self._rx[sync + 4] | self._rx[sync + 5] << 8
+                end = sync + 8 + length
+                if len(self._rx) < end:
+                    return
+                frame = bytes(self._rx[sync:end])
+                del self._rx[:end]
+                if self.kind == 'ubx' and _ubx(frame[2], frame[3], frame[6:-2]) == frame:
+                    self.stats['commands'] += 1
+                    self._ubx_command(frame[2], frame[3], frame[6:-2])
+            elif start >= 0:
+                end = self._rx.find(b'\r\n', start)
+                if end < 0:
+                    return
+                line = bytes(self._rx[start:end]).decode('ascii', 'replace')
+                del self._rx[:end + 2]
+                body = line[1:].split('*')[0]
+                if self.kind == 'mtk' and _nmea(body).strip().decode() == line:
+                    self.stats['commands'] += 1
+                    self._mtk_command(body.split(','))
+            else:
+                del self._rx[:]
+                return
+
+    def _set_period(self, period_ms):
+        self.period_ms = period_ms
+        self._next_epoch = min(self._next_epoch, self._now + period_ms / 1000)
+
+    def _pmtk_ack(self, command, flag):
+        self.stats['acks' if flag == 3 else 'naks'] += 1
+        self._reply(_nmea('PMTK001,%s,%d' % (command, flag)))
+
+    def _mtk_command(self, fields):
+        command = fields[0][4:]
+        if command == '605':
+            self._reply(_nmea('PMTK705,AXN_2.31_3339_13101700,5632,PA6H,1.0'))
+        elif command == '314' and len(fields) >= 7:
+            self.nmea = set(name for name, flag in zip(_PMTK314_ORDER, fields[1:7]) if flag.strip('0'))
+            self._pmtk_ack(command, 3)
+        elif command == '220' and len(fields) == 2:
+            period = int(fields[1])
+            if 100 <= period <= 10000:
+                self._set_period(period)
+                self._pmtk_ack(command, 3)
+            else:
+                self._pmtk_ack(command, 2)
+        elif command == '251' and len(fields) == 2:
+            # No acknowledgement: the receiver just switches
+            if int(fields[1]) in BAUDRATES:
+                self.baudrate = int(fields[1])
+                self._tx = bytearray()
+        else:
+            self._pmtk_ack(command, 1)
+
+    def _ubx_ack(self, msg_class, msg_id, ok, baudrate=None):
+        self.stats['acks' if ok else 'naks'] += 1
+        self._reply(_ubx(0x05, 0x01 if ok else 0x00, bytes((msg_class, msg_id))), baudrate)
+
+    def _ubx_command(self, msg_class, msg_id, payload):
+        if msg_class != 0x06:
+            return
+        if msg_id == 0x00 and len(payload) == 1:
+            self._reply(_ubx(0x06, 0x00, struct.pack('<BBHIIHHHH', 1, 0, 0, 0x08D0, self.baudrate, 0x03,
+                                                     0x03 if self.nmea_out else 0x01, 0, 0)))
+        elif msg_id == 0x00 and len(payload) == 20:
+            baudrate, out_proto = struct.unpack_from('<I', payload, 8)[0], payload[14]
+            if baudrate not in BAUDRATES:
+                self._ubx_ack(msg_class, msg_id, False)
+                return
+            self._ubx_ack(msg_class, msg_id, True, self.baudrate)
+            self.baudrate = baudrate
+            self.nmea_out = bool(out_proto & 0x02)
+            self._tx = bytearray()
+        elif msg_id == 0x01 and len(payload) in (3, 8):
+            rate = payload[2] if len(payload) == 3 else payload[3]
+            if payload[0] == 0xF0 and payload[1] in _UBX_NMEA_IDS:
+                name = _UBX_NMEA_IDS[payload[1]]
+                if rate:
+                    self.nmea.add(name)
+                else:
+                    self.nmea.discard(name)
+            elif (payload[0], payload[1]) == NAV_PVT:
+                if rate:
+                    self.ubx.add(NAV_PVT)
+                else:
+                    self.ubx.discard(NAV_PVT)
+            self._ubx_ack(msg_class, msg_id, True)
+        elif msg_id == 0x08 and len(payload) == 6:
+            period = struct.unpack_from('<H', payload)[0]
+            if period >= 25:
+                self._set_period(period)
+            self._ubx_ack(msg_class, msg_id, period >= 25)
+        else:
+            self._ubx_ack(msg_class, msg_id, False)
+
+
+class SerialPort(object):
+    """machine.UART stand-in wired to a SimulatedReceiver"""
+
+    def __init__(self, receiver, baudrate=9600):
+        self.receiver = receiver
+        self.baudrate = baudrate
+        self._rx = bytearray()
+
+    def init(self, baudrate=9600, **kwargs):
+        self.baudrate = baudrate
+        self._rx = bytearray()
+
+    def _pull(self):
+        self.receiver.advance()
+        for baudrate, data in self.receiver.take():
+            self._rx += data if baudrate == self.baudrate else _garble(data)
+
+    def any(self):
+        self._pull()
+        return len(self._rx)
+
+    def read(self, nbytes=None):
+        self._pull()
+        if not self._rx:
+            return None
+        if nbytes is None or nbytes >= len(self._rx):
+            data = bytes(self._rx)
+            self._rx = bytearray()
+        else:
+            data = bytes(self._rx[:nbytes])
+            del self._rx[:nbytes]
+        return data
+
+    def write(self, data):
+        self.receiver.advance()
+        self.receiver.receive(bytes(data), self.baudrate)
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+def _nmea_seconds(field):
+    """Seconds of the day of an NMEA hhmmss(.ss) field"""
+    return int(field[0:2]) * 3600 + int(field[2:4]) * 60 + float(field[4:])
+
+
+def _nmea_degrees(value, hemisphere):
+    degrees = int(float(value) / 100)
+    result = degrees + (float(value) - degrees * 100) / 60
+    return -result if hemisphere in ('S', 'W') else result
+
+
+class ReplayPort(object):
+    """machine.UART stand-in replaying a recorded NMEA log in recorded time.
+
+    Lines are grouped into epochs by the UTC time in their RMC, GGA, GLL or ZDA fields (sentences with a
+    good checksum only), and each epoch reaches the port once clock() is as far past the start as its time
+    is past the first epoch's. Lines with no time, or broken ones, travel with the epoch they were
+    recorded in. Writes are ignored, like a
+    receiver that takes no commands, and the baud rate is not modelled. track holds (seconds, latitude,
+    longitude) of every epoch with a fix; position(seconds) interpolates it.
+    """
+
+    def __init__(self, path, clock=time.monotonic):
+        with open(path, 'rb') as f:
+            data = f.read()
+        self.clock = clock
+        self.epochs = []
+        self.track = []
+        start = previous = None
+        day = offset = 0
+        chunk = []
+        for line in data.splitlines(True):
+            text = line.strip().decode('ascii', 'replace')
+            fields = text.split('*')[0].split(',')
+            valid = text.startswith('$') and _nmea(text[1:].split('*')[0]).decode() == text + '\r\n'
+            kind = fields[0][3:] if valid else ''
+            try:
+                when = _nmea_seconds(fields[5 if kind == 'GLL' else 1]) if kind in ('RMC', 'GGA', 'GLL', 'ZDA') else None
+            except (ValueError, IndexError):
+                when = None
+            if when is not None:
+                if start is None:
+                    start = previous = when
+                if when < previous - 43200:
+                    day += 86400  # past midnight
+                previous = when
+                if when + day - start != offset and chunk:
+                    self.epochs.append((offset, b''.join(chunk)))
+                    chunk = []
+                offset = when + day - start
+            chunk.append(line)
+            try:
+                if kind == 'RMC' and fields[2] == 'A':
+                    self._fix(offset, fields[3:7])
+                elif kind == 'GGA' and fields[6] not in ('', '0'):
+                    self._fix(offset, fields[2:6])
+            except (ValueError, IndexError):
+                pass
+        if chunk:
+            self.epochs.append((offset, b''.join(chunk)))
+        self.duration = self.epochs[-1][0] if self.epochs else 0
+        self._next = 0
+        self._start = clock()
+        self._rx = bytearray()
+        self.stats = {'epochs': len(self.epochs), 'bytes': len(data), 'sent': 0}
+
+    def _fix(self, seconds, fields):
+        point = (seconds, _nmea_degrees(fields[0], fields[1]), _nmea_degrees(fields[2], fields[3]))
+        if self.track and self.track[-1][0] == seconds:
+            self.track[-1] = point
+        else:
+            self.track.append(point)
+
+    def position(self, seconds):
+        """(latitude, longitude) of the recorded track seconds after the start of the replay, None before
+        the first fix"""
+        track = self.track
+        i = bisect.bisect_right(track, (seconds, 1000.0, 1000.0))
+        if i == 0:
+            return None
+        if i == len(track):
+            return track[-1][1:]
+        (t0, lat0, lon0), (t1, lat1, lon1) = track[i - 1], track[i]
+        f = (seconds - t0) / (t1 - t0) if t1 > t0 else 0
+        return lat0 + (lat1 - lat0) * f, lon0 + (lon1 - lon0) * f
+
+    def finished(self):
+        return self._next >= len(self.epochs) and not self._rx
+
+    def _pull(self):
+        elapsed = self.clock() - self._start
+        while self._next < len(self.epochs) and self.epochs[self._next][0] <= elapsed:
+            data = self.epochs[self._next][1]
+            self._rx += data
+            self.stats['sent'] += len(data)
+            self._next += 1
+
+    def init(self, baudrate=9600, **kwargs):
+        pass
+
+    def any(self):
+        self._pull()
+        return len(self._rx)
+
+    def read(self, nbytes=None):
+        self._pull()
+        if not self._rx:
+            return None
+        if nbytes is None or nbytes >= len(self._rx):
+            data = bytes(self._rx)
+            self._rx = bytearray()
+        else:
+            data = bytes(self._rx[:nbytes])
+            del self._rx[:nbytes]
+        return data
+
+    def write(self, data):
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+def main(argv):
+    options = {'kind': 'mtk', 'baud': 9600, 'target': 115200, 'period': 200, 'protocol': 'nmea', 'seconds': 5}
+    for i in range(1, len(argv) - 1, 2):
+        name = argv[i].lstrip('-')
+        if name not in options:
+            print(__doc__)
+            return 2
+        options[name] = argv[i + 1] if name in ('kind', 'protocol') else int(argv[i + 1])
+    sys.path.insert(0, __file__.rsplit('/', 2)[0] if __file__.count('/') > 1 else '..')
+    from gpsconfig import ReceiverConfig
+    from micropyGPS import MicropyGPS
+
+    receiver = SimulatedReceiver(options['kind'], options['baud'])
+    port = receiver.port(9600)
+    started = time.monotonic()
+    config = ReceiverConfig(port, 9600)
+    result = config.configure(options['target'], options['period'], ('GGA', 'RMC'), options['protocol'])
+    result['seconds'] = round(time.monotonic() - started, 2)
+    print('configure: ' + json.dumps(result))
+
+    gps = MicropyGPS(sentences=('GGA', 'RMC') if result['protocol'] == 'nmea' else None,
+                     protocol=result['protocol'])
+    port.read()
+    end = time.monotonic() + options['seconds']
+    while time.monotonic() < end:
+        data = port.read()
+        if data:
+            gps.update_bytes(data)
+        time.sleep(0.05)
+    # One GGA + one RMC, or one NAV-PVT, per fix
+    fixes = gps.parsed_sentences / (2 if result['protocol'] == 'nmea' else 1)
+    print('parsed: ' + json.dumps({'fixes_per_s': fixes / options['seconds'],
+                                   'sentences_per_s': gps.parsed_sentences / options['seconds'],
+                                   'skipped_sentences': gps.skipped_sentences, 'crc_fails': gps.crc_fails,
+                                   'receiver': receiver.stats}))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,128 @@
+"""
+CPython stand-in for MicroPython's machine module (host only): UART and Pin.
+
+A UART reads from the port attached to its id with attach_uart(), e.g. a gps_receiver.ReplayPort or a
+SimulatedReceiver's SerialPort; without one it is silent. Like the RP2040 driver, received bytes wait in
+a buffer of rxbuf bytes (256 by default) until read and whatever arrives while it is full is lost,
+counted in UART.overruns, so a firmware that stops reading for too long loses data here as well.
+"""
+
+_ports = {}
+
+
+def attach_uart(uart_id, port):
+    """Wire UART(uart_id) to port, an object with any(), read(), write() and init(baudrate=...)"""
+    _ports[uart_id] = port
+
+
+class _Silent(object):
+    def init(self, baudrate=9600, **kwargs):
+        pass
+
+    def any(self):
+        return 0
+
+    def read(self, nbytes=None):
+        return None
+
+    def write(self, data):
+        return len(data)
+
+
+class UART(object):
+    # Bytes lost to full receive buffers, all UARTs
+    overruns = 0
+
+    def __init__(self, uart_id, baudrate=9600, **kwargs):
+        self.id = uart_id
+        self._port = _ports.get(uart_id) or _Silent()
+        self._rx = bytearray()
+        self.init(baudrate, **kwargs)
+
+    def init(self, baudrate=9600, rxbuf=256, **kwargs):
+        self.baudrate = baudrate
+        self.rxbuf = rxbuf
+        self._rx = bytearray()
+        self._port.init(baudrate=baudrate)
+
+    def _pull(self):
+        data = self._port.read()
+        if data:
+            room = self.rxbuf - len(self._rx)
+            if len(data) > room:
+                UART.overruns += len(data) - room
+                data = data[:room]
+            self._rx += data
+
+    def any(self):
+        self._pull()
+        return len(self._rx)
+
+    def read(self, nbytes=None):
+        self._pull()
+        if not self._rx:
+            return None
+        if nbytes is None or nbytes >= len(self._rx):
+            data = bytes(self._rx)
+            self._rx = bytearray()
+        else:
+            data = bytes(self._rx[:nbytes])
+            del self._rx[:nbytes]
+        return data
+
+    def readinto(self, buf, nbytes=None):
+        data = self.read(len(buf) if nbytes is None else min(nbytes, len(buf)))
+        if not data:
+            return None
+        buf[:len(data)] = data
+        return len(data)
+
+    def write(self, data):
+        return self._port.write(bytes(data))
+
+    def flush(self):
+        pass
+
+    def deinit(self):
+        self._rx = bytearray()
+
+
+class Pin(object):
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+
+    def __init__(self, pin_id, mode=-1, pull=-1, value=None):
+        self.id = pin_id
+        self._value = value or 0
+
+    def value(self, value=None):
+        if value is None:
+            return self._value
+        self._value = 1 if value else 0
+
+    def __call__(self, value=None):
+        return self.value(value)
+
+    def on(self):
+        self._value = 1
+
+    def off(self):
+        self._value = 0
+
+    def toggle(self):
+        self._value ^= 1
+
+    def init(self, mode=-1, pull=-1, value=None):
+        if value is not None:
+            self._value = 1 if value else 0
+
+
+def freq():
+    return 125000000
+
+
+def unique_id():
+    return b'\xe6\x61\x41\x04\x03\x2b\x4f\x2a'
@@ -0,0 +1,90 @@
+"""
+CPython stand-in for MicroPython's network module on the Pico W (host only): WLAN.
+
+configure() sets where scan results come from and when the link is down:
+
+    scans      callable(seconds) -> list of WLAN.scan() tuples (ssid, bssid, channel, rssi, security,
+               hidden) for virtual time seconds since the clock started
+    offline    (start, end) pairs of virtual seconds without a connection
+    scan_s     how long WLAN.scan() blocks, skipped on the virtual clock (sim/vclock.py)
+    connect_s  time from connect() to isconnected()
+
+stats counts scans, networks returned and the distinct BSSIDs among them (seen).
+"""
+
+from vclock import clock
+
+STA_IF = 0
+AP_IF = 1
+STAT_IDLE = 0
+STAT_CONNECTING = 1
+STAT_GOT_IP = 3
+
+_config = {'scans': lambda seconds: [], 'offline': (), 'scan_s': 1.5, 'connect_s': 2.0}
+stats = {'scans': 0, 'networks': 0, 'connects': 0}
+seen = set()
+
+
+def configure(**options):
+    for name in options:
+        if name not in _config:
+            raise ValueError('Unknown option: ' + name)
+    _config.update(options)
+
+
+def _offline(now):
+    for start, end in _config['offline']:
+        if start <= now < end:
+            return True
+    return False
+
+
+class WLAN(object):
+    def __init__(self, interface=STA_IF):
+        self.interface = interface
+        self._active = False
+        self._connect_at = None
+
+    def active(self, state=None):
+        if state is None:
+            return self._active
+        self._active = bool(state)
+
+    def connect(self, ssid=None, key=None, **kwargs):
+        self._active = True
+        self._connect_at = clock.monotonic()
+        stats['connects'] += 1
+
+    def disconnect(self):
+        self._connect_at = None
+
+    def isconnected(self):
+        if self._connect_at is None:
+            return False
+        now = clock.monotonic()
+        return now - self._connect_at >= _config['connect_s'] and not _offline(now)
+
+    def status(self, param=None):
+        if param == 'rssi':
+            return -60
+        if self.isconnected():
+            return STAT_GOT_IP
+        return STAT_IDLE if self._connect_at is None else STAT_CONNECTING
+
+    def ifconfig(self, config=None):
+        return ('192.168.4.2', '255.255.255.0', '192.168.4.1', '192.168.4.1')
+
+    def config(self, *args, **kwargs):
+        if args == ('mac',):
+            return b'\x28\xcd\xc1\x00\x00\x01'
+        return None
+
+    def scan(self):
+        # Results describe the air at the start of the scan; the scan itself blocks for scan_s
+        results = _config['scans'](clock.monotonic())
+        clock.advance(_config['scan_s'])
+        stats['scans'] += 1
+        stats['networks'] += len(results)
+        for net in results:
+            seen.add(bytes(net[1]))
+        return results
@@ -0,0 +1,185 @@
+"""
+CPython stand-in for MicroPython's uasyncio on the virtual clock (host only).
+
+The subset the firmware uses: run, create_task, sleep, sleep_ms, Event and awaiting a task. Tasks run
+one at a time in order of readiness; when every task is waiting, the clock (sim/vclock.py) skips straight
+to the next wake-up, so timers cost no wall time. Setting stop_at (virtual seconds, vclock.clock.monotonic
+scale) makes run() return once the clock gets there, which is how a firmware whose main task never ends
+is stopped. Like MicroPython, an exception in a background task is printed and the task ends; one in the
+main task is raised from run(). stats['longest_step_s'] is the longest a single task ran before yielding:
+how long everything else (e.g. the task draining the GPS UART) was kept waiting.
+"""
+
+import heapq
+import sys
+import traceback
+from collections import deque
+
+from vclock import clock
+
+# Virtual time at which run() returns even if the main task is still running (None: never)
+stop_at = None
+
+_ready = deque()
+_timers = []
+_sequence = [0]
+stats = {'steps': 0, 'longest_step_s': 0.0}
+
+
+class CancelledError(BaseException):
+    pass
+
+
+class TimeoutError(Exception):
+    pass
+
+
+class _Sleep(object):
+    __slots__ = ('until',)
+
+    def __init__(self, until):
+        self.until = until
+
+    def __await__(self):
+        yield self
+
+
+class _Wait(object):
+    __slots__ = ('event',)
+
+    def __init__(self, event):
+        self.event = event
+
+    def __await__(self):
+        if not self.event.is_set():
+            yield self.event
+
+
+class Task(object):
+    def __init__(self, coro):
+        self.coro = coro
+        self.done = False
+        self.result = None
+        self.exception = None
+        self._waiting = []
+
+    def __await__(self):
+        if not self.done:
+            yield self
+        if self.exception is not None:
+            raise self.exception
+        return self.result
+
+    def cancel(self):
+        if not self.done:
+            self._finish(None, CancelledError())
+            self.coro.close()
+            return True
+        return False
+
+    def _finish(self, result, exception):
+        self.done = True
+        self.result = result
+        self.exception = exception
+        _ready.extend(self._waiting)
+        self._waiting = []
+
+
+class Event(object):
+    def __init__(self):
+        self._flag = False
+        self._waiting = []
+
+    def is_set(self):
+        return self._flag
+
+    def set(self):
+        self._flag = True
+        _ready.extend(self._waiting)
+        self._waiting = []
+
+    def clear(self):
+        self._flag = False
+
+    def wait(self):
+        return _Wait(self)
+
+
+def sleep(seconds):
+    return _Sleep(clock.monotonic() + seconds)
+
+
+def sleep_ms(ms):
+    return _Sleep(clock.monotonic() + ms / 1000)
+
+
+def create_task(coro):
+    task = Task(coro)
+    _ready.append(task)
+    return task
+
+
+def _schedule(task, until):
+    _sequence[0] += 1
+    heapq.heappush(_timers, (until, _sequence[0], task))
+
+
+def _step(task, main):
+    if task.done:
+        return
+    started = clock.monotonic()
+    try:
+        request = task.coro.send(None)
+    except StopIteration as e:
+        task._finish(e.value, None)
+        return
+    except Exception as e:
+        task._finish(None, e)
+        if task is not main:
+            print('Task exception wasn\'t retrieved', file=sys.stderr)
+            traceback.print_exc()
+        return
+    finally:
+        ran = clock.monotonic() - started
+        stats['steps'] += 1
+        if ran > stats['longest_step_s']:
+            stats['longest_step_s'] = ran
+    if isinstance(request, _Sleep):
+        # Like MicroPython, sleep(0) queues behind timers that are already due, so a task that yields
+        # between long operations lets the others run
+        _schedule(task, request.until)
+    elif isinstance(request, (Event, Task)):
+        request._waiting.append(task)
+    elif request is None:
+        _schedule(task, clock.monotonic())
+    else:
+        task._finish(None, TypeError('Unsupported awaitable: %r' % (request,)))
+
+
+def run(coro):
+    """Run coro as the main task until it ends or the clock reaches stop_at. Returns its result"""
+    main = create_task(coro)
+    while not main.done:
+        if stop_at is not None and clock.monotonic() >= stop_at:
+            break
+        if _ready:
+            _step(_ready.popleft(), main)
+            continue
+        if not _timers:
+            break
+        until, _, task = heapq.heappop(_timers)
+        if stop_at is not None and until > stop_at:
+            clock.advance_to(stop_at)
+            heapq.heappush(_timers, (until, 0, task))
+            break
+        clock.advance_to(until)
+        _step(task, main)
+    if main.exception is not None:
+        raise main.exception
+    return main.result
+
+
+def new_event_loop():
+    """Forget every task and timer (e.g. between two runs in one process)"""
+    _ready.clear()
+    del _timers[:]
@@ -0,0 +1,3 @@
+"""CPython stand-in for MicroPython's ujson (host only): the standard json module under that name."""
+
+from json import dump, dumps, load, loads  # noqa: F401
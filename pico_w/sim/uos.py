@@ -0,0 +1,52 @@
+"""
+CPython stand-in for MicroPython's uos (host only), on a directory of the host.
+
+The harness changes into a scratch directory that plays the board's littlefs volume, so relative paths
+used by the firmware land there. Functions return what MicroPython returns: stat() tuples (size at
+index 6), ilistdir() entries (name, type, inode, size) and statvfs() of a CAPACITY byte volume in
+BLOCK_SIZE blocks, counting the files under the current directory as used.
+"""
+
+import os as _os
+
+BLOCK_SIZE = 4096
+# Filesystem size of a Pico W with the default MicroPython build (848 KiB)
+CAPACITY = 848 * 1024
+
+sep = '/'
+listdir = _os.listdir
+mkdir = _os.mkdir
+rmdir = _os.rmdir
+remove = _os.remove
+rename = _os.rename
+getcwd = _os.getcwd
+chdir = _os.chdir
+urandom = _os.urandom
+
+
+def stat(path):
+    return tuple(_os.stat(path))
+
+
+def ilistdir(path='.'):
+    for name in _os.listdir(path):
+        info = _os.stat(_os.path.join(path, name))
+        yield (name, 0x4000 if _os.path.isdir(_os.path.join(path, name)) else 0x8000, 0, info.st_size)
+
+
+def statvfs(path='/'):
+    used = 0
+    for root, _, files in _os.walk('.'):
+        for name in files:
+            used += (_os.path.getsize(_os.path.join(root, name)) + BLOCK_SIZE - 1) // BLOCK_SIZE
+    blocks = CAPACITY // BLOCK_SIZE
+    free = max(0, blocks - used)
+    return (BLOCK_SIZE, BLOCK_SIZE, blocks, free, free, 0, 0, 0, 0, 255)
+
+
+def sync():
+    pass
+
+
+def uname():
+    return ('rp2', 'rp2', '1.24.0', 'host simulation', 'Raspberry Pi Pico W with RP2040')
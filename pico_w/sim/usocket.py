@@ -0,0 +1,55 @@
+"""
+CPython stand-in for MicroPython's usocket (host only).
+
+Put pico_w/sim on sys.path before importing urequests so the firmware's HTTP client runs on a PC
+against local stand-ins such as sim/aio_server.py. Sockets expose the MicroPython stream methods the
+firmware uses: write, read, readinto, readline. stats counts write() calls: on the board each one is a
+TLS record of its own.
+"""
+
+import socket as _socket
+
+AF_INET = _socket.AF_INET
+SOCK_STREAM = _socket.SOCK_STREAM
+IPPROTO_TCP = _socket.IPPROTO_TCP
+
+stats = {'writes': 0}
+
+
+def getaddrinfo(host, port, af=0, type=0, proto=0, flags=0):
+    return _socket.getaddrinfo(host, port, af, type or SOCK_STREAM, proto, flags)
+
+
+class socket(object):
+    def __init__(self, af=AF_INET, type=SOCK_STREAM, proto=0):
+        self._sock = _socket.socket(af, type, proto)
+        self._file = None
+
+    def settimeout(self, timeout):
+        self._sock.settimeout(timeout)
+
+    def connect(self, address):
+        self._sock.connect(address)
+        self._file = self._sock.makefile('rb')
+
+    def write(self, data):
+        stats['writes'] += 1
+        self._sock.sendall(data)
+        return len(data)
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def readinto(self, buf, size=None):
+        if size is not None:
+            buf = memoryview(buf)[:size]
+        return self._file.readinto(buf)
+
+    def readline(self):
+        return self._file.readline()
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+        self._sock.close()
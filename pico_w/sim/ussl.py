@@ -0,0 +1,14 @@
+"""
+CPython stand-in for MicroPython's ussl (host only).
+
+There is no TLS on the host side: the local stand-ins (sim/aio_server.py) speak plain HTTP, and
+wrap_socket() hands the socket back unchanged, so an https:// URL pointed at a stand-in still goes
+through urequests' connect path, handshake counter included.
+"""
+
+stats = {'handshakes': 0}
+
+
+def wrap_socket(sock, server_side=False, server_hostname=None, **kwargs):
+    stats['handshakes'] += 1
+    return sock
@@ -0,0 +1,113 @@
+"""
+Virtual clock shared by the host stand-ins (host only, CPython).
+
+Time moves only when something says how long it took: sleeps (time.sleep*, uasyncio.sleep*) and the
+blocking operations the stand-ins model (a Wi-Fi scan, connecting, the Adafruit IO round trip) move the
+clock forward instead of stalling, and running code takes no time at all. A drive replays faster than real
+time, and the same inputs give the same run however loaded the host is. The wall clock (time.time())
+starts at EPOCH.
+
+install() puts a time module on this clock under the names 'time' and 'utime', with the MicroPython
+ticks_ms/ticks_us/ticks_diff/ticks_add/sleep_ms/sleep_us functions. Only modules imported afterwards see
+it, which is the point: import the host tools (http.server, the Adafruit IO stand-in, ...) first, then
+install(), then the firmware. uninstall() restores the real module.
+"""
+
+import sys
+import time as _time
+import types
+
+_TICKS_MASK = 0x3FFFFFFF
+_TICKS_HALF = 0x20000000
+# time.time() at the start of a run: 2024-06-01 00:00 UTC
+EPOCH = 1717200000
+
+
+class VirtualClock(object):
+    """Every skipped wait, in seconds from creation"""
+
+    def __init__(self, epoch=EPOCH):
+        self.elapsed = 0.0
+        # Wall clock time (time.time()) at the start of the run
+        self.epoch = epoch
+
+    def monotonic(self):
+        return self.elapsed
+
+    def advance(self, seconds):
+        """Skip ahead, as if seconds had passed waiting"""
+        if seconds > 0:
+            self.elapsed += seconds
+
+    def advance_to(self, when):
+        """Skip ahead to monotonic() time when, if that is still in the future"""
+        self.advance(when - self.monotonic())
+
+    # MicroPython time functions
+    def time(self):
+        return self.epoch + self.monotonic()
+
+    def ticks_ms(self):
+        return int(self.monotonic() * 1000) & _TICKS_MASK
+
+    def ticks_us(self):
+        return int(self.monotonic() * 1000000) & _TICKS_MASK
+
+    @staticmethod
+    def ticks_diff(end, start):
+        return ((end - start + _TICKS_HALF) & _TICKS_MASK) - _TICKS_HALF
+
+    @staticmethod
+    def ticks_add(ticks, delta):
+        return (ticks + delta) & _TICKS_MASK
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+    def sleep_ms(self, ms):
+        self.advance(ms / 1000)
+
+    def sleep_us(self, us):
+        self.advance(us / 1000000)
+
+    def localtime(self, seconds=None):
+        return _time.localtime(self.time() if seconds is None else seconds)
+
+    def gmtime(self, seconds=None):
+        return _time.gmtime(self.time() if seconds is None else seconds)
+
+    def module(self, name='time'):
+        """A time module on this clock; everything not overridden is the host's"""
+        module = types.ModuleType(name)
+        for attr in dir(_time):
+            if not attr.startswith('__'):
+                setattr(module, attr, getattr(_time, attr))
+        for attr in ('time', 'monotonic', 'ticks_ms', 'ticks_us', 'ticks_diff', 'ticks_add', 'sleep', 'sleep_ms',
+                     'sleep_us', 'localtime', 'gmtime'):
+            setattr(module, attr, getattr(self, attr))
+        module.ticks_cpu = self.ticks_us
+        module.time_ns = lambda: int(self.time() * 1000000000)
+        return module
+
+
+clock = VirtualClock()
+_saved = {}
+
+
+def install():
+    """Make 'time' and 'utime' imports return the virtual clock's time module"""
+    module = clock.module()
+    for name in ('time', 'utime'):
+        if name not in _saved:
+            _saved[name] = sys.modules.get(name)
+        sys.modules[name] = module
+    return module
+
+
+def uninstall():
+    for name, module in _saved.items():
+        if module is None:
+            sys.modules.pop(name, None)
+        else:
+            sys.modules[name] = module
+    _saved.clear()
@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+PICO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The firmware modules, and the host stand-ins for the MicroPython ones they import (usocket, ujson)
+sys.path.insert(0, PICO_DIR)
+sys.path.insert(0, os.path.join(PICO_DIR, 'sim'))
+
+KEY = 'aio_test'
+HEADERS = {'X-AIO-Key': KEY, 'Content-Type': 'application/json'}
+
+
+@pytest.fixture
+def aio():
+    """Adafruit IO stand-in (sim/aio_server.py) refusing values over 64 bytes; aio.url is the test feed"""
+    import aio_server
+    server, aio = aio_server.serve(key=KEY, max_value=64)
+    aio.url = 'http://127.0.0.1:%d/api/v2/sim/feeds/test/data' % server.server_address[1]
+    yield aio
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,29 @@
+"""
+Batch uploads: what Adafruit IO confirms of a batch (sim/aio_server.py) and how main.py drains the pending
+log from it (sim/drive.py).
+"""
+
+import urequests
+from conftest import HEADERS
+from test_drive import drive
+
+
+def test_batch_confirms_only_stored_values(aio):
+    session = urequests.Session()
+    values = ['a' * 10, 'b' * 100, 'c' * 10]
+    resp = session.request('POST', aio.url + '/batch', json=[{'value': v} for v in values], headers=HEADERS)
+    assert resp.status_code == 200
+    assert [record['value'] for record in resp.json()] == ['a' * 10, 'c' * 10]
+    assert aio.values('test') == ['a' * 10, 'c' * 10]
+    assert aio.stats['rejected_values'] == 1
+
+
+def test_refused_values_are_retried_once_before_they_are_given_up(tmp_path):
+    # 800 bytes: some of the estimate values are refused. Pending leaves only up to the first record still
+    # missing a value, the confirmed ones are not sent again, and a refused one gets a second try
+    result = drive(tmp_path, '--offline', '20:200', '--max-value', '800')
+    assert result['pending_records'] == 0
+    assert result['values_stored'] == 9
+    assert result['values_rejected'] == 20
+    assert result['values_given_up'] == 6
+    assert result['records_skipped'] == 4
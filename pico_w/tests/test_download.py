@@ -0,0 +1,86 @@
+"""
+Response bodies streamed through urequests.Session from the Adafruit IO stand-in (sim/aio_server.py),
+with a Content-Length or chunked transfer encoding (aio.chunk bytes per chunk).
+"""
+
+import json
+
+import pytest
+
+import urequests
+from conftest import HEADERS
+
+# Twenty 1 KB values: the feed comes back as a body of about 21 KB, newest first
+VALUES = ['%04d' % i + 'x' * 996 for i in range(20)]
+
+
+def store(aio, session, values):
+    aio.max_value = 2048
+    resp = session.request('POST', aio.url + '/batch', json=[{'value': v} for v in values], headers=HEADERS)
+    assert resp.status_code == 200
+    assert len(resp.json()) == len(values)
+
+
+def test_chunked_download(aio):
+    aio.chunk = 16
+    session = urequests.Session()
+    for i in range(3):
+        session.request('POST', aio.url, json={'value': 'v%d' % i}, headers=HEADERS)
+    resp = session.request('GET', aio.url + '?limit=10', headers=HEADERS, stream=True)
+    body = b''.join(resp.iter_content(7))
+    assert [record['value'] for record in json.loads(body)] == ['v2', 'v1', 'v0']
+    assert session.request('GET', aio.url + '?limit=1', headers=HEADERS).json()[0]['value'] == 'v2'
+    assert session.handshakes == 1
+
+
+# Chunks smaller than, equal to and bigger than the pieces read, so pieces end inside chunks, on their
+# boundaries and across several of them
+@pytest.mark.parametrize('chunk', [0, 300, 512, 700, 5000])
+@pytest.mark.parametrize('piece', [7, 512, 1000])
+def test_large_body_in_pieces(aio, chunk, piece):
+    session = urequests.Session()
+    store(aio, session, VALUES)
+    aio.chunk = chunk
+    resp = session.request('GET', aio.url, headers=HEADERS, stream=True)
+    sizes = []
+    body = b''
+    for part in resp.iter_content(piece):
+        sizes.append(len(part))
+        body += part
+    assert max(sizes) <= piece
+    assert [record['value'] for record in json.loads(body)] == VALUES[::-1]
+    # The whole body was read, so the connection is reused
+    assert session.request('GET', aio.url + '?limit=1', headers=HEADERS).json()[0]['value'] == VALUES[-1]
+    assert session.handshakes == 1
+
+
+def test_content_length_body_fills_the_buffer(aio):
+    session = urequests.Session()
+    store(aio, session, VALUES)
+    resp = session.request('GET', aio.url, headers=HEADERS, stream=True)
+    buf = bytearray(512)
+    sizes = []
+    body = bytearray()
+    while True:
+        n = resp.readinto(buf)
+        if not n:
+            break
+        sizes.append(n)
+        body += buf[:n]
+    # Full buffers up to the tail of the body
+    assert all(n == len(buf) for n in sizes[:-1])
+    assert 0 < sizes[-1] <= len(buf)
+    assert [record['value'] for record in json.loads(bytes(body))] == VALUES[::-1]
+    assert resp.readinto(buf) == 0
+
+
+@pytest.mark.parametrize('chunk', [0, 511, 513])
+def test_large_body_content_and_json(aio, chunk):
+    session = urequests.Session()
+    store(aio, session, VALUES)
+    aio.chunk = chunk
+    resp = session.request('GET', aio.url, headers=HEADERS)
+    assert [record['value'] for record in resp.json()] == VALUES[::-1]
+    resp = session.request('GET', aio.url + '?limit=3', headers=HEADERS, stream=True)
+    assert [record['value'] for record in json.loads(resp.content)] == VALUES[:-4:-1]
+    assert session.handshakes == 1
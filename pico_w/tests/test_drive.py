@@ -0,0 +1,49 @@
+"""
+main.py end to end on the simulation harness (sim/drive.py), one process per run since the virtual
+clock replaces the time module for good. Time there moves only by simulated waits, so a run always gives
+the same numbers.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+from conftest import PICO_DIR
+
+
+def drive(fs, *args):
+    out = subprocess.run([sys.executable, os.path.join(PICO_DIR, 'sim', 'drive.py'), '--fs', str(fs)] + list(args),
+                         check=True, capture_output=True, text=True, cwd=PICO_DIR).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def test_offline_window_drains_pending(tmp_path):
+    result = drive(tmp_path, '--offline', '20:200', '--set', 'FORMATO_REGISTRO=csv')
+    assert result['pending_records'] == 0
+    assert result['networks_seen'] == 301
+    assert result['networks_captured'] == 297
+    assert result['networks_held'] == 4
+    assert result['networks_lost'] == 0
+    assert result['values_stored'] == 30
+    assert result['values_rejected'] == 0
+    assert result['uart_overruns'] == 0
+
+
+def test_partially_confirmed_batches_do_not_block_pending(tmp_path):
+    # 970 bytes: about half of the ~1 KB CSV values are refused, in batches of pending and on their own
+    result = drive(tmp_path, '--offline', '20:200', '--max-value', '970', '--set', 'FORMATO_REGISTRO=csv')
+    assert result['pending_records'] == 0
+    assert result['values_stored'] == 15
+    assert result['values_given_up'] == 15
+    assert result['networks_captured'] == 183
+    assert result['networks_lost'] == 110
+
+
+def test_slow_service_does_not_starve_the_gps_task(tmp_path):
+    result = drive(tmp_path, '--receiver', 'mtk', '--seconds', '600', '--offline', '30:400', '--latency', '2500',
+                   '--set', 'FORMATO_REGISTRO=csv')
+    assert result['uart_overruns'] == 0
+    assert result['networks_lost'] == 0
+    # The longest step is one POST waiting out the 2.5 s round trip
+    assert result['loop_block_max_s'] == 2.5
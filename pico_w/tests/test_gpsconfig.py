@@ -0,0 +1,103 @@
+"""
+gpsconfig.ReceiverConfig against the simulated receivers in sim/gps_receiver.py, on a virtual clock of its
+own (sim/vclock.py) so acknowledgement timeouts cost no wall time.
+"""
+
+import pytest
+
+import gpsconfig
+import vclock
+from gps_receiver import NAV_PVT, SimulatedReceiver
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = vclock.VirtualClock()
+    monkeypatch.setattr(gpsconfig, 'ticks_ms', clock.ticks_ms)
+    monkeypatch.setattr(gpsconfig, 'ticks_diff', clock.ticks_diff)
+    monkeypatch.setattr(gpsconfig, 'sleep_ms', clock.sleep_ms)
+    return clock
+
+
+def receiver(clock, kind, baudrate=9600):
+    """A receiver of kind at baudrate and a ReceiverConfig on a 9600 baud port to it"""
+    source = SimulatedReceiver(kind, baudrate, clock=clock.monotonic)
+    return source, gpsconfig.ReceiverConfig(source.port(9600), 9600)
+
+
+def test_mtk_configure(clock):
+    source, config = receiver(clock, 'mtk')
+    result = config.configure(115200, 200, ('GGA', 'RMC'))
+    assert result == {'receiver': 'mtk', 'baudrate': 115200, 'messages': True, 'protocol': 'nmea',
+                      'period_ms': 200}
+    assert source.baudrate == 115200
+    assert source.nmea == {'GGA', 'RMC'}
+    assert source.period_ms == 200
+    assert config.naks == 0
+
+
+def test_ubx_configure(clock):
+    source, config = receiver(clock, 'ubx')
+    result = config.configure(115200, 200, ('GGA', 'RMC'), protocol='ubx')
+    assert result == {'receiver': 'ubx', 'baudrate': 115200, 'messages': True, 'protocol': 'ubx',
+                      'period_ms': 200}
+    assert source.baudrate == 115200
+    assert source.ubx == {NAV_PVT}
+    assert source.nmea == set()
+    assert source.period_ms == 200
+    assert config.naks == 0
+
+
+def test_refused_command_is_counted_and_changes_nothing(clock):
+    # PMTK220 outside 100-10000 ms is answered with PMTK001 flag 2
+    source, config = receiver(clock, 'mtk')
+    assert config.detect() == 'mtk'
+    assert not config.set_rate(20000)
+    assert config.naks == 1
+    assert config.acks == 0
+    assert source.period_ms == 1000
+    # UBX-CFG-RATE under 25 ms gets an ACK-NAK
+    source, config = receiver(clock, 'ubx')
+    assert config.detect() == 'ubx'
+    assert not config.set_rate(10)
+    assert config.naks == 1
+    assert source.period_ms == 1000
+
+
+def test_silent_receiver(clock):
+    source, config = receiver(clock, 'silent')
+    result = config.configure(115200, 200)
+    assert result == {'receiver': None, 'baudrate': 9600, 'messages': False, 'protocol': 'nmea',
+                      'period_ms': None}
+    # Every baud rate listened to once, then back to the one it started on
+    assert clock.monotonic() == pytest.approx(len(gpsconfig.BAUDRATES) * 1.5, abs=0.1)
+    assert config.baudrate == 9600
+    assert config.commands == 0
+
+
+def test_receiver_ignoring_commands(clock):
+    # Valid NMEA but no answer to PMTK605 or the UBX poll: left as it is
+    source, config = receiver(clock, 'nmea')
+    result = config.configure(115200, 200)
+    assert result == {'receiver': 'nmea', 'baudrate': 9600, 'messages': False, 'protocol': 'nmea',
+                      'period_ms': None}
+    assert config.commands == 2
+    assert config.acks == config.naks == 0
+    assert source.baudrate == 9600
+
+
+def test_detect_finds_the_current_baud_rate(clock):
+    source, config = receiver(clock, 'mtk', 115200)
+    assert config.detect() == 'mtk'
+    assert config.baudrate == 115200
+
+
+def test_baud_change_is_confirmed_or_reverted(clock):
+    source, config = receiver(clock, 'mtk')
+    config.detect()
+    assert config.set_baud(38400)
+    assert config.baudrate == source.baudrate == 38400
+    # 76800 is not a rate the receiver knows: it stays at 38400 and so does the port
+    assert not config.set_baud(76800)
+    assert config.baudrate == source.baudrate == 38400
+    assert config.listen() == 'nmea'
@@ -0,0 +1,41 @@
+"""
+Keep-alive connection reuse in urequests.Session against the Adafruit IO stand-in (sim/aio_server.py).
+"""
+
+import urequests
+from conftest import HEADERS
+
+
+def test_keep_alive_reuses_one_connection(aio):
+    session = urequests.Session()
+    for i in range(5):
+        resp = session.request('POST', aio.url, json={'value': 'v%d' % i}, headers=HEADERS)
+        assert resp.status_code == 200
+    assert aio.values('test') == ['v%d' % i for i in range(5)]
+    assert session.handshakes == 1
+    assert session.requests == 5
+    assert aio.stats['connections'] == 1
+
+
+def test_value_too_long_is_422_and_connection_survives(aio):
+    session = urequests.Session()
+    resp = session.request('POST', aio.url, json={'value': 'x' * 100}, headers=HEADERS)
+    assert resp.status_code == 422
+    assert aio.values('test') == []
+    resp = session.request('POST', aio.url, json={'value': 'ok'}, headers=HEADERS)
+    assert resp.status_code == 200
+    assert aio.values('test') == ['ok']
+    assert session.handshakes == 1
+
+
+def test_connection_dropped_while_idle_is_replaced(aio):
+    session = urequests.Session()
+    headers = dict(HEADERS)
+    # The stand-in closes the connection after answering, without saying so in the response
+    headers['Connection'] = 'close'
+    assert session.request('POST', aio.url, json={'value': 'first'}, headers=headers).status_code == 200
+    resp = session.request('POST', aio.url, json={'value': 'second'}, headers=HEADERS)
+    assert resp.status_code == 200
+    assert aio.values('test') == ['first', 'second']
+    assert session.handshakes == 2
+    assert session.requests == 2
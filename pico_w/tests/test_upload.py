@@ -0,0 +1,114 @@
+"""
+Uploads through urequests.Session against the Adafruit IO stand-in (sim/aio_server.py), from the pico_w
+directory:
+
+    python3 -m pytest -q tests
+"""
+
+import io
+import json
+
+import urequests
+import usocket
+from batchbuilder import escaped_size
+from conftest import HEADERS
+
+# Bytes of the buffer Session sends files and iterables through
+BUFFER = 512
+
+
+def batch_body(values):
+    # Same pieces as main.cuerpo_batch(): one value at a time, never the whole payload
+    yield '['
+    for i, v in enumerate(values):
+        yield ',{"value":' if i else '{"value":'
+        yield json.dumps(v)
+        yield '}'
+    yield ']'
+
+
+def test_chunked_upload(aio):
+    session = urequests.Session()
+    values = ['línea %d\n' % i for i in range(4)]
+    resp = session.request('POST', aio.url + '/batch', data=batch_body(values), headers=HEADERS)
+    assert resp.status_code == 200
+    assert aio.values('test') == values
+    # The connection is still good after a chunked body
+    resp = session.request('POST', aio.url, json={'value': 'after'}, headers=HEADERS)
+    assert resp.status_code == 200
+    assert session.handshakes == 1
+
+
+def test_streamed_upload_with_content_length(aio):
+    # What enviar_batch() sends: the body in pieces with a precomputed Content-Length
+    session = urequests.Session()
+    values = ['ssid "a",WPA2\n', 'tab\there\n', 'ñandú\n']
+    headers = dict(HEADERS)
+    headers['Content-Length'] = 2 + sum(len('{"value":}') + escaped_size(v) + 2 for v in values) + len(values) - 1
+    resp = session.request('POST', aio.url + '/batch', data=batch_body(values), headers=headers)
+    assert resp.status_code == 200
+    assert aio.values('test') == values
+    assert aio.stats['bytes_received'] == headers['Content-Length']
+
+
+def test_small_pieces_share_socket_writes(aio):
+    # 300 pieces of a few bytes: gathered into full buffers, not one write (one TLS record) each
+    aio.max_value = 4096
+    session = urequests.Session()
+    values = ['v%03d' % i for i in range(100)]
+    body = ''.join(batch_body(values)).encode()
+    headers = dict(HEADERS)
+    headers['Content-Length'] = len(body)
+    writes = usocket.stats['writes']
+    resp = session.request('POST', aio.url + '/batch', data=batch_body(values), headers=headers)
+    assert resp.status_code == 200
+    assert aio.values('test') == values
+    # The header block, then one write per full buffer
+    assert usocket.stats['writes'] - writes == 1 + -(-len(body) // BUFFER)
+
+
+def test_chunked_pieces_share_socket_writes(aio):
+    aio.max_value = 4096
+    session = urequests.Session()
+    values = ['v%03d' % i for i in range(100)]
+    body = ''.join(batch_body(values)).encode()
+    writes = usocket.stats['writes']
+    resp = session.request('POST', aio.url + '/batch', data=batch_body(values), headers=HEADERS)
+    assert resp.status_code == 200
+    assert aio.values('test') == values
+    # Chunk framing travels in the same write as the data, the terminating chunk with the last one
+    assert usocket.stats['writes'] - writes == 1 + -(-len(body) // (BUFFER - 13))
+
+
+def test_pieces_bigger_than_the_buffer(aio):
+    aio.max_value = 4096
+    session = urequests.Session()
+    values = ['a' * 1500, 'b' * 10, 'c' * 3000]
+    resp = session.request('POST', aio.url + '/batch', data=batch_body(values), headers=HEADERS)
+    assert resp.status_code == 200
+    assert aio.values('test') == values
+    assert aio.stats['rejected_values'] == 0
+
+
+class Reader(object):
+    """File-like object with read() only: no readinto(), no seek(), so no known length"""
+
+    def __init__(self, data):
+        self._data = io.BytesIO(data)
+
+    def read(self, size):
+        return self._data.read(min(size, 100))
+
+
+def test_file_bodies(aio):
+    aio.max_value = 4096
+    session = urequests.Session()
+    values = ['línea %d\n' % i * 20 for i in range(12)]
+    payload = json.dumps([{'value': v} for v in values]).encode()
+    resp = session.request('POST', aio.url + '/batch', data=io.BytesIO(payload), headers=HEADERS)
+    assert resp.status_code == 200
+    # Short reads, sent chunked
+    resp = session.request('POST', aio.url + '/batch', data=Reader(payload), headers=HEADERS)
+    assert resp.status_code == 200
+    assert aio.values('test') == values + values
+    assert session.handshakes == 1
@@ -3,27 +3,123 @@
 
 import usocket
 import ujson
+try:
+    from time import ticks_ms, ticks_diff
+except ImportError:
+    from time import monotonic
+
+    def ticks_ms():
+        return int(monotonic() * 1000)
+
+    def ticks_diff(end, start):
+        return end - start
+
+def _readinto(s, buf):
+    # Sockets without readinto() (some TLS wrappers) fall back to read() + copy
+    try:
+        return s.readinto(buf)
+    except AttributeError:
+        data = s.read(len(buf))
+        buf[:len(data)] = data
+        return len(data)
+
+class _Body:
+    """Reads one response body from a socket, honoring Content-Length or chunked
+    framing (or up to connection close when there is neither)"""
+
+    def __init__(self, s, length=None, chunked=False):
+        self.s = s
+        self.chunked = chunked
+        # Bytes left in the body (Content-Length) or in the current chunk; None = until close
+        self.remaining = 0 if chunked else length
+        self.done = length == 0 and not chunked
+
+    def readinto(self, buf):
+        if self.done:
+            return 0
+        if self.chunked and not self.remaining:
+            size = int(self.s.readline().split(b";")[0].strip(), 16)
+            if not size:
+                # Trailers end with an empty line
+                while self.s.readline() not in (b"\r\n", b""):
+                    pass
+                self.done = True
+                return 0
+            self.remaining = size
+        mv = memoryview(buf)
+        if self.remaining is not None and self.remaining < len(mv):
+            mv = mv[:self.remaining]
+        n = _readinto(self.s, mv)
+        if not n:
+            if self.remaining is None:
+                self.done = True
+                return 0
+            raise OSError("Connection closed mid-body")
+        if self.remaining is not None:
+            self.remaining -= n
+            if not self.remaining:
+                if self.chunked:
+                    self.s.readline()  # CRLF after the chunk data
+                else:
+                    self.done = True
+        return n
 
 class Response:
-    def __init__(self, f):
+    def __init__(self, f, body=None, release=None):
         self.raw = f
         self.encoding = "utf-8"
         self._cached = None
+        self._body = body
+        # Called with the socket once the body is fully read (keep-alive reuse)
+        self._release = release
 
     def close(self):
         if self.raw:
-            self.raw.close()
+            if self._body and self._body.done and self._release:
+                self._release(self.raw)
+            else:
+                self.raw.close()
             self.raw = None
-        self._cached = None
+        self._body = None
+
+    def readinto(self, buf):
+        """Read the next part of the body into buf; returns the byte count, 0 at the end"""
+        if self.raw is None:
+            return 0
+        if self._body is None:
+            n = _readinto(self.raw, buf)
+        else:
+            n = self._body.readinto(buf)
+        if not n:
+            self.close()
+        return n
+
+    def iter_content(self, chunk_size=256):
+        """Yield the body in pieces of at most chunk_size bytes, reusing one buffer"""
+        if self._cached is not None:
+            for i in range(0, len(self._cached), chunk_size):
+                yield self._cached[i:i + chunk_size]
+            return
+        buf = bytearray(chunk_size)
+        while True:
+            n = self.readinto(buf)
+            if not n:
+                break
+            yield bytes(buf[:n])
 
     @property
     def content(self):
         if self._cached is None:
             try:
-                self._cached = self.raw.read()
+                if self._body is None:
+                    self._cached = self.raw.read()
+                else:
+                    out = bytearray()
+                    for chunk in self.iter_content(512):
+                        out.extend(chunk)
+                    self._cached = bytes(out)
             finally:
-                self.raw.close()
-                self.raw = None
+                self.close()
         return self._cached
 
     @property
@@ -33,7 +129,7 @@ class Response:
     def json(self):
         return ujson.loads(self.text)
 
-def request(method, url, data=None, json=None, headers={}, stream=None, timeout=10):
+def _split_url(url):
     try:
         proto, dummy, host, path = url.split("/", 3)
     except ValueError:
@@ -42,7 +138,6 @@ def request(method, url, data=None, json=None, headers={}, stream=None, timeout=
     if proto == "http:":
         port = 80
     elif proto == "https:":
-        import ussl
         port = 443
     else:
         raise ValueError("Unsupported protocol: " + proto)
@@ -50,53 +145,382 @@ def request(method, url, data=None, json=None, headers={}, stream=None, timeout=
     if ":" in host:
         host, port = host.split(":", 1)
         port = int(port)
+    return proto, host, port, path
 
-    ai = usocket.getaddrinfo(host, port, 0, usocket.SOCK_STREAM)
-    ai = ai[0]
+class DNSCache:
+    """Last good address per (host, port), reused for ttl seconds.
+
+    getaddrinfo() gives no TTL, so a fixed one is used. When a lookup fails the
+    expired entry is served anyway (stale); when a connect to a cached address
+    fails the entry is expired so the next request resolves again. At most
+    max_entries hosts are kept.
+    """
+
+    def __init__(self, ttl=300, max_entries=8):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.failures = 0
+        self.lookup_ms = 0
+
+    def resolve(self, host, port):
+        key = (host, port)
+        entry = self._entries.get(key)
+        now = ticks_ms()
+        if entry and entry[1] is not None and ticks_diff(now, entry[1]) < self.ttl * 1000:
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        try:
+            ai = usocket.getaddrinfo(host, port, 0, usocket.SOCK_STREAM)[0]
+        except OSError:
+            self.lookup_ms += ticks_diff(ticks_ms(), now)
+            self.failures += 1
+            if entry:
+                self.stale += 1
+                return entry[0]
+            raise
+        self.lookup_ms += ticks_diff(ticks_ms(), now)
+        if key not in self._entries and len(self._entries) >= self.max_entries:
+            oldest = None
+            oldest_age = -1
+            for k in self._entries:
+                t = self._entries[k][1]
+                age = 0x3FFFFFFF if t is None else ticks_diff(now, t)
+                if age > oldest_age:
+                    oldest, oldest_age = k, age
+            del self._entries[oldest]
+        self._entries[key] = (ai, now)
+        return ai
+
+    def expire(self, host, port):
+        # Keep the address as a stale fallback but resolve again next time
+        entry = self._entries.get((host, port))
+        if entry:
+            self._entries[(host, port)] = (entry[0], None)
+
+    def clear(self):
+        self._entries = {}
+
+# Shared by request() and every Session
+dns_cache = DNSCache()
+
+def _connect(proto, host, port, timeout):
+    ai = dns_cache.resolve(host, port)
 
     s = usocket.socket(ai[0], ai[1], ai[2])
     s.settimeout(timeout)
     try:
-        s.connect(ai[-1])
+        try:
+            s.connect(ai[-1])
+        except OSError:
+            dns_cache.expire(host, port)
+            raise
         if proto == "https:":
+            try:
+                import ussl
+            except ImportError:
+                import ssl as ussl
             s = ussl.wrap_socket(s, server_hostname=host)
-        s.write(b"%s /%s HTTP/1.0\r\n" % (method, path))
-        if not "Host" in headers:
-            s.write(b"Host: %s\r\n" % host)
-        if not "User-Agent" in headers:
-            s.write(b"User-Agent: PicoW\r\n")
-        if json is not None:
-            assert data is None
-            import ujson
-            data = ujson.dumps(json)
-            s.write(b"Content-Type: application/json\r\n")
-        if data:
-            s.write(b"Content-Length: %d\r\n" % len(data))
-        for k in headers:
-            s.write(b"%s: %s\r\n" % (k, headers[k]))
-        s.write(b"\r\n")
-        if data:
-            s.write(data)
+    except OSError:
+        s.close()
+        raise
+    return s
 
+def _parse_status(l):
+    # "HTTP/1.1 200 OK\r\n" -> (200, "OK")
+    l = l.split(None, 2)
+    if len(l) < 2 or not l[0].startswith(b"HTTP/"):
+        raise ValueError("Invalid status line")
+    status = int(l[1])
+    reason = ""
+    if len(l) > 2:
+        reason = l[2].rstrip()
+    return status, reason
+
+def _read_headers(s):
+    # -> (Content-Length or None, chunked, keep-alive)
+    length = None
+    chunked = False
+    keep = True
+    while True:
         l = s.readline()
-        l = l.split(None, 2)
-        status = int(l[1])
-        reason = ""
-        if len(l) > 2:
-            reason = l[2].rstrip()
-        while True:
-            l = s.readline()
-            if not l or l == b"\r\n":
-                break
+        if not l or l == b"\r\n":
+            break
+        k, _, v = l.partition(b":")
+        k = k.strip().lower()
+        v = v.strip().lower()
+        if k == b"content-length":
+            length = int(v)
+        elif k == b"transfer-encoding":
+            chunked = b"chunked" in v
+        elif k == b"connection":
+            keep = v != b"close"
+    return length, chunked, keep
+
+class _Upload:
+    """Request body: bytes, a file object (sent from its current position) or an
+    iterable of byte chunks. Files and iterables are written through one reusable
+    buffer instead of being materialized, one socket write per full buffer: small
+    pieces are gathered and chunked framing is added in place."""
+
+    def __init__(self, data, headers):
+        self.data = data
+        self.start = None
+        self.started = False
+        self.length = None
+        for k in headers:
+            if k.lower() == "content-length":
+                self.length = int(headers[k])
+        if data is None or isinstance(data, (bytes, bytearray, memoryview)):
+            self.kind = "bytes"
+            self.length = len(data) if data else 0
+        elif hasattr(data, "readinto") or hasattr(data, "read"):
+            self.kind = "file"
+            if self.length is None:
+                try:
+                    self.start = data.tell()
+                    self.length = data.seek(0, 2) - self.start
+                    data.seek(self.start)
+                except (AttributeError, OSError):
+                    self.start = None
+        else:
+            self.kind = "iter"
+        # Without a known length the body goes out with chunked transfer encoding
+        self.chunked = self.length is None
+
+    def header(self):
+        if self.chunked:
+            return "Transfer-Encoding: chunked\r\n"
+        return "Content-Length: %d\r\n" % self.length
+
+    def rewind(self):
+        # True if the body can be sent again (retry on a fresh connection)
+        if not self.started or self.kind == "bytes":
+            return True
+        if self.kind == "file" and self.start is not None:
+            self.data.seek(self.start)
+            return True
+        return False
+
+    def _flush(self, s, mv, first, end, last=False):
+        # Data sits in mv[first:end]; the chunk size line goes in the room before
+        # it and the CRLF (and on the last one the terminating chunk) after it
+        if not self.chunked:
+            if end > first:
+                s.write(mv[first:end])
+            return
+        start = end
+        if end > first:
+            size = b"%x\r\n" % (end - first)
+            start = first - len(size)
+            mv[start:first] = size
+            mv[end:end + 2] = b"\r\n"
+            end += 2
+        if last:
+            mv[end:end + 5] = b"0\r\n\r\n"
+            end += 5
+        s.write(mv[start:end])
+
+    def send(self, s, buf):
+        self.started = True
+        if self.kind == "bytes":
+            if self.data:
+                s.write(self.data)
+            return
+        mv = memoryview(buf)
+        # Chunked: room for a size line of up to 4 hex digits, the CRLF and the terminating chunk
+        first = 6 if self.chunked else 0
+        limit = len(buf) - 7 if self.chunked else len(buf)
+        n = first
+        if self.kind == "file":
+            readinto = getattr(self.data, "readinto", None)
+            while True:
+                if readinto is not None:
+                    got = readinto(mv[n:limit])
+                else:
+                    chunk = self.data.read(limit - n)
+                    got = len(chunk)
+                    buf[n:n + got] = chunk
+                if not got:
+                    break
+                n += got
+                if n == limit:
+                    self._flush(s, mv, first, n)
+                    n = first
+        else:
+            for chunk in self.data:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                size = len(chunk)
+                if n + size <= limit:
+                    buf[n:n + size] = chunk
+                    n += size
+                    continue
+                # Bigger than the room left: fill the buffer, flush it and carry on with the rest
+                chunk = memoryview(chunk)
+                taken = 0
+                while taken < size:
+                    step = min(size - taken, limit - n)
+                    mv[n:n + step] = chunk[taken:taken + step]
+                    n += step
+                    taken += step
+                    if n == limit:
+                        self._flush(s, mv, first, n)
+                        n = first
+        self._flush(s, mv, first, n, True)
+
+def _request_head(method, host, path, json, upload, headers, extra=""):
+    # Whole header block in one write: on TLS every write is a record of its own
+    head = "%s /%s HTTP/1.1\r\n" % (method, path)
+    if not "Host" in headers:
+        head += "Host: %s\r\n" % host
+    if not "User-Agent" in headers:
+        head += "User-Agent: PicoW\r\n"
+    if json is not None:
+        head += "Content-Type: application/json\r\n"
+    head += upload.header()
+    for k in headers:
+        if k.lower() != "content-length":
+            head += "%s: %s\r\n" % (k, headers[k])
+    return (head + extra + "\r\n").encode()
+
+def request(method, url, data=None, json=None, headers={}, stream=None, timeout=10):
+    """data may be bytes/str, a file object or an iterable of byte chunks; a
+    Content-Length header from the caller avoids chunked encoding for iterables"""
+    proto, host, port, path = _split_url(url)
+    if json is not None:
+        assert data is None
+        data = ujson.dumps(json)
+    if isinstance(data, str):
+        data = data.encode()
+    upload = _Upload(data, headers)
+    s = _connect(proto, host, port, timeout)
+    try:
+        s.write(_request_head(method, host, path, json, upload, headers, "Connection: close\r\n"))
+        upload.send(s, bytearray(512))
+
+        status, reason = _parse_status(s.readline())
+        length, chunked, keep = _read_headers(s)
     except OSError:
         s.close()
         raise
 
-    resp = Response(s)
+    # The body is read lazily (content, iter_content(), readinto()) with its framing
+    if method == "HEAD" or status in (204, 304):
+        length, chunked = 0, False
+    resp = Response(s, _Body(s, length, chunked))
     resp.status_code = status
     resp.reason = reason
     return resp
 
+class Session:
+    """HTTP/1.1 client that keeps one (TLS) connection open between requests.
+
+    Consecutive requests to the same host reuse the socket, so only the first one
+    pays for DNS, TCP connect and the TLS handshake. If the server dropped an idle
+    connection the request is retried once on a fresh one. Response bodies are
+    read completely (Content-Length or chunked) so the connection can be reused;
+    with stream=True the body is left on the socket for iter_content()/readinto()
+    and the connection returns to the session once it has been read to the end.
+    Request bodies can be files or chunk iterables (see request()); they are sent
+    through one buffer owned by the session. connect_ms adds up the time spent
+    opening connections (TCP connect and TLS handshake, DNS is in dns_cache.lookup_ms)
+    and request_ms the time from sending a request to having its response (the
+    body too unless stream=True).
+    """
+
+    def __init__(self, timeout=10):
+        self.timeout = timeout
+        self.handshakes = 0
+        self.requests = 0
+        self.connect_ms = 0
+        self.request_ms = 0
+        self._sock = None
+        self._origin = None
+        self._buf = bytearray(512)
+
+    def close(self):
+        if self._sock:
+            self._sock.close()
+            self._sock = None
+        self._origin = None
+
+    def request(self, method, url, data=None, json=None, headers={}, stream=False):
+        proto, host, port, path = _split_url(url)
+        if json is not None:
+            assert data is None
+            data = ujson.dumps(json)
+        if isinstance(data, str):
+            data = data.encode()
+        upload = _Upload(data, headers)
+        head = _request_head(method, host, path, json, upload, headers)
+
+        origin = (proto, host, port)
+        for attempt in range(2):
+            reused = self._sock is not None and self._origin == origin
+            if not reused:
+                self.close()
+                start = ticks_ms()
+                lookup = dns_cache.lookup_ms
+                self._sock = _connect(proto, host, port, self.timeout)
+                self.connect_ms += ticks_diff(ticks_ms(), start) - (dns_cache.lookup_ms - lookup)
+                self._origin = origin
+                self.handshakes += 1
+            start = ticks_ms()
+            try:
+                self._sock.write(head)
+                upload.send(self._sock, self._buf)
+                l = self._sock.readline()
+                if not l:
+                    raise OSError("Connection closed")
+                resp = self._read_response(l, method, stream)
+                self.requests += 1
+                self.request_ms += ticks_diff(ticks_ms(), start)
+                return resp
+            except OSError:
+                self.request_ms += ticks_diff(ticks_ms(), start)
+                self.close()
+                # Only a connection that sat idle gets a second chance, and only
+                # if the body can be sent again
+                if not reused or not upload.rewind():
+                    raise
+            except ValueError:
+                self.close()
+                raise
+        raise OSError("Request failed")
+
+    def _read_response(self, status_line, method="GET", stream=False):
+        s = self._sock
+        status, reason = _parse_status(status_line)
+        length, chunked, keep = _read_headers(s)
+        if method == "HEAD" or status in (204, 304):
+            length, chunked = 0, False
+        if length is None and not chunked:
+            keep = False  # no framing: body runs until the server closes
+
+        # The socket belongs to the response until its body has been read
+        origin = self._origin
+        self._sock = None
+        self._origin = None
+
+        def release(sock):
+            if keep and self._sock is None:
+                self._sock = sock
+                self._origin = origin
+            else:
+                sock.close()
+
+        resp = Response(s, _Body(s, length, chunked), release)
+        resp.status_code = status
+        resp.reason = reason
+        if not stream:
+            resp.content
+        return resp
+
 def head(url, **kw):
     return request("HEAD", url, **kw)
 
@@ -0,0 +1,179 @@
+"""
+zcodec - compressed framing for upload values (MicroPython / CPython)
+
+A compressed value is a single text line
+
+    Z1:<base64 of a raw deflate stream>
+
+so any zlib implementation can read it (CPython zlib with wbits=-15, Dart ZLibDecoder(raw: true)).
+Compression uses the deflate module when the MicroPython build has it, zlib on CPython, and
+otherwise a small pure-Python encoder (LZ77 + fixed Huffman codes) that still emits standard deflate.
+"""
+
+try:
+    import ubinascii as binascii
+except ImportError:
+    import binascii
+
+MARKER = 'Z1:'
+WINDOW = 1024
+MAX_MATCH = 258
+MIN_MATCH = 3
+
+_LENGTH_BASE = (3, 4, 5, 6, 7, 8, 9, 10, 11, 13, 15, 17, 19, 23, 27, 31, 35, 43, 51, 59, 67, 83, 99, 115,
+                131, 163, 195, 227, 258)
+_LENGTH_EXTRA = (0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 1, 2, 2, 2, 2, 3, 3, 3, 3, 4, 4, 4, 4, 5, 5, 5, 5, 0)
+_DIST_BASE = (1, 2, 3, 4, 5, 7, 9, 13, 17, 25, 33, 49, 65, 97, 129, 193, 257, 385, 513, 769, 1025, 1537,
+              2049, 3073, 4097, 6145, 8193, 12289, 16385, 24577)
+_DIST_EXTRA = (0, 0, 0, 0, 1, 1, 2, 2, 3, 3, 4, 4, 5, 5, 6, 6, 7, 7, 8, 8, 9, 9, 10, 10, 11, 11, 12, 12, 13, 13)
+
+
+class _BitWriter(object):
+    """LSB-first bit packer for deflate streams"""
+
+    def __init__(self):
+        self.out = bytearray()
+        self._acc = 0
+        self._bits = 0
+
+    def bits(self, value, count):
+        self._acc |= value << self._bits
+        self._bits += count
+        while self._bits >= 8:
+            self.out.append(self._acc & 0xFF)
+            self._acc >>= 8
+            self._bits -= 8
+
+    def code(self, value, count):
+        """Write a Huffman code, which deflate stores most significant bit first"""
+        reversed_value = 0
+        for _ in range(count):
+            reversed_value = (reversed_value << 1) | (value & 1)
+            value >>= 1
+        self.bits(reversed_value, count)
+
+    def finish(self):
+        if self._bits:
+            self.out.append(self._acc & 0xFF)
+        return bytes(self.out)
+
+
+def _literal(writer, symbol):
+    # Fixed Huffman literal/length alphabet (RFC 1951 3.2.6)
+    if symbol < 144:
+        writer.code(0x30 + symbol, 8)
+    elif symbol < 256:
+        writer.code(0x190 + symbol - 144, 9)
+    elif symbol < 280:
+        writer.code(symbol - 256, 7)
+    else:
+        writer.code(0xC0 + symbol - 280, 8)
+
+
+def _match(writer, length, distance):
+    index = 0
+    while index < 28 and _LENGTH_BASE[index + 1] <= length:
+        index += 1
+    _literal(writer, 257 + index)
+    if _LENGTH_EXTRA[index]:
+        writer.bits(length - _LENGTH_BASE[index], _LENGTH_EXTRA[index])
+    index = 0
+    while index < 29 and _DIST_BASE[index + 1] <= distance:
+        index += 1
+    writer.code(index, 5)
+    if _DIST_EXTRA[index]:
+        writer.bits(distance - _DIST_BASE[index], _DIST_EXTRA[index])
+
+
+def deflate_fallback(data):
+    """Pure-Python raw deflate: greedy LZ77 over a WINDOW-byte window, one fixed-Huffman block"""
+    writer = _BitWriter()
+    writer.bits(1, 1)  # BFINAL
+    writer.bits(1, 2)  # BTYPE = fixed Huffman
+    last = {}
+    pos = 0
+    end = len(data)
+    while pos < end:
+        length = 0
+        if pos + MIN_MATCH <= end:
+            key = data[pos:pos + MIN_MATCH]
+            candidate = last.get(key)
+            last[key] = pos
+            if candidate is not None and pos - candidate <= WINDOW:
+                limit = min(MAX_MATCH, end - pos)
+                length = MIN_MATCH
+                while length < limit and data[candidate + length] == data[pos + length]:
+                    length += 1
+        if length >= MIN_MATCH:
+            _match(writer, length, pos - candidate)
+            for skipped in range(pos + 1, min(pos + length, end - MIN_MATCH + 1)):
+                last[data[skipped:skipped + MIN_MATCH]] = skipped
+            pos += length
+        else:
+            _literal(writer, data[pos])
+            pos += 1
+    _literal(writer, 256)  # end of block
+    return writer.finish()
+
+
+try:
+    import zlib
+
+    def _deflate_native(data):
+        compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+        return compressor.compress(data) + compressor.flush()
+
+    def inflate(data):
+        """Decompress a raw deflate stream"""
+        return zlib.decompress(data, -15)
+except ImportError:
+    try:
+        import deflate
+        import io
+
+        def _deflate_native(data):
+            buf = io.BytesIO()
+            with deflate.DeflateIO(buf, deflate.RAW, 10) as stream:
+                stream.write(data)
+            return buf.getvalue()
+
+        def inflate(data):
+            """Decompress a raw deflate stream"""
+            return deflate.DeflateIO(io.BytesIO(data), deflate.RAW).read()
+    except ImportError:
+        _deflate_native = None
+        inflate = None
+
+# Builds without deflate compression support fail on first use: detect it once here
+NATIVE = False
+if _deflate_native is not None:
+    try:
+        _deflate_native(b'probe')
+        NATIVE = True
+    except Exception:
+        pass
+
+
+def compress(data):
+    """Raw deflate of data, with the native codec when available"""
+    if NATIVE:
+        return _deflate_native(data)
+    return deflate_fallback(data)
+
+
+def encode(text):
+    """Frame text as a compressed value line (no trailing newline)"""
+    return MARKER + binascii.b2a_base64(compress(text.encode())).decode().strip()
+
+
+def is_encoded(value):
+    return value.startswith(MARKER)
+
+
+def decode(value):
+    """Return the original text of a value; values without the marker are returned unchanged"""
+    if not value.startswith(MARKER):
+        return value
+    if inflate is None:
+        raise ValueError('No deflate decoder available')
+    return inflate(binascii.a2b_base64(value[len(MARKER):].strip())).decode()